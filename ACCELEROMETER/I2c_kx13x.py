@@ -0,0 +1,160 @@
+import struct
+from smbus2 import SMBus, i2c_msg
+
+DEFAULT_ADDRESS = 0x1F  # SparkFun Qwiic KX134 (0x1E with the ADR jumper closed)
+
+# Little-endian int16 X/Y/Z as laid out in 16-bit buffer samples
+_XYZ16 = struct.Struct('<3h')
+_XYZ8 = struct.Struct('3b')
+
+# Counts per g for CNTL1 range settings 0x00..0x03 (+/-8, 16, 32, 64 g)
+SENSITIVITIES = [4096, 2048, 1024, 512]
+
+# Control registers
+CNTL1 = 0x1B
+ODCNTL = 0x21
+
+# Sample buffer registers
+BUF_CNTL1 = 0x5E
+BUF_CNTL2 = 0x5F
+BUF_STATUS_1 = 0x60
+BUF_STATUS_2 = 0x61
+BUF_CLEAR = 0x62
+BUF_READ = 0x63
+
+# BUF_CNTL2 operating modes (BM bits)
+BUF_MODE_FIFO = 0x00     # Stop filling when full (newest samples lost)
+BUF_MODE_STREAM = 0x01   # Overwrite when full (oldest samples lost)
+
+# 512 byte buffer: 86 XYZ samples at 16-bit resolution, 171 at 8-bit
+BUF_MAX_SAMPLES_16BIT = 86
+BUF_MAX_SAMPLES_8BIT = 171
+
+I2C_CLOCKS_PER_BYTE = 9  # 8 data bits + ACK
+
+def bus_clock_hz(bus=1):
+    # SCL frequency the kernel set from dtparam=i2c_arm_baudrate, or None where it cannot be read
+    try:
+        with open(f"/sys/class/i2c-adapter/i2c-{bus}/of_node/clock-frequency", 'rb') as f:
+            return int.from_bytes(f.read(4), 'big')
+    except OSError:
+        return None
+
+class KX134_I2C:
+    ''' Sample-buffer access to a KX134 over I2C, alongside the Qwiic library that sets it up.
+    Reads go out as one combined write/read (repeated start) through i2c_rdwr, so a whole
+    watermark of samples comes back in a single transaction instead of 32-byte SMBus blocks. '''
+
+    def __init__(self, bus=1, address=DEFAULT_ADDRESS):
+        self.bus = bus
+        self.address = address
+        self.i2c = SMBus(bus)
+        self.odr_code = 0x06
+        self.odr_hz = 50.0  # ODCNTL power-on default
+        self.high_performance = False  # CNTL1 RES power-on default
+        self.sensitivity = 4096  # CNTL1 power-on default (+/-8g)
+        self._scale = 1.0 / self.sensitivity
+        self.buffer_high_res = True
+        self.buffer_max_samples = BUF_MAX_SAMPLES_16BIT
+        self.buffer_overflows = 0
+        self._reads = {}  # Preallocated (register write, read) message pairs per (register, length)
+
+    def write_register(self, reg, value):
+        self.i2c.write_byte_data(self.address, reg, value)
+
+    def read_register(self, reg):
+        return self.i2c.read_byte_data(self.address, reg)
+
+    def _read(self, start_reg, length):
+        msgs = self._reads.get((start_reg, length))
+        if msgs is None:
+            msgs = self._reads[(start_reg, length)] = (i2c_msg.write(self.address, [start_reg]),
+                                                       i2c_msg.read(self.address, length))
+        self.i2c.i2c_rdwr(*msgs)
+        return bytes(msgs[1])
+
+    def read_multiple(self, start_reg, length):
+        return list(self._read(start_reg, length))
+
+    def read_config(self):
+        # Pick up the range, RES and ODR the chip is actually running with
+        cntl1 = self.read_register(CNTL1)
+        self.sensitivity = SENSITIVITIES[(cntl1 >> 3) & 0x03]
+        self._scale = 1.0 / self.sensitivity
+        self.high_performance = bool(cntl1 & 0x40)
+        self.odr_code = self.read_register(ODCNTL) & 0x0F
+        self.odr_hz = 25600.0 / (1 << (15 - self.odr_code))  # 0x00 = 0.781 Hz ... 0x0F = 25600 Hz
+
+    def bus_load(self, clock_hz):
+        # Fraction of the bus the buffer drain needs at odr_hz (payload only, status reads are extra)
+        sample_bytes = 6 if self.buffer_high_res else 3
+        return self.odr_hz * sample_bytes * I2C_CLOCKS_PER_BYTE / clock_hz
+
+    def enable_buffer(self, watermark=None, mode=BUF_MODE_STREAM, high_res=True, high_performance=True):
+        # BUF_CNTL1/BUF_CNTL2 and CNTL1 RES may only be changed while PC1 = 0; RES (high-performance
+        # mode) is needed for ODRs above 400 Hz, which is what the buffer is for
+        max_samples = BUF_MAX_SAMPLES_16BIT if high_res else BUF_MAX_SAMPLES_8BIT
+        if watermark is None:
+            watermark = max_samples // 2
+        if watermark < 2 or watermark > max_samples or mode not in (BUF_MODE_FIFO, BUF_MODE_STREAM):
+            return False
+        buf_cntl2 = 0x80 | mode  # BUFE
+        if high_res:
+            buf_cntl2 |= 0x40  # BRES: 16-bit samples
+        cntl1 = self.read_register(CNTL1)
+        if high_performance:
+            cntl1 |= 0x40
+        else:
+            cntl1 &= ~0x40
+        self.write_register(CNTL1, cntl1 & ~0x80)
+        self.write_register(BUF_CNTL1, watermark)
+        self.write_register(BUF_CNTL2, buf_cntl2)
+        if cntl1 & 0x80:
+            self.write_register(CNTL1, cntl1)
+        self.clear_buffer()
+        self.high_performance = high_performance
+        self.buffer_high_res = high_res
+        self.buffer_max_samples = max_samples
+        self.buffer_overflows = 0
+        return True
+
+    def disable_buffer(self):
+        cntl1 = self.read_register(CNTL1)
+        if cntl1 & 0x80:
+            self.write_register(CNTL1, cntl1 & ~0x80)
+        self.write_register(BUF_CNTL2, 0x00)
+        if cntl1 & 0x80:
+            self.write_register(CNTL1, cntl1)
+
+    def clear_buffer(self):
+        self.write_register(BUF_CLEAR, 0x00)  # Any write empties the buffer
+
+    def get_buffer_level(self):
+        status = self._read(BUF_STATUS_1, 2)
+        level_bytes = (status[1] & 0x03) << 8 | status[0]
+        return level_bytes // (6 if self.buffer_high_res else 3)
+
+    def read_buffer_raw(self, max_samples=None):
+        # One status read plus one BUF_READ transaction (address does not auto-increment).
+        # Returns the packed sample payload: 6 bytes per sample (<3h) at 16-bit, 3 bytes (3b) at 8-bit.
+        level = self.get_buffer_level()
+        if level >= self.buffer_max_samples:
+            self.buffer_overflows += 1  # Buffer filled up before we drained it
+        count = level if max_samples is None else min(level, max_samples)
+        if count <= 0:
+            return memoryview(b"")
+        return memoryview(self._read(BUF_READ, count * (6 if self.buffer_high_res else 3)))
+
+    def unpack(self, payload):
+        # Payload from read_buffer_raw() to [(x, y, z)] in g
+        if self.buffer_high_res:
+            scale = self._scale
+            return [(x * scale, y * scale, z * scale) for x, y, z in _XYZ16.iter_unpack(payload)]
+        scale = self._scale * 256  # 8-bit samples are the high byte of the 16-bit result
+        return [(x * scale, y * scale, z * scale) for x, y, z in _XYZ8.iter_unpack(payload)]
+
+    def read_buffer(self, max_samples=None):
+        return self.unpack(self.read_buffer_raw(max_samples))
+
+    def close(self):
+        self.i2c.close()
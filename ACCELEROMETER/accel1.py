@@ -1,5 +1,7 @@
 '''USING QWIIC KX13X LIBRARY [ https://github.com/sparkfun/Qwiic_KX13X_Py ]'''
 '''Current Data Rate: 200Hz'''
+# Buffered mode needs more than the 100 kHz I2C default: add dtparam=i2c_arm_baudrate=400000 (or 1000000)
+# to /boot/firmware/config.txt and reboot
 
 import qwiic_kx13x
 import time
@@ -7,6 +9,100 @@ import sys
 import csv
 from datetime import datetime
 import os
+import math
+import queue
+import threading
+from I2c_kx13x import KX134_I2C, bus_clock_hz
+
+PRINT_INTERVAL = 0.5  # Seconds between console summaries (min/max/mean/RMS per axis); None = headless, no printing
+
+ACCEL_MODE = "poll"    # "poll": data_ready() and one read and CSV row per sample, as before,
+                       # "buffer": the KX134 collects samples in its buffer, drained a watermark at a time over I2C
+                       # and written to CSV by a background thread
+BUFFER_ODR = 0x0C      # "buffer": ODCNTL code, 25600 / 2**(15 - code) Hz: 0x0B = 1600, 0x0C = 3200, 0x0D = 6400 Hz
+BUFFER_WATERMARK = 43  # "buffer": samples per drain (max 86 at 16-bit)
+I2C_BUS = 1            # "buffer": /dev/i2c-N the Qwiic connector is on
+PRINT_DECIMATION = 16  # "buffer": every Nth sample feeds the console summary
+BUS_LOAD_WARNING = 0.5  # "buffer": warn when draining the buffer needs more than this share of the I2C clock
+WRITER_BACKLOG = 2.0   # "buffer": seconds of drained samples queued for the CSV writer before blocks are dropped
+
+def print_summary(window):
+    # One line for all samples since the last summary instead of a line per sample
+    parts = []
+    for axis, values in zip("XYZ", zip(*window)):
+        rms = math.sqrt(sum(v * v for v in values) / len(values))
+        parts.append(f"{axis}: {min(values):.3f}/{max(values):.3f}/{sum(values) / len(values):.3f}/{rms:.3f}g")
+    print(f"{len(window)} samples (min/max/mean/RMS)  " + "  ".join(parts))
+
+def buffer_writer(blocks, kx, writer, sample_period_ns):
+    # Background thread: unpack drained blocks, back-date them on the ODR grid and write the rows
+    window = []
+    last_print = time.monotonic()
+    while True:
+        block = blocks.get()
+        if block is None:
+            break
+        end_ns, payload = block
+        samples = kx.unpack(payload)
+        first_ns = end_ns - (len(samples) - 1) * sample_period_ns
+        writer.writerows([datetime.fromtimestamp((first_ns + i * sample_period_ns) / 1e9).isoformat(), x, y, z]
+                         for i, (x, y, z) in enumerate(samples))
+        if PRINT_INTERVAL is not None:
+            window.extend(samples[::PRINT_DECIMATION])
+            if window and time.monotonic() - last_print >= PRINT_INTERVAL:
+                print_summary(window)
+                window = []
+                last_print = time.monotonic()
+
+def log_buffered(myKx, writer):
+    kx = KX134_I2C(I2C_BUS, myKx.address)
+    try:
+        if not kx.enable_buffer(BUFFER_WATERMARK):
+            raise ValueError(f"BUFFER_WATERMARK {BUFFER_WATERMARK} is out of range (2..86)")
+        kx.read_config()  # Timestamps follow the ODR the chip reports, not the one that was asked for
+        if kx.odr_code != BUFFER_ODR or not kx.high_performance:
+            raise ValueError(f"KX134 runs at ODCNTL 0x{kx.odr_code:02X}, RES {int(kx.high_performance)} "
+                             f"instead of BUFFER_ODR 0x{BUFFER_ODR:02X}, RES 1")
+        clock = bus_clock_hz(I2C_BUS)
+        if clock is None:
+            print(f"I2C bus {I2C_BUS} clock unknown; {kx.odr_hz:.0f} Hz needs ~{kx.bus_load(400000):.0%} of 400 kHz")
+        else:
+            print(f"I2C bus {I2C_BUS} at {clock // 1000} kHz: draining {kx.odr_hz:.0f} Hz takes ~{kx.bus_load(clock):.0%} of it")
+            if kx.bus_load(clock) > BUS_LOAD_WARNING:
+                print("Warning: the bus is too slow for this ODR, raise dtparam=i2c_arm_baudrate (see top of file)", file=sys.stderr)
+
+        # Wake about twice per watermark period and drain whatever the sensor has buffered
+        poll_period = BUFFER_WATERMARK / kx.odr_hz / 2
+        blocks = queue.Queue(maxsize=int(WRITER_BACKLOG / poll_period) + 1)
+        sample_period_ns = int(1e9 / kx.odr_hz)
+        background = threading.Thread(target=buffer_writer, args=(blocks, kx, writer, sample_period_ns), daemon=True)
+        background.start()
+        overflows = 0
+        dropped = 0
+        kx.clear_buffer()
+        try:
+            while True:
+                time.sleep(poll_period)
+                if not background.is_alive():
+                    raise RuntimeError("CSV writer thread stopped")
+                payload = kx.read_buffer_raw()
+                if payload:
+                    try:
+                        blocks.put_nowait((time.time_ns(), payload))  # The newest sample was taken about now
+                    except queue.Full:
+                        dropped += 1
+                        print(f"CSV writer is {WRITER_BACKLOG:g} s behind, block dropped ({dropped} total)", file=sys.stderr)
+                if kx.buffer_overflows != overflows:
+                    overflows = kx.buffer_overflows
+                    print(f"Sample buffer overflow ({overflows} total), host is falling behind", file=sys.stderr)
+        finally:
+            if background.is_alive():
+                blocks.put(None)
+                background.join()
+            print(f"Sample buffer overflows: {kx.buffer_overflows}, blocks dropped: {dropped}")
+    finally:
+        kx.disable_buffer()
+        kx.close()
 
 def runExample():
     print("\nSparkFun KX13X Accelerometer Example 1 - CSV Logging\n")
@@ -27,7 +123,7 @@ def runExample():
 
     
     myKx.enable_accel(False)
-    myKx.set_output_data_rate(0x09)
+    myKx.set_output_data_rate(BUFFER_ODR if ACCEL_MODE == "buffer" else 0x09)
     myKx.set_range(myKx.KX134_RANGE32G)  # If using the KX134
     # myKx.set_range(myKx.KX132_RANGE16G)
     myKx.enable_data_engine()
@@ -45,6 +141,10 @@ def runExample():
             writer.writerow(["Timestamp", "X (g)", "Y (g)", "Z (g)"])
 
             print(f"Logging to {filename}...\nPress Ctrl+C to stop.")
+            if ACCEL_MODE == "buffer":
+                log_buffered(myKx, writer)
+            window = []
+            last_print = time.monotonic()
             while True:
                 if myKx.data_ready():
                     myKx.get_accel_data()
@@ -52,8 +152,13 @@ def runExample():
                     y = myKx.kx134_accel.y
                     z = myKx.kx134_accel.z
                     timestamp = datetime.now().isoformat()
-                    print(f"X: {x}g Y: {y}g Z: {z}g")
                     writer.writerow([timestamp, x, y, z])
+                    if PRINT_INTERVAL is not None:
+                        window.append((x, y, z))
+                        if time.monotonic() - last_print >= PRINT_INTERVAL:
+                            print_summary(window)
+                            window = []
+                            last_print = time.monotonic()
                     time.sleep(0.003)  # Delay = 1 / ODR = 1/50Hz = 0.02s
 
     except KeyboardInterrupt:
@@ -0,0 +1,185 @@
+''' ADS1115 per-read CPU and bus time: the I2c_ads1115 register driver vs. a polling single-shot read (and
+adafruit_ads1x15, when installed), all on a simulated bus '''
+# Usage: python bench_ads1115_driver.py [reads] [data_rate]
+import os
+import sys
+import time
+
+NODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "FTI_RPI1")
+READS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+DATA_RATE = int(sys.argv[2]) if len(sys.argv) > 2 else 860
+BUS_HZ = 400_000  # I2C fast mode
+sys.path.insert(0, NODE_DIR)
+from I2c_ads1115 import ADS1115_I2C, DATA_RATE_CODES, config_word
+
+RATES = {code: rate for rate, code in DATA_RATE_CODES.items()}
+
+class SimulatedADS1115:
+    ''' Register model of an ADS1115 at 0x48: single-shot conversions take 1/data_rate, and every
+    transaction busy-waits its time on a BUS_HZ bus (start, address byte, data bytes, 9 clocks each) '''
+
+    def __init__(self):
+        self.regs = [0x0000, 0x8583, 0x8000, 0x7FFF]
+        self.pointer = 0
+        self.done_at = None
+        self.result = 0
+        self.transactions = 0
+        self.bytes = 0
+
+    def _bus(self, nbytes):
+        self.transactions += 1
+        self.bytes += nbytes + 1
+        end = time.perf_counter() + (nbytes + 1) * 9 / BUS_HZ
+        while time.perf_counter() < end:
+            pass
+
+    def _update(self):
+        if self.done_at is not None and time.perf_counter() >= self.done_at:
+            self.regs[0] = self.result
+            self.regs[1] |= 0x8000
+            self.done_at = None
+
+    def write(self, data):
+        self._bus(len(data))
+        if not len(data):
+            return  # Address probe
+        self.pointer = data[0]
+        if len(data) < 3:
+            return
+        value = data[1] << 8 | data[2]
+        if self.pointer == 1 and value & 0x8000:
+            # Single-shot start: a code that identifies the channel (AIN<n> -> 1000 * (n + 1))
+            self.result = 1000 * (((value >> 12) & 0x3) + 1)
+            self.done_at = time.perf_counter() + 1.0 / RATES[(value >> 5) & 0x7]
+            value &= 0x7FFF
+        self.regs[self.pointer] = value
+
+    def read(self, buf):
+        self._bus(len(buf))
+        self._update()
+        value = self.regs[self.pointer]
+        buf[0] = value >> 8
+        if len(buf) > 1:
+            buf[1] = value & 0xFF
+
+class SimFile:
+    ''' /dev/i2c-N file stand-in for I2c_ads1115 '''
+    def __init__(self, device):
+        self.device = device
+    def write(self, data):
+        self.device.write(bytes(data))
+    def readinto(self, buf):
+        self.device.read(buf)
+    def close(self):
+        pass
+
+class SimI2C:
+    ''' busio.I2C stand-in for adafruit_bus_device '''
+    def __init__(self, device):
+        self.device = device
+    def try_lock(self):
+        return True
+    def unlock(self):
+        pass
+    def writeto(self, address, buf, *, start=0, end=None):
+        self.device.write(bytes(buf[start:end]))
+    def readfrom_into(self, address, buf, *, start=0, end=None):
+        view = memoryview(buf)[start:end if end is not None else len(buf)]
+        self.device.read(view)
+    def writeto_then_readfrom(self, address, out_buf, in_buf, *, out_start=0, out_end=None, in_start=0, in_end=None):
+        self.writeto(address, out_buf, start=out_start, end=out_end)
+        self.readfrom_into(address, in_buf, start=in_start, end=in_end)
+
+class PollingReader:
+    ''' Baseline that needs no extra package: the register sequence adafruit_ads1x15 uses for a
+    single-shot read, without its layers. Start the conversion, then re-point at the config
+    register and read it until OS is set, then re-point at and read the conversion register. '''
+
+    def __init__(self, device, gain=1, data_rate=DATA_RATE):
+        self.device = device
+        self.gain = gain
+        self.data_rate = data_rate
+
+    def read_channel(self, channel):
+        device = self.device
+        config = config_word(channel, self.gain, self.data_rate)
+        device.write(bytes([1, config >> 8, config & 0xFF]))
+        buf = bytearray(2)
+        while True:
+            device.write(b"\x01")
+            device.read(buf)
+            if buf[0] & 0x80:
+                break
+        device.write(b"\x00")
+        device.read(buf)
+        code = buf[0] << 8 | buf[1]
+        return code - 0x10000 if code & 0x8000 else code
+
+class SimDriver(ADS1115_I2C):
+    def _open_bus(self, bus, address):
+        self.sim = SimulatedADS1115()
+        return SimFile(self.sim)
+
+def measure(label, device, read, reads=READS, per_call=1):
+    start_tx, start_bytes = device.transactions, device.bytes
+    codes = set()
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    for i in range(reads):
+        codes.add(read(i))
+    reads *= per_call
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - start_cpu
+    tx = (device.transactions - start_tx) / reads
+    nbytes = (device.bytes - start_bytes) / reads
+    # CPU includes the simulated bus time, which the real bus spends in the kernel driver instead
+    bus_s = nbytes * 9 / BUS_HZ
+    overhead_s = cpu / reads - bus_s
+    print(f"{label:<42} {elapsed / reads * 1e6:8.1f} us/read   {tx:5.1f} transactions   "
+          f"{bus_s * 1e6:6.1f} us on the bus   {overhead_s * 1e6:6.1f} us CPU off the bus   codes {sorted(codes)}")
+    return elapsed / reads, tx, bus_s, overhead_s
+
+def main():
+    print(f"ADS1115 reads on a simulated {BUS_HZ // 1000} kHz bus, {DATA_RATE} SPS single-shot "
+          f"(conversion {1e6 / DATA_RATE:.0f} us), {READS:,} reads\n")
+    lean = SimDriver(gain=1, data_rate=DATA_RATE)
+    channels = [lean.channel(i) for i in range(4)]
+    results = {}
+    results["direct"] = measure("I2c_ads1115 channel(n).value", lean.sim, lambda i: channels[i % 4].value)
+    measure("I2c_ads1115 read_channels() batch", lean.sim, lambda i: lean.read_channels()[0], READS // 4, 4)
+    results["direct_rdy"] = measure("I2c_ads1115 continuous read+config (per RDY)", lean.sim,
+                                    lambda i: (lean.read_conversion(), lean.write_register(1, 0x42E0))[0])
+    polling = PollingReader(SimulatedADS1115())
+    results["polling"] = measure("polling single-shot (no driver layers)", polling.device,
+                                 lambda i: polling.read_channel(i % 4))
+    # A single-shot read cannot beat the conversion itself; what the driver saves per read is the
+    # bus time of polling OS through the conversion and the CPU time around the transfers
+    report("single-shot vs polling", results["polling"], results["direct"])
+    try:
+        import adafruit_ads1x15.ads1115 as ADS
+        from adafruit_ads1x15.analog_in import AnalogIn
+        pins = [getattr(ADS, f"P{n}", n) for n in range(4)]  # Pin constants moved to ads1x15.Pin in 3.x
+    except ImportError:
+        print("\nadafruit_ads1x15 is not installed; no comparison with it")
+        return
+    device = SimulatedADS1115()
+    ads = ADS.ADS1115(SimI2C(device))
+    ads.gain = 1
+    ads.data_rate = DATA_RATE
+    inputs = [AnalogIn(ads, pin) for pin in pins]
+    results["adafruit"] = measure("adafruit_ads1x15 AnalogIn.value", device, lambda i: inputs[i % 4].value)
+    # The Adafruit object's own register access, as the continuous scan would use it
+    results["adafruit_rdy"] = measure("adafruit_ads1x15 continuous read+config", device,
+                                      lambda i: (ads.get_last_result(), ads._write_register(1, 0x42E0))[0])
+    report("single-shot vs adafruit_ads1x15", results["adafruit"], results["direct"])
+    report("continuous vs adafruit_ads1x15", results["adafruit_rdy"], results["direct_rdy"])
+
+def report(label, baseline, driver):
+    # Per-read change from a baseline to the driver, off the bus (CPU) and on it; negative is time saved
+    (_, base_tx, base_bus, base_cpu), (_, tx, bus, cpu) = baseline, driver
+    print(f"\n{label}: CPU off the bus {base_cpu * 1e6:.1f} -> {cpu * 1e6:.1f} us/read "
+          f"({(cpu - base_cpu) * 1e6:+.1f}), bus {base_bus * 1e6:.1f} -> {bus * 1e6:.1f} us/read "
+          f"({(bus - base_bus) * 1e6:+.1f}, transactions {base_tx:.1f} -> {tx:.1f})")
+
+if __name__ == "__main__":
+    main()
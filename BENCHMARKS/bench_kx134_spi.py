@@ -0,0 +1,109 @@
+''' Host-side cost of the KX134_SPI read paths, measured against a fake spidev '''
+# Usage: python bench_kx134_spi.py [seconds_per_case]
+import os
+import sys
+import time
+import types
+import random
+
+NODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "FTI_RPI1")
+DURATION = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+BUFFER_SAMPLES = 43  # One watermark block
+
+# ---- Fake hardware ----
+class FakeSpiDev:
+    ''' Echoes a fixed random payload so only Python-side work is measured '''
+    def __init__(self):
+        self.max_speed_hz = 0
+        self.mode = 0
+        self._payload = [random.randrange(256) for _ in range(1024)]
+
+    def open(self, bus, device):
+        pass
+
+    def close(self):
+        pass
+
+    def xfer2(self, data):
+        n = len(data)
+        if n == 3 and data[0] == (0x60 | 0x80):  # BUF_STATUS_1/2: report one watermark block
+            level = BUFFER_SAMPLES * 6
+            return [0, level & 0xFF, level >> 8]
+        return [0] + self._payload[:n - 1]
+
+fake_spidev = types.ModuleType("spidev")
+fake_spidev.SpiDev = FakeSpiDev
+fake_lgpio = types.ModuleType("lgpio")
+fake_lgpio.RISING_EDGE = 0
+fake_lgpio.gpiochip_open = lambda chip: 1
+fake_lgpio.gpiochip_close = lambda handle: 0
+fake_lgpio.gpio_claim_output = lambda handle, pin, level: 0
+fake_lgpio.gpio_write = lambda handle, pin, level: 0
+sys.modules["spidev"] = fake_spidev
+sys.modules["lgpio"] = fake_lgpio
+sys.path.insert(0, NODE_DIR)
+import Spi_kx13x
+
+# ---- Baseline paths (driver as it was before the preallocated/struct hot path) ----
+def legacy_read_multiple(sensor, start_reg, length):
+    sensor._select()
+    response = sensor.spi.xfer2([start_reg | 0x80] + [0x00]*length)
+    sensor._deselect()
+    return response[1:]
+
+def legacy_convert(sensor, val):
+    if val > 32767:
+        val -= 65536
+    return val / sensor.sensitivity
+
+def legacy_get_accel_data(sensor):
+    raw = legacy_read_multiple(sensor, 0x08, 6)
+    x = legacy_convert(sensor, raw[1] << 8 | raw[0])
+    y = legacy_convert(sensor, raw[3] << 8 | raw[2])
+    z = legacy_convert(sensor, raw[5] << 8 | raw[4])
+    return (x, y, z)
+
+def legacy_read_buffer(sensor):
+    status = legacy_read_multiple(sensor, 0x60, 2)
+    count = ((status[1] & 0x03) << 8 | status[0]) // 6
+    raw = legacy_read_multiple(sensor, 0x63, count * 6)
+    return [
+        (legacy_convert(sensor, raw[i + 1] << 8 | raw[i]),
+         legacy_convert(sensor, raw[i + 3] << 8 | raw[i + 2]),
+         legacy_convert(sensor, raw[i + 5] << 8 | raw[i + 4]))
+        for i in range(0, count * 6, 6)
+    ]
+
+# ---- Runner ----
+def run(label, func, samples_per_call):
+    calls = 0
+    start_cpu = time.process_time()
+    end_wall = time.perf_counter() + DURATION
+    while time.perf_counter() < end_wall:
+        for _ in range(100):
+            func()
+        calls += 100
+    cpu = time.process_time() - start_cpu
+    rate = calls * samples_per_call / cpu
+    print(f"{label:<40} {rate:>12,.0f} samples/s per core   {cpu / calls * 1e6:8.2f} us/call")
+    return rate
+
+def main():
+    gpio_cs = Spi_kx13x.KX134_SPI(bus=0, cs_pin=21)
+    kernel_cs = Spi_kx13x.KX134_SPI(bus=0, cs_pin=8)
+    for sensor in (gpio_cs, kernel_cs):
+        sensor.set_range(0x00)
+        sensor.buffer_high_res = True
+
+    print(f"KX134_SPI host-side benchmark ({DURATION:.1f} s per case, fake spidev)\n")
+    before = run("single XYZ, legacy, GPIO CS", lambda: legacy_get_accel_data(gpio_cs), 1)
+    after = run("single XYZ, get_accel_data, GPIO CS", gpio_cs.get_accel_data, 1)
+    run("single XYZ, get_accel_data, kernel CS", kernel_cs.get_accel_data, 1)
+    print(f"  -> {after / before:.2f}x\n")
+    before = run(f"buffer drain x{BUFFER_SAMPLES}, legacy", lambda: legacy_read_buffer(gpio_cs), BUFFER_SAMPLES)
+    after = run(f"buffer drain x{BUFFER_SAMPLES}, read_buffer", gpio_cs.read_buffer, BUFFER_SAMPLES)
+    raw = run(f"buffer drain x{BUFFER_SAMPLES}, read_buffer_raw", gpio_cs.read_buffer_raw, BUFFER_SAMPLES)
+    print(f"  -> {after / before:.2f}x decoded, {raw / before:.2f}x raw")
+
+if __name__ == "__main__":
+    main()
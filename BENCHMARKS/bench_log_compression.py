@@ -0,0 +1,76 @@
+''' Size and CPU of the flight-log block codecs on accelerometer-like data, node 1 layout (19 channels) '''
+# Usage: python bench_log_compression.py [rows]
+import math
+import os
+import sys
+import time
+import random
+import tempfile
+
+NODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "FTI_RPI1")
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 30_000
+COMMIT_ROWS = 25  # 0.25 s group commits at 100 Hz
+LOG_HZ = 100
+sys.path.insert(0, NODE_DIR)
+from flight_log import CsvLogWriter, FlightLogWriter, FlightLogReader, _CODECS
+from timebase import ClockAnchor
+
+COLUMNS = [(f"Accel{i}_{axis}", "g") for i in range(5) for axis in "XYZ"] + [(f"Strain{i}", "V") for i in range(4)]
+CSV_HEADER = ["Timestamp"] + [f"{name} ({unit})" for name, unit in COLUMNS]
+ADS_LSB = 6.144 / 32767  # ADS1115 at gain 2/3
+
+def make_rows(anchor):
+    # KX134 counts at 4096/g: 1 g on Z plus a few vibration tones and sensor noise. Strain is a
+    # slow drift in whole ADS1115 codes. Each row also carries the same values as raw counts.
+    rows = []
+    for i in range(ROWS):
+        t = i / LOG_HZ
+        counts = []
+        for a in range(5):
+            vib = 300 * math.sin(2 * math.pi * (17 + a) * t) + 80 * math.sin(2 * math.pi * 43 * t)
+            counts += [int(vib + random.gauss(0, 12)), int(0.5 * vib + random.gauss(0, 12)),
+                       int(4096 + vib + random.gauss(0, 12))]
+        codes = [int(12000 + 400 * math.sin(2 * math.pi * 0.05 * t + s) + random.gauss(0, 3)) for s in range(4)]
+        rows.append((anchor.mono_ns + i * 10_000_000,
+                     [c / 4096 for c in counts] + [c * ADS_LSB for c in codes],
+                     counts + codes))
+    return rows
+
+def run(label, log, rows, raw, csv_size):
+    start_cpu = time.process_time()
+    for i, (timestamp_ns, values, counts) in enumerate(rows):
+        log.append(timestamp_ns, counts if raw else values)
+        if i % COMMIT_ROWS == COMMIT_ROWS - 1:
+            log.commit()
+    log.close()
+    write_cpu = time.process_time() - start_cpu
+    size = os.path.getsize(log.path)
+    read = ""
+    if isinstance(log, FlightLogWriter):
+        start_cpu = time.process_time()
+        for _ in FlightLogReader(log.path).rows():
+            pass
+        read = f"read {(time.process_time() - start_cpu) / ROWS * 1e6:6.2f} us/row"
+    write_us = write_cpu / ROWS * 1e6
+    print(f"{label:<24} {size / ROWS:7.1f} B/row  {csv_size / size if csv_size else 1:6.2f}x   "
+          f"write {write_us:6.2f} us/row ({write_us * LOG_HZ / 1e4:5.2f}% core at {LOG_HZ} Hz)   {read}")
+    return size
+
+def main():
+    anchor = ClockAnchor()
+    rows = make_rows(anchor)
+    print(f"Log compression benchmark ({ROWS:,} rows x {len(COLUMNS)} channels, commit every {COMMIT_ROWS} rows)")
+    print(f"codecs available: {', '.join(sorted(_CODECS))}\n")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = lambda name: os.path.join(tmp, name)
+        csv_size = run("csv", CsvLogWriter(path("log.csv"), CSV_HEADER, anchor), rows, False, None)
+        run("binary float32", FlightLogWriter(path("f.ftl"), COLUMNS, anchor), rows, False, csv_size)
+        for codec in sorted(_CODECS):
+            run(f"binary float32 {codec}", FlightLogWriter(path(f"f_{codec}.ftl"), COLUMNS, anchor, codec=codec),
+                rows, False, csv_size)
+        for codec in sorted(_CODECS):
+            run(f"binary int16 {codec}", FlightLogWriter(path(f"h_{codec}.ftl"), COLUMNS, anchor, typecode='h', codec=codec),
+                rows, True, csv_size)
+
+if __name__ == "__main__":
+    main()
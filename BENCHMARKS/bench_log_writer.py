@@ -0,0 +1,56 @@
+''' Writer CPU, file size and write calls per row: CSV text vs. the binary flight log, node 1 layout (19 channels) '''
+# Usage: python bench_log_writer.py [rows]
+import os
+import sys
+import time
+import random
+import tempfile
+
+NODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "FTI_RPI1")
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+sys.path.insert(0, NODE_DIR)
+from flight_log import CsvLogWriter, FlightLogWriter, FlightLogReader
+from timebase import ClockAnchor
+
+COLUMNS = [(f"Accel{i}_{axis}", "g") for i in range(5) for axis in "XYZ"] + [(f"Strain{i}", "V") for i in range(4)]
+CSV_HEADER = ["Timestamp"] + [f"{name} ({unit})" for name, unit in COLUMNS]
+
+def make_rows(anchor):
+    # Accelerations are whole KX134 counts at 4096/g, strain is ADS1115 voltage
+    return [(anchor.mono_ns + i * 10_000_000,
+             [random.randint(-32768, 32767) / 4096 for _ in range(15)] + [random.uniform(0, 5) for _ in range(4)])
+            for i in range(ROWS)]
+
+def run(label, log, rows, per_row_commit=False):
+    # per_row_commit mimics the old flush after every row; otherwise the writer's size trigger decides
+    start_cpu = time.process_time()
+    for timestamp_ns, values in rows:
+        log.append(timestamp_ns, values)
+        if per_row_commit:
+            log.commit()
+        else:
+            log.commit_if_due()
+    log.close()
+    cpu = time.process_time() - start_cpu
+    size = os.path.getsize(log.path)
+    print(f"{label:<22} {cpu / ROWS * 1e6:8.2f} us/row   {size / ROWS:7.1f} bytes/row   {size / 1e6:8.2f} MB"
+          f"   {log.writes:>7,} writes   {log.commits:>7,} commits")
+    return cpu, size
+
+def main():
+    anchor = ClockAnchor()
+    rows = make_rows(anchor)
+    print(f"Log writer benchmark ({ROWS:,} rows x {len(COLUMNS)} channels)\n")
+    with tempfile.TemporaryDirectory() as tmp:
+        run("csv, commit per row", CsvLogWriter(os.path.join(tmp, "row.csv"), CSV_HEADER, anchor), rows, True)
+        group = {"commit_interval": 3600, "commit_bytes": 64 * 1024}
+        csv_cpu, csv_size = run("csv, group commit", CsvLogWriter(os.path.join(tmp, "log.csv"), CSV_HEADER, anchor, **group), rows)
+        ftl_cpu, ftl_size = run("binary, group commit",
+                                FlightLogWriter(os.path.join(tmp, "log.ftl"), COLUMNS, anchor, CSV_HEADER, **group), rows)
+        print(f"  -> {csv_cpu / ftl_cpu:.2f}x less writer CPU, {csv_size / ftl_size:.2f}x smaller")
+        start = time.process_time()
+        FlightLogReader(os.path.join(tmp, "log.ftl")).to_csv(os.path.join(tmp, "back.csv"))
+        print(f"binary -> csv conversion: {(time.process_time() - start) / ROWS * 1e6:.2f} us/row")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+''' RS485 PT100 chain refresh rate: the sequential pymodbus-style loop vs. the modbus_poll asyncio engine,
+both against simulated Modbus RTU slaves on a pty, with every transmitter answering, with one unplugged
+and with one answering after the poller has given up on it '''
+# Usage: python bench_modbus_poll.py [seconds] [baud] [rate_hz]
+import asyncio
+import os
+import struct
+import sys
+import threading
+import time
+import tty
+
+NODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "FTI_RPI7")
+SECONDS = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+BAUD = int(sys.argv[2]) if len(sys.argv) > 2 else 9600
+RATE_HZ = float(sys.argv[3]) if len(sys.argv) > 3 else 5.0
+DEV_IDS = [1, 2, 3, 4]
+TURNAROUND_S = 0.005  # Slave processing time before it starts replying
+UNPLUGGED = 3         # Device left silent in the second round
+LATE = 3              # Device answering LATE_S after each request in the third round
+LATE_S = 0.53         # Just past PollDevice's max_timeout: the reply lands in the next device's transaction
+sys.path.insert(0, NODE_DIR)
+import serial
+from modbus_poll import RTUMaster, ModbusPoller, PollDevice, ScanCollector, crc16, char_time, frame_gap, QUALITY_OK
+
+class SimulatedSlaves:
+    ''' Modbus RTU slaves behind the master end of a pty. Holding register n of device d reads
+    100 * d + n. Each reply is held back by the request's and the reply's wire time at the
+    simulated baud rate plus TURNAROUND_S; requests that arrive less than t3.5 after the end of
+    the previous reply are counted as gap violations. The late devices answer LATE_S later from a
+    timer, so their replies land on whatever transaction is running by then. '''
+
+    def __init__(self, device_ids, late=()):
+        self.device_ids = set(device_ids) | set(late)
+        self.late = set(late)
+        self.fd, slave_fd = os.openpty()
+        tty.setraw(slave_fd)
+        self.port = os.ttyname(slave_fd)
+        self._slave_fd = slave_fd
+        self.char_s = char_time(BAUD)
+        self.gap_s = frame_gap(BAUD)
+        self.requests = 0
+        self.gap_violations = 0
+        self._bus_free = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        rx = bytearray()
+        while not self._stop.is_set():
+            try:
+                data = os.read(self.fd, 256)
+            except OSError:
+                return
+            now = time.perf_counter()
+            if not rx and now < self._bus_free + self.gap_s:
+                self.gap_violations += 1
+            rx += data
+            while len(rx) >= 8:
+                request, rx = bytes(rx[:8]), rx[8:]
+                if crc16(request) != 0:
+                    rx.clear()
+                    break
+                self.requests += 1
+                device_id, function, address, count = struct.unpack('>BBHH', request[:6])
+                if device_id not in self.device_ids or function != 3:
+                    continue
+                reply = bytearray([device_id, function, 2 * count])
+                reply += struct.pack(f'>{count}H', *(100 * device_id + address + i for i in range(count)))
+                reply += crc16(reply).to_bytes(2, 'little')
+                end = now + (len(request) + len(reply)) * self.char_s + TURNAROUND_S
+                if device_id in self.late:
+                    threading.Timer(end - now + LATE_S, self._write_late, args=(bytes(reply),)).start()
+                    continue
+                while time.perf_counter() < end:
+                    time.sleep(0.0002)
+                os.write(self.fd, reply)
+                self._bus_free = time.perf_counter()
+
+    def _write_late(self, reply):
+        if not self._stop.is_set():
+            os.write(self.fd, reply)
+
+    def close(self):
+        self._stop.set()
+        os.close(self._slave_fd)
+        os.close(self.fd)
+
+def sequential(port, stop):
+    # fti_rpi7's loop: reset input, one read, sleep 0.3 s per device, 0.5 s per scan
+    scans = []
+    link = serial.Serial(port, BAUD, timeout=3)
+    while not stop.is_set():
+        for dev_id in DEV_IDS:
+            link.reset_input_buffer()
+            request = bytearray(struct.pack('>BBHH', dev_id, 3, 0, 1))
+            request += crc16(request).to_bytes(2, 'little')
+            link.write(request)
+            link.read(7)
+            time.sleep(0.3)
+        scans.append(time.monotonic_ns())
+        time.sleep(0.5)
+    link.close()
+    return scans
+
+def run_sequential(answering, late):
+    slaves = SimulatedSlaves(answering, late)
+    stop = threading.Event()
+    threading.Timer(SECONDS, stop.set).start()
+    scans = sequential(slaves.port, stop)
+    slaves.close()
+    return scans, None, slaves
+
+def run_async(answering, late):
+    slaves = SimulatedSlaves(answering, late)
+    stop = threading.Event()
+    scans = []
+    healthy = []  # Scans in which every answering device was read
+
+    def on_scan(ts, values, qualities):
+        scans.append(ts)
+        if all(q == QUALITY_OK for dev_id, q in zip(DEV_IDS, qualities) if dev_id in answering):
+            healthy.append(ts)
+
+    master = RTUMaster(slaves.port, BAUD)
+    collector = ScanCollector(DEV_IDS, on_scan, lambda values: values[0], None)
+    poller = ModbusPoller(master, [PollDevice(dev_id, (0,), RATE_HZ) for dev_id in DEV_IDS], collector)
+    threading.Timer(SECONDS, stop.set).start()
+    asyncio.run(poller.run(stop))
+    master.close()
+    slaves.close()
+    return healthy, poller, slaves
+
+def scan_rate(scans):
+    if len(scans) < 2:
+        return 0.0
+    return (len(scans) - 1) * 1e9 / (scans[-1] - scans[0])
+
+def main():
+    wire_ms = 15 * char_time(BAUD) * 1e3
+    print(f"{len(DEV_IDS)} simulated PT100 transmitters at {BAUD} baud "
+          f"({wire_ms:.1f} ms of frames + {TURNAROUND_S * 1e3:.0f} ms turnaround per read), {SECONDS:.0f} s each\n")
+    for title, answering, late in (("All transmitters answering", DEV_IDS, ()),
+                                   (f"Device {UNPLUGGED} unplugged", [d for d in DEV_IDS if d != UNPLUGGED], ()),
+                                   (f"Device {LATE} answering {LATE_S:g} s late", [d for d in DEV_IDS if d != LATE], (LATE,))):
+        print(title)
+        scans, _, slaves = run_sequential(answering, late)
+        sequential_hz = scan_rate(scans)
+        print(f"  {'sequential (sleep 0.3 s / 0.5 s)':<34} {sequential_hz:6.2f} scans/s  "
+              f"({1 / sequential_hz if sequential_hz else 0:.2f} s per refresh)  {slaves.requests} requests")
+        scans, poller, slaves = run_async(answering, late)
+        async_hz = scan_rate(scans)
+        print(f"  {f'modbus_poll ({RATE_HZ:g} Hz per device)':<34} {async_hz:6.2f} scans/s  "
+              f"({1 / async_hz if async_hz else 0:.2f} s per refresh, answering devices ok)  {slaves.requests} requests, "
+              f"{slaves.gap_violations} t3.5 violations")
+        print("  " + poller.report("modbus_poll") + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+''' Cross-process sample transport: multiprocessing.Queue (one pickled message per sample) vs. SharedRingBuffer '''
+# Usage: python bench_shm_ring.py [samples]
+import os
+import sys
+import time
+import multiprocessing
+
+NODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "FTI_RPI1")
+SAMPLES = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+CHANNELS = 3  # One KX134 XYZ sample
+sys.path.insert(0, NODE_DIR)
+from ring_buffer import SharedRingBuffer
+
+def queue_producer(data_queue):
+    for i in range(SAMPLES):
+        data_queue.put((time.monotonic_ns(), [i * 0.001, -i * 0.001, 1.0]))
+    data_queue.put(None)
+
+def ring_producer(ring):
+    for i in range(SAMPLES):
+        ring.push(time.monotonic_ns(), (i * 0.001, -i * 0.001, 1.0))
+
+def run_queue():
+    data_queue = multiprocessing.Queue()
+    producer = multiprocessing.Process(target=queue_producer, args=(data_queue,))
+    start = time.perf_counter()
+    consumer_cpu = time.process_time()
+    producer.start()
+    received = 0
+    while data_queue.get() is not None:
+        received += 1
+    elapsed = time.perf_counter() - start
+    consumer_cpu = time.process_time() - consumer_cpu
+    producer.join()
+    return received, elapsed, consumer_cpu
+
+def run_ring():
+    ring = SharedRingBuffer(CHANNELS, SAMPLES)  # Large enough that nothing is overwritten
+    producer = multiprocessing.Process(target=ring_producer, args=(ring,))
+    start = time.perf_counter()
+    consumer_cpu = time.process_time()
+    producer.start()
+    received = 0
+    while producer.is_alive() or len(ring):
+        time.sleep(0.01)  # The writer's pass period
+        timestamps, _ = ring.read()
+        received += len(timestamps)
+    elapsed = time.perf_counter() - start
+    consumer_cpu = time.process_time() - consumer_cpu
+    producer.join()
+    ring.close()
+    ring.unlink()
+    return received, elapsed, consumer_cpu
+
+def main():
+    print(f"Cross-process transport benchmark ({SAMPLES:,} samples x {CHANNELS} channels)\n")
+    for label, run in (("multiprocessing.Queue", run_queue), ("SharedRingBuffer", run_ring)):
+        received, elapsed, consumer_cpu = run()
+        print(f"{label:<22} {received:>9,} samples   {elapsed / received * 1e6:6.2f} us/sample wall   "
+              f"consumer {consumer_cpu / received * 1e6:6.2f} us/sample CPU")
+
+if __name__ == "__main__":
+    main()
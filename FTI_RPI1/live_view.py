@@ -0,0 +1,77 @@
+import math
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from flight_log import convert
+
+MAX_SAMPLES = 1000  # Per stream and refresh; longer windows are decimated to about this many samples
+
+class LiveView:
+    ''' Console display kept out of the acquisition path. Every period it peeks at the newest samples
+    of each ring buffer (without consuming them, so the writer is unaffected), reduces each channel
+    to min/max/mean/RMS over that window and redraws one fixed-layout screen in a single write.
+    Runs at the lowest CPU priority, as a thread or as a process of its own. '''
+
+    def __init__(self, streams, channels, period=0.5, title="FTI live view", out=None):
+        # streams: {name: RingBuffer or SharedRingBuffer}; channels: {name: [(label, unit, calibration)]}
+        # per stream channel, the calibration (or None) turning raw counts into the unit
+        self.streams = streams
+        self.channels = channels
+        self.period = period
+        self.title = title
+        self.out = out or sys.stdout
+        self._cursors = {name: 0 for name in streams}
+
+    def stats(self, name, elapsed):
+        # (rate_hz, [(min, max, mean, rms) per channel]) over the samples since the last call
+        ring = self.streams[name]
+        nc = ring.num_channels
+        written, timestamps, values = ring.peek(self._cursors[name])
+        rate = (written - self._cursors[name]) / elapsed if self._cursors[name] and elapsed else 0.0
+        self._cursors[name] = written
+        count = len(timestamps)
+        step = max(1, count // MAX_SAMPLES)
+        result = []
+        for c, (_, _, calibration) in enumerate(self.channels[name]):
+            column = [convert(calibration, v) for v in values[c:count * nc:nc * step]]
+            column = [v for v in column if v == v]  # NaN marks a failed read
+            if not column:
+                result.append(None)
+                continue
+            result.append((min(column), max(column), sum(column) / len(column),
+                           math.sqrt(sum(v * v for v in column) / len(column))))
+        return rate, result
+
+    def render(self, elapsed):
+        lines = [f"{self.title}  {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}   "
+                 f"(every {self.period:g} s, min/max/mean/RMS since the last refresh)",
+                 f"{'Channel':<16}{'Unit':>5}{'Min':>12}{'Max':>12}{'Mean':>12}{'RMS':>12}{'Rate':>11}"]
+        for name in self.streams:
+            rate, stats = self.stats(name, elapsed)
+            for (label, unit, _), s in zip(self.channels[name], stats):
+                if s is None:
+                    lines.append(f"{label:<16}{unit:>5}{'--':>12}{'--':>12}{'--':>12}{'--':>12}{rate:>8.1f} Hz")
+                else:
+                    lines.append(f"{label:<16}{unit:>5}{s[0]:>12.4f}{s[1]:>12.4f}{s[2]:>12.4f}{s[3]:>12.4f}{rate:>8.1f} Hz")
+        return "\n".join(lines)
+
+    def run(self, stop_event):
+        lower_priority()
+        # On a terminal redraw in place (cursor home, clear); otherwise append one block per refresh
+        clear = "\x1b[H\x1b[2J" if self.out.isatty() else ""
+        last = time.monotonic()
+        while not stop_event.wait(self.period):
+            now = time.monotonic()
+            frame = self.render(now - last)
+            last = now
+            self.out.write(clear + frame + "\n")
+            self.out.flush()
+
+def lower_priority():
+    # Nice 19 for the calling thread only (Linux schedules threads as separate tasks)
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
@@ -0,0 +1,119 @@
+import fcntl
+import time
+
+I2C_SLAVE = 0x0703  # ioctl: address of the device the following read()/write() calls talk to
+
+# Registers
+REG_CONVERSION = 0x00
+REG_CONFIG = 0x01
+REG_LO_THRESH = 0x02
+REG_HI_THRESH = 0x03
+
+# Config register fields
+OS_SINGLE = 0x8000       # Write: start a single-shot conversion; read: 1 = no conversion in progress
+MODE_SINGLE = 0x0100     # Single-shot / power-down; clear for continuous conversion
+COMP_DISABLE = 0x0003    # COMP_QUE = 11: ALERT/RDY unused (power-on default)
+MUX_SINGLE_ENDED = 0x4   # MUX = 1xx: AIN<xx> against GND
+PGA_CODES = {2/3: 0, 1: 1, 2: 2, 4: 3, 8: 4, 16: 5}  # Adafruit-style gain -> PGA bits
+DATA_RATE_CODES = {8: 0, 16: 1, 32: 2, 64: 3, 128: 4, 250: 5, 475: 6, 860: 7}
+
+# Single-shot wait: sleep through most of the conversion, then poll OS. The oscillator is only
+# +/-10% and time.sleep() overshoots by around 0.1 ms, so the sleep stops short by both.
+OSCILLATOR_TOLERANCE = 0.10
+SLEEP_SLACK_S = 0.0001
+OS_POLL_PERIODS = 4  # Conversion periods to poll OS for before giving up on the chip
+
+# Full-scale volts per gain; one code is FULL_SCALE / 32767 like adafruit_ads1x15 and the log calibrations
+FULL_SCALE = {2/3: 6.144, 1: 4.096, 2: 2.048, 4: 1.024, 8: 0.512, 16: 0.256}
+
+def config_word(channel, gain, data_rate, single_shot=True):
+    # Config register value for a single-ended channel, ALERT/RDY comparator off
+    word = (MUX_SINGLE_ENDED | channel) << 12 | PGA_CODES[gain] << 9 | DATA_RATE_CODES[data_rate] << 5
+    if single_shot:
+        word |= OS_SINGLE | MODE_SINGLE | COMP_DISABLE
+    return word
+
+class ADS1115_I2C:
+    def __init__(self, bus=1, address=0x48, gain=1, data_rate=128):
+        self.bus = bus
+        self.address = address
+        self.i2c = self._open_bus(bus, address)
+        self.gain = gain
+        self.data_rate = data_rate
+        self._sleep_s = max(0.0, (1.0 - OSCILLATOR_TOLERANCE) / data_rate - SLEEP_SLACK_S)
+        self._poll_s = OS_POLL_PERIODS * (1.0 + OSCILLATOR_TOLERANCE) / data_rate
+        self._lsb = FULL_SCALE[gain] / 32767
+
+        # Preformatted frames: one config write per channel, one pointer write per register
+        self._start_frames = [bytes([REG_CONFIG]) + config_word(ch, gain, data_rate).to_bytes(2, 'big')
+                              for ch in range(4)]
+        self._pointer_frames = [bytes([reg]) for reg in range(4)]
+        self._write_buf = bytearray(3)
+        self._read_buf = bytearray(2)
+        self._pointer = None  # Register the chip's address pointer is on (it survives reads)
+
+    def _open_bus(self, bus, address):
+        i2c = open(f"/dev/i2c-{bus}", 'r+b', buffering=0)
+        fcntl.ioctl(i2c, I2C_SLAVE, address)
+        return i2c
+
+    def write_register(self, reg, value):
+        self._write_buf[0] = reg
+        self._write_buf[1] = value >> 8 & 0xFF
+        self._write_buf[2] = value & 0xFF
+        self.i2c.write(self._write_buf)
+        self._pointer = reg
+
+    def read_register(self, reg):
+        # Unsigned 16-bit; the pointer write is skipped when it is already on reg
+        if self._pointer != reg:
+            self.i2c.write(self._pointer_frames[reg])
+            self._pointer = reg
+        self.i2c.readinto(self._read_buf)
+        return self._read_buf[0] << 8 | self._read_buf[1]
+
+    def read_conversion(self):
+        # Last result as a signed int16 code
+        code = self.read_register(REG_CONVERSION)
+        return code - 0x10000 if code & 0x8000 else code
+
+    def read_channel(self, channel):
+        # One single-shot conversion: start it, sleep through the shortest possible conversion time,
+        # then poll OS (one 2-byte read each, the pointer is already on the config register) for at
+        # most OS_POLL_PERIODS conversion periods
+        self.i2c.write(self._start_frames[channel])
+        self._pointer = REG_CONFIG
+        time.sleep(self._sleep_s)
+        deadline = time.perf_counter() + self._poll_s
+        while not self.read_register(REG_CONFIG) & OS_SINGLE:
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"ADS1115 0x{self.address:02X} channel {channel}: conversion did not finish")
+        return self.read_conversion()
+
+    def read_channels(self, channels=(0, 1, 2, 3)):
+        # One raw int16 code per channel, converted back to back
+        return [self.read_channel(ch) for ch in channels]
+
+    def to_voltage(self, code):
+        return code * self._lsb
+
+    def channel(self, channel):
+        return ADS1115Channel(self, channel)
+
+    def close(self):
+        self.i2c.close()
+
+class ADS1115Channel:
+    ''' One single-ended input with the .value/.voltage interface of adafruit_ads1x15 AnalogIn '''
+
+    def __init__(self, ads, channel):
+        self.ads = ads
+        self.channel = channel
+
+    @property
+    def value(self):
+        return self.ads.read_channel(self.channel)
+
+    @property
+    def voltage(self):
+        return self.ads.to_voltage(self.ads.read_channel(self.channel))
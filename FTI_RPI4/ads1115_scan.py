@@ -0,0 +1,163 @@
+import threading
+import time
+from collections import deque
+import lgpio
+from I2c_ads1115 import REG_CONVERSION, REG_CONFIG, REG_LO_THRESH, REG_HI_THRESH, MODE_SINGLE, COMP_DISABLE, config_word
+
+# Lo_thresh MSB 0 and Hi_thresh MSB 1 turn ALERT/RDY into a conversion-ready pulse
+RDY_LO_THRESH = 0x0000
+RDY_HI_THRESH = 0x8000
+
+ATTRIBUTION_MARGIN_NS = 50_000  # A config write this close to a conversion start is treated as ambiguous
+# Wall-clock to time.monotonic_ns() offset for the RDY ticks, taken again once this old or when the
+# wall clock has stepped back, so an NTP or GPS step only affects results up to the next refresh
+TICK_OFFSET_REFRESH_NS = 1_000_000_000
+
+class AdafruitRegisters:
+    ''' ADS1115 register access through the I2C device of an adafruit_ads1x15 ADS1115 object,
+    the same interface as I2c_ads1115.ADS1115_I2C '''
+
+    def __init__(self, ads):
+        self.device = ads.i2c_device
+        self._write_buf = bytearray(3)
+        self._pointer = bytearray(1)
+        self._read_buf = bytearray(2)
+
+    def write_register(self, reg, value):
+        self._write_buf[0] = reg
+        self._write_buf[1] = value >> 8
+        self._write_buf[2] = value & 0xFF
+        with self.device as i2c:
+            i2c.write(self._write_buf)
+
+    def read_register(self, reg):
+        self._pointer[0] = reg
+        with self.device as i2c:
+            i2c.write_then_readinto(self._pointer, self._read_buf)
+        return self._read_buf[0] << 8 | self._read_buf[1]
+
+    def read_conversion(self):
+        code = self.read_register(REG_CONVERSION)
+        return code - 0x10000 if code & 0x8000 else code
+
+class ADS1115Scanner:
+    ''' Continuous-conversion channel sequencer for the ADS1115 single-ended inputs. The ADC
+    converts back to back at data_rate and pulses ALERT/RDY at the end of every conversion; each
+    pulse the result is read and the multiplexer is pointed at the next channel. A config write
+    only applies from the conversion after the one in progress, so every conversion is still a
+    fresh channel (data_rate / len(channels) scans/s). The channel of each result is looked up
+    from when the config writes landed relative to that conversion's start, so a pulse handled
+    late costs that sample, never a mislabelled one. '''
+
+    def __init__(self, registers, rdy_pin, channels=(0, 1, 2, 3), gain=1, data_rate=860):
+        # registers: I2c_ads1115.ADS1115_I2C, or AdafruitRegisters around an Adafruit ADS1115
+        self.registers = registers
+        self.rdy_pin = rdy_pin
+        self.channels = list(channels)
+        self.data_rate = data_rate
+        self.period_ns = int(1e9 / data_rate)
+        self._configs = {ch: config_word(ch, gain, data_rate, single_shot=False) for ch in self.channels}
+        self.gpio_handle = None
+        self._rdy_callback = None
+        self._edge = threading.Event()
+        self._edge_tick = 0    # lgpio tick (ns since epoch) of the newest RDY edge
+        self._prev_tick = 0    # Edge the previous poll() handled
+        self._tick_offset = 0
+        self._offset_ns = 0    # Wall-clock ns at which _tick_offset was taken
+        self._writes = deque(maxlen=8)  # (completion time ns since epoch, channel) of config writes
+        self._next = 0
+        self.conversions = 0   # Results attributed to a channel
+        self.late = 0          # Results overwritten by the next conversion before they were read
+        self.unattributed = 0  # Results whose channel could not be told for certain
+        self.started_ns = None
+
+    def _write_channel(self, index):
+        channel = self.channels[index]
+        self.registers.write_register(REG_CONFIG, self._configs[channel])
+        self._writes.append((time.time_ns(), channel))
+
+    def start(self):
+        self.registers.write_register(REG_LO_THRESH, RDY_LO_THRESH)
+        self.registers.write_register(REG_HI_THRESH, RDY_HI_THRESH)
+        if self.gpio_handle is None:
+            self.gpio_handle = lgpio.gpiochip_open(0)
+            if self.gpio_handle < 0:
+                raise RuntimeError("Failed to open GPIO chip")
+        err = lgpio.gpio_claim_alert(self.gpio_handle, self.rdy_pin, lgpio.FALLING_EDGE)
+        if err < 0:
+            raise RuntimeError(f"Failed to claim GPIO {self.rdy_pin} for alerts")
+        self._offset_ns = time.time_ns()
+        self._tick_offset = time.monotonic_ns() - self._offset_ns
+        self._edge.clear()
+        self._rdy_callback = lgpio.callback(self.gpio_handle, self.rdy_pin, lgpio.FALLING_EDGE, self._on_ready)
+        # The first write starts conversions on channels[0]; the second is queued behind it
+        self._write_channel(0)
+        self._next = 1 % len(self.channels)
+        self._write_channel(self._next)
+        self.started_ns = time.monotonic_ns()
+
+    def _on_ready(self, chip, gpio, level, tick):
+        self._edge_tick = tick
+        self._edge.set()
+
+    def _channel_at(self, start_ns):
+        # Channel configured when the conversion starting at start_ns began, or None if unsure
+        channel = None
+        for done_ns, written in self._writes:
+            if abs(done_ns - start_ns) < ATTRIBUTION_MARGIN_NS:
+                return None
+            if done_ns < start_ns:
+                channel = written
+        return channel
+
+    def poll(self, timeout=None):
+        # Waits for the next RDY pulse; returns [(channel, timestamp_ns, code)], empty on timeout or
+        # when the result had to be dropped. The timestamp is the conversion's midpoint on the
+        # time.monotonic_ns() clock.
+        if not self._edge.wait(timeout):
+            return []
+        self._edge.clear()
+        tick = self._edge_tick
+        read_ns = time.time_ns()
+        if not 0 <= read_ns - self._offset_ns < TICK_OFFSET_REFRESH_NS:
+            self._offset_ns = read_ns
+            self._tick_offset = time.monotonic_ns() - read_ns
+        code = self.registers.read_conversion()
+        # Queue the next channel straight away so it is in place before the next conversion starts
+        self._next = (self._next + 1) % len(self.channels)
+        self._write_channel(self._next)
+        prev_tick, self._prev_tick = self._prev_tick, tick
+        if read_ns - tick >= self.period_ns * 0.9:
+            self.late += 1
+            return []
+        # Back-to-back conversions: this one began at the previous edge, if that edge was not missed
+        start_ns = prev_tick if 0 < tick - prev_tick < 1.5 * self.period_ns else tick - self.period_ns
+        channel = self._channel_at(start_ns)
+        if channel is None:
+            self.unattributed += 1
+            return []
+        self.conversions += 1
+        return [(channel, (start_ns + tick) // 2 + self._tick_offset, code)]
+
+    def scan_rate(self):
+        # Achieved full scans per second since start()
+        if self.started_ns is None:
+            return 0.0
+        elapsed = (time.monotonic_ns() - self.started_ns) / 1e9
+        return self.conversions / len(self.channels) / elapsed if elapsed else 0.0
+
+    def report(self, label):
+        return (f"[{label}] {self.scan_rate():.1f} scans/s of {len(self.channels)} channels "
+                f"(limit {self.data_rate / len(self.channels):.1f}), {self.conversions} conversions, "
+                f"{self.late} read too late, {self.unattributed} unattributed")
+
+    def stop(self):
+        # Back to single-shot with ALERT/RDY off, as the Adafruit driver expects the chip
+        if self._rdy_callback is not None:
+            self._rdy_callback.cancel()
+            self._rdy_callback = None
+        self.registers.write_register(REG_CONFIG, self._configs[self.channels[0]] | MODE_SINGLE | COMP_DISABLE)
+        if self.gpio_handle is not None:
+            lgpio.gpio_free(self.gpio_handle, self.rdy_pin)
+            lgpio.gpiochip_close(self.gpio_handle)
+            self.gpio_handle = None
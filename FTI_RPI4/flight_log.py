@@ -0,0 +1,702 @@
+''' Binary flight log (.ftl) and the CSV writer behind one append()/commit_if_due()/close() interface.
+Usage: python flight_log.py <log.ftl> [out.csv]   converts a binary log to the CSV layout
+       python flight_log.py <run.manifest.json>     converts every binary segment of a run
+A column logged as raw counts carries its calibration in the header and is converted to
+engineering units on the way out. '''
+import csv
+import io
+import json
+import lzma
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from timebase import ClockAnchor
+
+# File layout (little-endian, every section starts on an ALIGN boundary):
+#   preamble  MAGIC, header length, JSON header (columns, units, rates, calibration, clock anchor)
+#   blocks    BLOCK_MAGIC, rows used, first/last timestamp, then the int64 timestamp column and one
+#             column per channel, each block_rows long; every block has the same size
+#             or, with a codec: ZBLOCK_MAGIC, rows used, first/last timestamp, payload length and
+#             CRC32, then the compressed length of every column and the compressed columns
+#   footer    one index entry per block, then the trailer (index offset, block count, END_MAGIC)
+# A log cut off by a crash has no footer; its blocks are still found by walking them in order.
+MAGIC = b"FTILOG01"
+END_MAGIC = b"FTIEND01"
+BLOCK_MAGIC = b"BLK1"
+ZBLOCK_MAGIC = b"BLKZ"
+ALIGN = 4096             # SD-card page size
+BLOCK_BYTES = ALIGN      # Default block size; rows per block follow from the channel count
+COMPRESSED_BLOCK_ROWS = 1024  # Compressed blocks are variable-size; more rows compress better
+COMMIT_BYTES = 64 * 1024  # Default size trigger for a group commit
+MANIFEST_SUFFIX = ".manifest.json"
+
+_PREAMBLE = struct.Struct('<8sI')      # magic, header JSON length
+_BLOCK_HEAD = struct.Struct('<4sIqq')  # magic, rows used, first/last timestamp (ns)
+_INDEX_ENTRY = struct.Struct('<QIqq')  # block offset, rows used, first/last timestamp (ns)
+_TRAILER = struct.Struct('<QQ8s')      # index offset, block count, end magic
+_ZBLOCK_HEAD = struct.Struct('<4sIqqII')  # magic, rows used, first/last timestamp (ns), payload length, CRC32
+
+_NUMPY_DTYPES = {'h': '<i2', 'i': '<i4', 'q': '<i8', 'f': '<f4', 'd': '<f8'}
+_TYPECODES = {v: k for k, v in _NUMPY_DTYPES.items()}
+_UNSIGNED = {'h': 'H', 'i': 'I', 'q': 'Q', 'f': 'I', 'd': 'Q'}  # Same-width integer view used for delta coding
+
+# Block codecs: (compress(data, level), decompress(data)); lz4 and zstd only when installed
+_CODECS = {
+    "zlib": (lambda data, level: zlib.compress(data, 1 if level is None else level), zlib.decompress),
+    "lzma": (lambda data, level: lzma.compress(data, preset=0 if level is None else level), lzma.decompress),
+}
+try:
+    import lz4.frame
+    _CODECS["lz4"] = (lambda data, level: lz4.frame.compress(data, compression_level=level or 0), lz4.frame.decompress)
+except ImportError:
+    pass
+try:
+    import zstandard
+    _CODECS["zstd"] = (lambda data, level: zstandard.ZstdCompressor(level=3 if level is None else level).compress(data),
+                       lambda data: zstandard.ZstdDecompressor().decompress(data))
+except ImportError:
+    pass
+
+# Raw-count calibrations: raw counts -> engineering units. Each takes (calibration, raw, xp), where
+# xp supplies where/maximum/nan: numpy for whole columns, _Scalar for one value at a time.
+def _linear(cal, raw, xp):
+    return raw * cal["scale"] + cal.get("offset", 0.0)
+
+def _ads_pressure_bar(cal, raw, xp):
+    # 0.5 V..(ref - 0.5) V sensor over 0..100 psi, clamped at 0 psi below 0.5 V and 100 psi above
+    # ref - 0.8 V, then the 0.82 / -0.017 bar field correction (fti_rpi6 pressure_thread)
+    volts = raw * cal["scale"]
+    ref = cal["ref"]
+    psi = xp.where(volts < 0.5, 0.0, xp.where(volts > ref - 0.8, 100.0, (volts - 0.5) / (ref - 0.5) * 100.0))
+    return xp.maximum(0.82 * psi * 0.0689 - 0.017, 0.0)
+
+CONVERSIONS = {"linear": _linear, "ads_pressure_bar": _ads_pressure_bar}
+
+class _Scalar:
+    nan = float("nan")
+    where = staticmethod(lambda condition, a, b: a if condition else b)
+    maximum = staticmethod(max)
+
+def convert(calibration, raw, xp=_Scalar):
+    # raw -> engineering units by a column calibration ({"type": ..., params}, None = already
+    # converted). A raw value equal to calibration["invalid"] (a failed read) becomes NaN.
+    if calibration is None:
+        return raw
+    value = CONVERSIONS[calibration["type"]](calibration, raw, xp)
+    if "invalid" in calibration:
+        value = xp.where(raw == calibration["invalid"], xp.nan, value)
+    return value
+
+def _align(n):
+    return -(-n // ALIGN) * ALIGN
+
+def _le(arr):
+    # Column bytes are always little-endian on disk
+    if sys.byteorder != 'little':
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+def _delta_zigzag(raw, out, previous):
+    # Appends the zigzag-coded differences of raw (unsigned view of the column) to out, starting
+    # from previous; small steps either way become small unsigned numbers. Returns the last value.
+    bits = raw.itemsize * 8
+    mask = (1 << bits) - 1
+    sign = 1 << (bits - 1)
+    for value in raw:
+        delta = (value - previous) & mask
+        out.append(((delta << 1) & mask) ^ (mask if delta & sign else 0))
+        previous = value
+    return previous
+
+def _undelta_zigzag(encoded):
+    bits = encoded.itemsize * 8
+    mask = (1 << bits) - 1
+    out = array(encoded.typecode)
+    value = 0
+    for zz in encoded:
+        value = (value + ((zz >> 1) ^ (mask if zz & 1 else 0))) & mask
+        out.append(value)
+    return out
+
+class _GroupCommit:
+    ''' Rows are appended in memory and reach the card in one write per commit. A commit is due
+    once commit_interval seconds or commit_bytes of rows have built up since the last one, so a
+    power cut loses at most that much; with fsync the data is on the card, not just in the page
+    cache. commit_interval=0 commits on every commit_if_due() call. '''
+
+    def _init_commit(self, commit_interval, commit_bytes, fsync):
+        self.commit_interval_ns = int(commit_interval * 1e9)
+        self.commit_bytes = commit_bytes
+        self.fsync = fsync
+        self.commits = 0
+        self.writes = 0  # write calls issued
+        self.bytes_written = 0
+        self._last_commit_ns = time.monotonic_ns()
+
+    def commit_if_due(self):
+        pending = self.pending_bytes()
+        if pending and (pending >= self.commit_bytes or
+                        time.monotonic_ns() - self._last_commit_ns >= self.commit_interval_ns):
+            self.commit()
+
+    def _committed(self, fd):
+        if self.fsync:
+            os.fsync(fd)
+        self.commits += 1
+        self._last_commit_ns = time.monotonic_ns()
+
+    def durability(self):
+        return (f"commit every {self.commit_interval_ns / 1e9:g} s or {self.commit_bytes // 1024} KiB"
+                f"{' with fsync' if self.fsync else ''}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class CsvLogWriter(_GroupCommit):
+    ''' The original text layout; rows are formatted into a memory buffer and written per commit '''
+
+    def __init__(self, path, csv_header, anchor, commit_interval=0, commit_bytes=COMMIT_BYTES, fsync=False):
+        self.path = path
+        self.anchor = anchor
+        self.file = open(path, mode='wb', buffering=0)
+        self._buffer = io.StringIO()
+        self.writer = csv.writer(self._buffer)
+        self.writer.writerow(csv_header)
+        self._init_commit(commit_interval, commit_bytes, fsync)
+
+    def append(self, timestamp_ns, values):
+        self.writer.writerow([self.anchor.format(timestamp_ns)] + list(values))
+
+    def pending_bytes(self):
+        return self._buffer.tell()
+
+    def size(self):
+        # Bytes the file holds once the rows appended so far are committed
+        return self.bytes_written + self._buffer.tell()
+
+    def commit(self):
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self.file.write(data)
+        self.writes += 1
+        self.bytes_written += len(data)
+        self._committed(self.file.fileno())
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.commit()
+        self.file.close()
+
+class FlightLogWriter(_GroupCommit):
+    ''' Writes rows into columnar blocks. Values are stored as typed binary (float32 by default,
+    or one typecode per column) instead of formatted text. A commit writes the blocks filled since
+    the last one and the rows added to the partly filled block in a single write. Uncompressed
+    blocks are a fixed ALIGN-rounded size (one page by default) and the partial block is rewritten
+    in place. With a codec each column of a block is delta/zigzag encoded and compressed on its
+    own, so any block and any column decodes independently; a commit appends the new rows as a
+    small tail block, and once the block fills it is compressed whole and written over its tails. '''
+
+    def __init__(self, path, columns, anchor, csv_header=None, meta=None, typecode='f', block_rows=None,
+                 codec=None, codec_level=None, commit_interval=0, commit_bytes=COMMIT_BYTES, fsync=False):
+        # columns: [(name, unit)] or [(name, unit, calibration)] in row order, a calibration marking
+        # a column of raw counts (see convert()); typecode: one array typecode or one per column;
+        # meta: rates, calibration and anything else worth keeping
+        if codec is not None and codec not in _CODECS:
+            raise ValueError(f"Codec {codec!r} not available, expected one of {sorted(_CODECS)}")
+        self.path = path
+        self.num_channels = len(columns)
+        self.typecodes = [typecode] * self.num_channels if isinstance(typecode, str) else list(typecode)
+        self.codec = codec
+        self.codec_level = codec_level
+        self.row_size = 8 + sum(array(tc).itemsize for tc in self.typecodes)
+        if block_rows is None:
+            if codec is None:
+                block_rows = max(1, (BLOCK_BYTES - _BLOCK_HEAD.size) // self.row_size)
+            else:
+                block_rows = COMPRESSED_BLOCK_ROWS
+        self.block_rows = block_rows
+        self.block_size = _align(_BLOCK_HEAD.size + block_rows * self.row_size)
+        header_columns = []
+        for (name, unit, *calibration), tc in zip(columns, self.typecodes):
+            column = {"name": name, "unit": unit, "dtype": _NUMPY_DTYPES[tc]}
+            if calibration and calibration[0] is not None:
+                column["calibration"] = calibration[0]
+            header_columns.append(column)
+        header = {
+            "version": 1,
+            "columns": header_columns,
+            "codec": codec,
+            "block_rows": block_rows,
+            "block_size": None if codec else self.block_size,
+            "clock": {"mono_ns": anchor.mono_ns, "wall_ns": anchor.wall_ns},
+            "csv_header": csv_header or ["Timestamp"] + [f"{column[0]} ({column[1]})" for column in columns],
+            "meta": meta or {},
+        }
+        header_json = json.dumps(header).encode()
+        self.data_offset = _align(_PREAMBLE.size + len(header_json))
+        self.file = open(path, 'wb', buffering=0)
+        self.file.write((_PREAMBLE.pack(MAGIC, len(header_json)) + header_json).ljust(self.data_offset, b'\0'))
+        self.index = []          # (offset, rows, first_ns, last_ns) of every block written
+        self.rows = 0            # Rows in the block being filled
+        self.committed_rows = 0  # Of those, rows already written out
+        self._pending_rows = 0   # Rows appended since the last commit
+        self._full_blocks = []   # Blocks filled since the last commit, not yet written
+        self._block_start = self.data_offset    # File offset of the block being filled
+        self._commit_offset = self.data_offset  # Where the next commit's write starts
+        self.timestamps = array('q', [0]) * block_rows
+        self.columns = [array(tc, [0]) * block_rows for tc in self.typecodes]
+        self._init_commit(commit_interval, commit_bytes, fsync)
+
+    def append(self, timestamp_ns, values):
+        n = self.rows
+        self.timestamps[n] = timestamp_ns
+        for column, value in zip(self.columns, values):
+            column[n] = value
+        self.rows = n + 1
+        self._pending_rows += 1
+        if self.rows == self.block_rows:
+            self._write_block()
+
+    def _block_bytes(self, start=0):
+        # Rows start..rows of the block being filled; compressed unless the log is uncompressed
+        n = self.rows
+        if self.codec is None:
+            head = _BLOCK_HEAD.pack(BLOCK_MAGIC, n, self.timestamps[0], self.timestamps[n - 1])
+            body = [head, _le(self.timestamps)] + [_le(column) for column in self.columns]
+            return b''.join(body).ljust(self.block_size, b'\0')
+        compress = _CODECS[self.codec][0]
+        streams = []
+        for column, tc in zip([self.timestamps] + self.columns, ['q'] + self.typecodes):
+            encoded = array(_UNSIGNED[tc])
+            _delta_zigzag(array(_UNSIGNED[tc], column[start:n].tobytes()), encoded, 0)
+            streams.append(compress(_le(encoded), self.codec_level))
+        payload = struct.pack(f'<{len(streams)}I', *map(len, streams)) + b''.join(streams)
+        head = _ZBLOCK_HEAD.pack(ZBLOCK_MAGIC, n - start, self.timestamps[start], self.timestamps[n - 1],
+                                 len(payload), zlib.crc32(payload))
+        return head + payload
+
+    def _write_block(self):
+        # The block is complete: queue it for the next commit (written from the block's start,
+        # over any partial copy or tails) and start the next one
+        if not self._full_blocks:
+            self._commit_offset = self._block_start
+        data = self._block_bytes()
+        self._full_blocks.append(data)
+        self.index.append((self._block_start, self.rows, self.timestamps[0], self.timestamps[self.rows - 1]))
+        self._block_start += len(data)
+        self.rows = 0
+        self.committed_rows = 0
+
+    def pending_bytes(self):
+        return self._pending_rows * self.row_size
+
+    def size(self):
+        # Bytes the file holds for the rows appended so far, footer aside: the blocks before the one
+        # being filled plus that block's rows. bytes_written is no measure of this, as it counts
+        # every rewrite of the partial block. A compressed log counts the partial block's rows
+        # uncompressed, so it errs on the large side by at most one block.
+        return self._block_start + (_BLOCK_HEAD.size + self.rows * self.row_size if self.rows else 0)
+
+    def commit(self):
+        # Every block filled since the last commit plus the partial block (uncompressed) or a tail
+        # block of its new rows (compressed), in one contiguous write
+        data = self._full_blocks
+        if self.rows > self.committed_rows:
+            data.append(self._block_bytes(0 if self.codec is None else self.committed_rows))
+            self.committed_rows = self.rows
+        end = self._commit_offset
+        if data:
+            data = b''.join(data)
+            os.pwrite(self.file.fileno(), data, self._commit_offset)
+            self.writes += 1
+            self.bytes_written += len(data)
+            end += len(data)
+        self._full_blocks = []
+        self._commit_offset = self._block_start if self.codec is None else end
+        self._pending_rows = 0
+        self._committed(self.file.fileno())
+
+    def close(self):
+        if self.file.closed:
+            return
+        if self.rows:
+            self._write_block()
+        self.commit()
+        index_offset = self._block_start
+        footer = b''.join(_INDEX_ENTRY.pack(*entry) for entry in self.index)
+        footer += _TRAILER.pack(index_offset, len(self.index), END_MAGIC)
+        os.pwrite(self.file.fileno(), footer, index_offset)
+        os.ftruncate(self.file.fileno(), index_offset + len(footer))  # Drop tails left behind
+        self._committed(self.file.fileno())
+        self.file.close()
+
+class SegmentedLog:
+    ''' Splits one run into numbered segment files (<stem>_001.csv, ...), rolled by size or
+    duration, plus <stem>.manifest.json listing every segment's time range. The manifest is
+    replaced atomically whenever a segment opens or closes, so after a crash only the last
+    segment is left marked open and every earlier one is a complete, self-contained log. '''
+
+    def __init__(self, path_stem, open_segment, anchor, segment_bytes=None, segment_seconds=None):
+        # open_segment(segment_stem) returns the writer for one segment
+        self.path_stem = path_stem
+        self.manifest_path = path_stem + MANIFEST_SUFFIX
+        self.anchor = anchor
+        self.segment_bytes = segment_bytes
+        self.segment_ns = None if segment_seconds is None else int(segment_seconds * 1e9)
+        self._open_segment = open_segment
+        self.segments = []  # Manifest entries, one per segment
+        self._closed_totals = [0, 0, 0]  # commits, writes, bytes_written of finished segments
+        self.log = None
+        self._roll()
+
+    @property
+    def path(self):
+        return self.log.path
+
+    @property
+    def commits(self):
+        return self._closed_totals[0] + self.log.commits
+
+    @property
+    def writes(self):
+        return self._closed_totals[1] + self.log.writes
+
+    @property
+    def bytes_written(self):
+        return self._closed_totals[2] + self.log.bytes_written
+
+    def durability(self):
+        limits = []
+        if self.segment_bytes:
+            limits.append(f"{self.segment_bytes / 2**20:g} MiB")
+        if self.segment_ns:
+            limits.append(f"{self.segment_ns / 60e9:g} min")
+        return f"{self.log.durability()}, new segment every {' or '.join(limits)}"
+
+    def _write_manifest(self):
+        manifest = {
+            "version": 1,
+            "clock": {"mono_ns": self.anchor.mono_ns, "wall_ns": self.anchor.wall_ns},
+            "segment_bytes": self.segment_bytes,
+            "segment_seconds": self.segment_ns and self.segment_ns / 1e9,
+            "segments": self.segments,
+        }
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(manifest, file, indent=1)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def _finish_segment(self):
+        self.log.close()
+        for i, value in enumerate((self.log.commits, self.log.writes, self.log.bytes_written)):
+            self._closed_totals[i] += value
+        entry = self.segments[-1]
+        entry["closed"] = True
+        entry["bytes"] = os.path.getsize(self.log.path)
+        if entry["rows"]:
+            entry["start"] = self.anchor.format(entry["first_ns"])
+            entry["end"] = self.anchor.format(entry["last_ns"])
+
+    def _roll(self):
+        if self.log is not None:
+            self._finish_segment()
+        number = len(self.segments) + 1
+        self.log = self._open_segment(f"{self.path_stem}_{number:03d}")
+        self.segments.append({"file": os.path.basename(self.log.path), "number": number,
+                              "first_ns": None, "last_ns": None, "rows": 0, "closed": False})
+        self._write_manifest()
+
+    def _roll_due(self, timestamp_ns):
+        entry = self.segments[-1]
+        if not entry["rows"]:
+            return False
+        if self.segment_ns and timestamp_ns - entry["first_ns"] >= self.segment_ns:
+            return True
+        return bool(self.segment_bytes) and self.log.size() >= self.segment_bytes
+
+    def append(self, timestamp_ns, values):
+        if self._roll_due(timestamp_ns):
+            self._roll()
+            print(f"[Log] Rolled to {self.log.path}")
+        self.log.append(timestamp_ns, values)
+        entry = self.segments[-1]
+        if entry["first_ns"] is None:
+            entry["first_ns"] = timestamp_ns
+        entry["last_ns"] = timestamp_ns
+        entry["rows"] += 1
+
+    def commit_if_due(self):
+        self.log.commit_if_due()
+
+    def commit(self):
+        self.log.commit()
+
+    def close(self):
+        if self.segments[-1]["closed"]:
+            return
+        self._finish_segment()
+        self._write_manifest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_log(path_stem, log_format, columns, anchor, csv_header, meta=None,
+             segment_bytes=None, segment_seconds=None, codec=None, typecode='f', **commit):
+    # "csv" keeps the text layout; "binary" writes <path_stem>.ftl, compressed when a codec is
+    # given, with typecode per FlightLogWriter (raw counts need "binary"). With segment_bytes
+    # and/or segment_seconds the run is split into segments (see SegmentedLog).
+    # commit: commit_interval, commit_bytes, fsync (see _GroupCommit)
+    if log_format not in ("csv", "binary"):
+        raise ValueError(f"Unknown log format {log_format!r}, expected 'csv' or 'binary'")
+
+    def open_single(stem):
+        if log_format == "binary":
+            return FlightLogWriter(stem + ".ftl", columns, anchor, csv_header, meta, typecode, codec=codec, **commit)
+        return CsvLogWriter(stem + ".csv", csv_header, anchor, **commit)
+
+    if segment_bytes or segment_seconds:
+        return SegmentedLog(path_stem, open_single, anchor, segment_bytes, segment_seconds)
+    return open_single(path_stem)
+
+class FlightLogReader:
+    ''' Reads a .ftl log. Works from the footer index when present, otherwise recovers every
+    block that was committed before a log was cut off. '''
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            magic, header_len = _PREAMBLE.unpack(file.read(_PREAMBLE.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a flight log")
+            self.header = json.loads(file.read(header_len))
+            self.codec = self.header["codec"]
+            self.block_size = self.header["block_size"]
+            self.block_rows = self.header["block_rows"]
+            self.data_offset = _align(_PREAMBLE.size + header_len)
+            self.index, self.complete = self._read_index(file)
+        if self.codec is not None and self.codec not in _CODECS:
+            raise ValueError(f"{path} needs the {self.codec} codec, which is not installed")
+        self.columns = [column["name"] for column in self.header["columns"]]
+        self.units = [column["unit"] for column in self.header["columns"]]
+        self.dtypes = [column["dtype"] for column in self.header["columns"]]
+        self.typecodes = [_TYPECODES[dtype] for dtype in self.dtypes]
+        self.calibrations = [column.get("calibration") for column in self.header["columns"]]
+        self.num_rows = sum(entry[1] for entry in self.index)
+
+    def _read_index(self, file):
+        # Returns (index, complete); complete is False when the footer is missing
+        size = file.seek(0, os.SEEK_END)
+        if size >= self.data_offset + _TRAILER.size:
+            file.seek(size - _TRAILER.size)
+            index_offset, count, end = _TRAILER.unpack(file.read(_TRAILER.size))
+            if end == END_MAGIC:
+                file.seek(index_offset)
+                return list(_INDEX_ENTRY.iter_unpack(file.read(count * _INDEX_ENTRY.size))), True
+        # No footer: walk the blocks; the last one may be a committed partial block
+        index = []
+        offset = self.data_offset
+        file.seek(offset)
+        while True:
+            if self.codec is None:
+                block = file.read(self.block_size)
+                if len(block) < self.block_size:
+                    break
+                magic, rows, first_ns, last_ns = _BLOCK_HEAD.unpack_from(block)
+                if magic != BLOCK_MAGIC or rows == 0:
+                    break
+                index.append((offset, rows, first_ns, last_ns))
+                offset += self.block_size
+            else:
+                head = file.read(_ZBLOCK_HEAD.size)
+                if len(head) < _ZBLOCK_HEAD.size:
+                    break
+                magic, rows, first_ns, last_ns, length, crc = _ZBLOCK_HEAD.unpack(head)
+                if magic != ZBLOCK_MAGIC or rows == 0 or (index and first_ns <= index[-1][3]):
+                    break  # Not a block, or a stale tail behind a block that replaced it
+                payload = file.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break  # Torn write
+                index.append((offset, rows, first_ns, last_ns))
+                offset += _ZBLOCK_HEAD.size + length
+        return index, False
+
+    def blocks(self, start_ns=None, end_ns=None):
+        # Index entries whose time range overlaps [start_ns, end_ns]
+        return [entry for entry in self.index
+                if (start_ns is None or entry[3] >= start_ns) and (end_ns is None or entry[2] <= end_ns)]
+
+    def _read_block(self, file, entry, wanted=None):
+        # (timestamps, {column index: values}) of one block as arrays trimmed to its rows;
+        # wanted limits which columns are read (None = all)
+        offset, rows, _, _ = entry
+        wanted = range(len(self.columns)) if wanted is None else wanted
+        typecodes = ['q'] + self.typecodes
+        if self.codec is None:
+            arrays = []
+            position = offset + _BLOCK_HEAD.size
+            for k, tc in enumerate(typecodes):
+                nbytes = array(tc).itemsize * self.block_rows
+                if k == 0 or k - 1 in wanted:
+                    file.seek(position)
+                    arr = array(tc)
+                    arr.frombytes(file.read(nbytes))
+                    if sys.byteorder != 'little':
+                        arr.byteswap()
+                    arrays.append(arr[:rows])
+                else:
+                    arrays.append(None)
+                position += nbytes
+        else:
+            file.seek(offset)
+            length = _ZBLOCK_HEAD.unpack(file.read(_ZBLOCK_HEAD.size))[4]
+            payload = file.read(length)
+            lengths = struct.unpack_from(f'<{len(typecodes)}I', payload)
+            position = 4 * len(typecodes)
+            decompress = _CODECS[self.codec][1]
+            arrays = []
+            for k, (tc, nbytes) in enumerate(zip(typecodes, lengths)):
+                if k == 0 or k - 1 in wanted:
+                    encoded = array(_UNSIGNED[tc])
+                    encoded.frombytes(decompress(payload[position:position + nbytes]))
+                    if sys.byteorder != 'little':
+                        encoded.byteswap()
+                    arrays.append(array(tc, _undelta_zigzag(encoded).tobytes()))
+                else:
+                    arrays.append(None)
+                position += nbytes
+        return arrays[0], {c: arrays[c + 1] for c in wanted}
+
+    def rows(self, start_ns=None, end_ns=None, raw=False):
+        # Yields (timestamp_ns, values) in file order, raw-count columns converted unless raw;
+        # pure Python, no numpy needed
+        calibrations = [None] * len(self.columns) if raw else self.calibrations
+        with open(self.path, 'rb') as file:
+            for entry in self.blocks(start_ns, end_ns):
+                timestamps, columns = self._read_block(file, entry)
+                columns = [columns[c] for c in range(len(self.columns))]
+                for i, t in enumerate(timestamps):
+                    if (start_ns is None or t >= start_ns) and (end_ns is None or t <= end_ns):
+                        yield t, [convert(cal, column[i]) for column, cal in zip(columns, calibrations)]
+
+    def memmap(self):
+        # Every block as one numpy record: 'rows', 'first_ns', 'last_ns', 't' (block_rows,) and one
+        # field 'c<i>' (block_rows,) per channel; nothing is read until a field is touched.
+        # Only uncompressed logs have the fixed block layout this needs.
+        import numpy as np  # Only the offline reader needs numpy
+        if self.codec is not None:
+            raise ValueError(f"{self.path} is {self.codec}-compressed; use channel() instead of memmap()")
+        dtype = np.dtype({
+            'names': ['magic', 'rows', 'first_ns', 'last_ns', 't'] + [f"c{c}" for c in range(len(self.columns))],
+            'formats': ['S4', '<u4', '<i8', '<i8', ('<i8', (self.block_rows,))] +
+                       [(dtype, (self.block_rows,)) for dtype in self.dtypes],
+            'itemsize': self.block_size,
+        })
+        return np.memmap(self.path, dtype=dtype, mode='r', offset=self.data_offset, shape=(len(self.index),))
+
+    def channel(self, name, raw=False):
+        # (timestamps_ns, values) numpy arrays for one channel across the whole log, a raw-count
+        # channel converted in one vectorized pass unless raw; a compressed log only decodes that
+        # channel's streams
+        import numpy as np
+        c = self.columns.index(name)
+        if not self.index:
+            timestamps, values = np.empty(0, 'i8'), np.empty(0, self.dtypes[c])
+        elif self.codec is None:
+            blocks = self.memmap()
+            counts = [entry[1] for entry in self.index]
+            timestamps = np.concatenate([blocks['t'][b, :n] for b, n in enumerate(counts)])
+            values = np.concatenate([blocks[f"c{c}"][b, :n] for b, n in enumerate(counts)])
+        else:
+            timestamps, values = [], []
+            with open(self.path, 'rb') as file:
+                for entry in self.index:
+                    t, columns = self._read_block(file, entry, [c])
+                    timestamps.append(np.frombuffer(t, 'i8'))
+                    values.append(np.frombuffer(columns[c], self.dtypes[c]))
+            timestamps, values = np.concatenate(timestamps), np.concatenate(values)
+        if raw or self.calibrations[c] is None:
+            return timestamps, values
+        return timestamps, convert(self.calibrations[c], values.astype('f8'), np)
+
+    def anchor(self):
+        clock = self.header["clock"]
+        return ClockAnchor(clock["mono_ns"], clock["wall_ns"])
+
+    def to_csv(self, out_path, raw=False):
+        # Same columns and timestamp format the CSV writer produces, raw counts converted unless raw
+        anchor = self.anchor()
+        # float32 and converted columns at float32 precision, not their float64 expansion
+        float32 = [tc == 'f' or (cal is not None and not raw) for tc, cal in zip(self.typecodes, self.calibrations)]
+        with open(out_path, mode='w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(self.header["csv_header"])
+            for timestamp_ns, values in self.rows(raw=raw):
+                values = [format(v, '.7g') if f else v for v, f in zip(values, float32)]
+                writer.writerow([anchor.format(timestamp_ns)] + values)
+        return out_path
+
+class LogManifest:
+    ''' The segment list of a SegmentedLog run; picks the segments covering a time interval
+    without opening any of them '''
+
+    def __init__(self, path):
+        self.path = path
+        self.dir = os.path.dirname(path)
+        with open(path) as file:
+            manifest = json.load(file)
+        clock = manifest["clock"]
+        self.anchor = ClockAnchor(clock["mono_ns"], clock["wall_ns"])
+        self.segments = manifest["segments"]
+
+    def to_mono_ns(self, when):
+        # datetime -> the run's monotonic timebase
+        return int(when.timestamp() * 1e9) - self.anchor.wall_ns + self.anchor.mono_ns
+
+    def select(self, start=None, end=None):
+        # Paths of the segments overlapping [start, end] (datetimes, None = open-ended). A segment
+        # still marked open (the run crashed or is live) has no known end, so it is kept if it
+        # started before end.
+        start_ns = None if start is None else self.to_mono_ns(start)
+        end_ns = None if end is None else self.to_mono_ns(end)
+        paths = []
+        for entry in self.segments:
+            if entry["first_ns"] is None and entry["closed"]:
+                continue  # Closed without rows
+            if end_ns is not None and entry["first_ns"] is not None and entry["first_ns"] > end_ns:
+                continue
+            if start_ns is not None and entry["closed"] and entry["last_ns"] < start_ns:
+                continue
+            paths.append(os.path.join(self.dir, entry["file"]))
+        return paths
+
+def _convert(path, out_path=None):
+    reader = FlightLogReader(path)
+    out_path = out_path or os.path.splitext(path)[0] + ".csv"
+    if not reader.complete:
+        print(f"{path}: no footer (log was cut off), recovered {len(reader.index)} blocks")
+    print(f"Wrote {reader.num_rows} rows to {reader.to_csv(out_path)}")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    if sys.argv[1].endswith(MANIFEST_SUFFIX):
+        for path in LogManifest(sys.argv[1]).select():
+            if path.endswith(".ftl"):
+                _convert(path)
+    else:
+        _convert(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,28 @@
+import time
+from datetime import datetime
+
+class ClockAnchor:
+    ''' One wall-clock/monotonic pair taken when a log starts. Producers stamp samples with
+    time.monotonic_ns(); they are mapped onto wall-clock time through this single anchor only
+    when written out, so NTP or manual clock steps mid-run cannot jump or reorder the log. '''
+
+    def __init__(self, mono_ns=None, wall_ns=None):
+        # Both None takes a fresh pair now; a log reader passes back the pair stored with the log
+        self.mono_ns = time.monotonic_ns() if mono_ns is None else mono_ns
+        self.wall_ns = time.time_ns() if wall_ns is None else wall_ns
+        self._second = None
+        self._second_str = ""
+
+    def to_wall_ns(self, mono_ns):
+        return self.wall_ns + (mono_ns - self.mono_ns)
+
+    def format(self, mono_ns):
+        # strftime only runs when the second changes; the milliseconds are appended as digits
+        second, rem = divmod(self.to_wall_ns(mono_ns), 1_000_000_000)
+        if second != self._second:
+            self._second = second
+            self._second_str = datetime.fromtimestamp(second).strftime('%Y-%m-%d %H:%M:%S')
+        return f"{self._second_str}.{rem // 1_000_000:03d}"
+
+    def format_many(self, mono_ns_values):
+        return [self.format(mono_ns) for mono_ns in mono_ns_values]
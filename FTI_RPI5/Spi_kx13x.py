@@ -1,11 +1,68 @@
+import struct
+import threading
+import time
 import spidev
 import lgpio
 
+# Chip-select pins the kernel driver can toggle itself, per bus: {GPIO: spidev device}.
+# Other pins can be handed to the kernel with e.g. dtoverlay=spi0-2cs,cs0_pin=21,cs1_pin=5
+# and then opened with cs_pin=None, device=N.
+KERNEL_CS_PINS = {0: {8: 0, 7: 1}, 1: {18: 0, 17: 1, 16: 2}}
+
+# lgpio edge ticks are wall-clock (ns since epoch). Their offset to time.monotonic_ns() is taken again
+# once a tick is this far past the last one it was taken at, or behind it, so an NTP or GPS step of
+# the wall clock is corrected at the next edge instead of shifting every later timestamp
+TICK_OFFSET_REFRESH_NS = 1_000_000_000
+
+# Little-endian int16 X/Y/Z as laid out in XOUT_L..ZOUT_H and in 16-bit buffer samples
+_XYZ16 = struct.Struct('<3h')
+_XYZ8 = struct.Struct('3b')
+
+# Counts per g for CNTL1 range settings 0x00..0x03 (+/-8, 16, 32, 64 g)
+SENSITIVITIES = [4096, 2048, 1024, 512]
+
+# Control registers
+CNTL1 = 0x1B
+ODCNTL = 0x21
+INC6 = 0x27
+
+# Sample buffer registers
+BUF_CNTL1 = 0x5E
+BUF_CNTL2 = 0x5F
+BUF_STATUS_1 = 0x60
+BUF_STATUS_2 = 0x61
+BUF_CLEAR = 0x62
+BUF_READ = 0x63
+
+# BUF_CNTL2 operating modes (BM bits)
+BUF_MODE_FIFO = 0x00     # Stop filling when full (newest samples lost)
+BUF_MODE_STREAM = 0x01   # Overwrite when full (oldest samples lost)
+BUF_MODE_TRIGGER = 0x02
+
+# Interrupt control registers
+INC1 = 0x22
+INC4 = 0x25
+INT_REL = 0x1A
+
+# INC4 routing bits for the INT1 pin
+INT1_DRDY = 0x10
+INT1_WATERMARK = 0x20
+INT1_BUFFER_FULL = 0x40
+
+# 512 byte buffer: 86 XYZ samples at 16-bit resolution, 171 at 8-bit
+BUF_MAX_SAMPLES_16BIT = 86
+BUF_MAX_SAMPLES_8BIT = 171
+
 class KX134_SPI:
     def __init__(self, bus=0, device=1, speed=100000, cs_pin=None):
         self.spi = spidev.SpiDev()
+        self.bus = bus
         self.cs_pin = cs_pin
-        self.use_gpio_cs = cs_pin is not None
+        kernel_device = KERNEL_CS_PINS.get(bus, {}).get(cs_pin)
+        if kernel_device is not None:
+            device = kernel_device  # Let spidev drive CS, no lgpio syscall per transfer
+        self.use_gpio_cs = cs_pin is not None and kernel_device is None
+        self.gpio_handle = None
 
         if self.use_gpio_cs:
             self.gpio_handle = lgpio.gpiochip_open(0)
@@ -21,6 +78,27 @@ class KX134_SPI:
         self.spi.max_speed_hz = speed
         self.spi.mode = 0b00
 
+        self.odr_hz = 50.0  # ODCNTL power-on default
+        self.sensitivity = 4096  # CNTL1 power-on default (+/-8g)
+        self._scale = 1.0 / self.sensitivity
+
+        # Preallocated transmit frames, reused by every read on the hot path
+        self._tx_accel = [0x08 | 0x80] + [0x00] * 6
+        self._tx_reads = {}
+        self.buffer_high_res = True
+        self.buffer_max_samples = BUF_MAX_SAMPLES_16BIT
+        self.buffer_overflows = 0
+
+        self._shadow = {}  # Last known value of each configuration register
+
+        self.int_pin = None
+        self.interrupt_tick = 0  # lgpio tick (ns since epoch) of the last INT1 edge
+        self.interrupt_ns = 0    # Same edge on the time.monotonic_ns() clock
+        self._tick_offset = 0
+        self._offset_tick = 0    # Wall-clock ns at which _tick_offset was taken
+        self._int_callback = None
+        self._data_event = threading.Event()
+
     def _select(self):
         if self.use_gpio_cs:
             lgpio.gpio_write(self.gpio_handle, self.cs_pin, 0)
@@ -33,6 +111,7 @@ class KX134_SPI:
         self._select()
         self.spi.xfer2([reg & 0x7F, value])
         self._deselect()
+        self._shadow[reg] = value
 
     def read_register(self, reg):
         self._select()
@@ -40,64 +119,231 @@ class KX134_SPI:
         self._deselect()
         return response[1]
 
+    def _tx_read(self, start_reg, length):
+        tx = self._tx_reads.get((start_reg, length))
+        if tx is None:
+            tx = self._tx_reads[(start_reg, length)] = [start_reg | 0x80] + [0x00] * length
+        return tx
+
     def read_multiple(self, start_reg, length):
         self._select()
-        response = self.spi.xfer2([start_reg | 0x80] + [0x00]*length)
+        response = self.spi.xfer2(self._tx_read(start_reg, length))
         self._deselect()
         return response[1:]
 
+    def write_multiple(self, start_reg, values):
+        # Register address auto-increments, so consecutive registers go out in one transfer
+        self._select()
+        self.spi.xfer2([start_reg & 0x7F] + list(values))
+        self._deselect()
+        for i, value in enumerate(values):
+            self._shadow[start_reg + i] = value
+
+    def _read_config(self, reg):
+        if reg not in self._shadow:
+            if CNTL1 <= reg <= INC6:
+                # Prime CNTL1..INC6 with one burst instead of one transfer per register
+                values = self.read_multiple(CNTL1, INC6 - CNTL1 + 1)
+                for i, value in enumerate(values):
+                    self._shadow[CNTL1 + i] = value
+            else:
+                self._shadow[reg] = self.read_register(reg)
+        return self._shadow[reg]
+
+    def invalidate_shadow(self):
+        # Call after anything that changes registers behind the driver's back (software reset, power cycle)
+        self._shadow.clear()
+
+    def _apply_registers(self, values, enable=None):
+        # Configuration registers are only writable with PC1 = 0: drop to standby once,
+        # burst-write the registers that actually change, then write the final CNTL1 once
+        current = self._read_config(CNTL1)
+        if enable is None:
+            enable = bool(current & 0x80)
+        final_cntl1 = values.pop(CNTL1, current) & ~0x80
+        if enable:
+            final_cntl1 |= 0x80
+        changed = {reg: val for reg, val in values.items() if self._shadow.get(reg) != val}
+        if current & 0x80 and (changed or (final_cntl1 & ~0x80) != (current & ~0x80)):
+            current &= ~0x80
+            self.write_register(CNTL1, current)
+        run = []
+        for reg in sorted(changed):
+            if run and reg != run[-1] + 1:
+                self.write_multiple(run[0], [changed[r] for r in run])
+                run = []
+            run.append(reg)
+        if run:
+            self.write_multiple(run[0], [changed[r] for r in run])
+        if final_cntl1 != current:
+            self.write_register(CNTL1, final_cntl1)
+
+    def apply_config(self, odr=None, range_setting=None, enable=None, int_source=None, high_performance=None):
+        # Compute final CNTL1/ODCNTL/INC values from the shadow and write them in as few transfers as possible
+        if odr is not None and (odr < 0 or odr > 15):
+            return False
+        if range_setting is not None and (range_setting < 0 or range_setting > 3):
+            return False
+        values = {}
+        cntl1 = self._read_config(CNTL1)
+        if range_setting is not None:
+            cntl1 = (cntl1 & ~0x18) | (range_setting << 3)
+        if high_performance is not None:
+            if high_performance:
+                cntl1 |= 0x40  # RES: high-performance mode, needed for ODRs above 400 Hz
+            else:
+                cntl1 &= ~0x40
+        if int_source is not None:
+            if int_source & INT1_DRDY:
+                cntl1 |= 0x20  # DRDYE
+            else:
+                cntl1 &= ~0x20
+            values[INC1] = 0x38 if int_source else 0x00  # IEN1 | IEA1 (active high) | IEL1 (pulsed, no INT_REL read needed)
+            values[INC4] = int_source
+        values[CNTL1] = cntl1
+        if odr is not None:
+            values[ODCNTL] = (self._read_config(ODCNTL) & 0xF0) | odr
+        self._apply_registers(values, enable)
+        if odr is not None:
+            self.odr_hz = 25600.0 / (1 << (15 - odr))  # 0x00 = 0.781 Hz ... 0x0F = 25600 Hz
+        if range_setting is not None:
+            self.sensitivity = SENSITIVITIES[range_setting]
+            self._scale = 1.0 / self.sensitivity
+        return True
+
     def enable_accel(self, enable=True):
-        cntl1 = self.read_register(0x1B)
+        cntl1 = self._read_config(CNTL1)
         if enable:
             cntl1 |= 0x80
         else:
             cntl1 &= ~0x80
-        self.write_register(0x1B, cntl1)
+        if cntl1 != self._shadow[CNTL1]:
+            self.write_register(CNTL1, cntl1)
 
     def get_accel_state(self):
-        CNTL1 = 0x1B
-        reg_val = self.read_register(CNTL1)
+        reg_val = self._read_config(CNTL1)
         return (reg_val & 0x80) >> 7
 
     def set_output_data_rate(self, rate):
-        if rate < 0 or rate > 15:
-            return False
-        accel_state = self.get_accel_state()
-        self.enable_accel(False)
-        reg_val = self.read_register(0x21)
-        reg_val &= 0xF0
-        reg_val |= rate
-        self.write_register(0x21, reg_val)
-        self.enable_accel(accel_state)
-        return True
+        return self.apply_config(odr=rate)
 
     def set_range(self, range_setting):
-        if range_setting < 0 or range_setting > 3:
-            return
-        accel_state = self.get_accel_state()
-        self.enable_accel(False)
-        cntl1 = self.read_register(0x1B)
-        cntl1 &= ~0x18
-        cntl1 |= (range_setting << 3)
-        self.write_register(0x1B, cntl1)
-        self.enable_accel(accel_state)
-        sensitivities = [4096, 2048, 1024, 512]  # for 8,16,32,64g
-        self.sensitivity = sensitivities[range_setting]
+        self.apply_config(range_setting=range_setting)
+
+    def get_accel_raw(self):
+        self._select()
+        response = self.spi.xfer2(self._tx_accel)
+        self._deselect()
+        return _XYZ16.unpack_from(bytes(response), 1)
 
     def get_accel_data(self):
-        raw = self.read_multiple(0x08, 6)
-        x = self._convert_data(raw[1] << 8 | raw[0])
-        y = self._convert_data(raw[3] << 8 | raw[2])
-        z = self._convert_data(raw[5] << 8 | raw[4])
-        return (x, y, z)
+        x, y, z = self.get_accel_raw()
+        scale = self._scale
+        return (x * scale, y * scale, z * scale)
 
-    def _convert_data(self, val):
-        if val > 32767:
-            val -= 65536
-        return val / self.sensitivity
+    def enable_buffer(self, watermark=None, mode=BUF_MODE_STREAM, high_res=True):
+        # BUF_CNTL1/BUF_CNTL2 may only be changed while PC1 = 0
+        max_samples = BUF_MAX_SAMPLES_16BIT if high_res else BUF_MAX_SAMPLES_8BIT
+        if watermark is None:
+            watermark = max_samples // 2
+        if watermark < 2 or watermark > max_samples or mode not in (BUF_MODE_FIFO, BUF_MODE_STREAM, BUF_MODE_TRIGGER):
+            return False
+        buf_cntl2 = 0x80 | mode  # BUFE
+        if high_res:
+            buf_cntl2 |= 0x40  # BRES: 16-bit samples
+        self._apply_registers({BUF_CNTL1: watermark, BUF_CNTL2: buf_cntl2})
+        self.clear_buffer()
+        self.buffer_high_res = high_res
+        self.buffer_max_samples = max_samples
+        self.buffer_overflows = 0
+        return True
+
+    def disable_buffer(self):
+        self._apply_registers({BUF_CNTL2: 0x00})
+
+    def clear_buffer(self):
+        self.write_register(BUF_CLEAR, 0x00)  # Any write empties the buffer
+
+    def get_buffer_level(self):
+        status = self.read_multiple(BUF_STATUS_1, 2)
+        level_bytes = (status[1] & 0x03) << 8 | status[0]
+        return level_bytes // (6 if self.buffer_high_res else 3)
+
+    def read_buffer_raw(self, max_samples=None):
+        # One status read plus one burst of BUF_READ (address does not auto-increment).
+        # Returns the packed sample payload: 6 bytes per sample (<3h) at 16-bit, 3 bytes (3b) at 8-bit.
+        level = self.get_buffer_level()
+        if level >= self.buffer_max_samples:
+            self.buffer_overflows += 1  # Buffer filled up before we drained it
+        count = level if max_samples is None else min(level, max_samples)
+        if count <= 0:
+            return memoryview(b"")
+        self._select()
+        response = self.spi.xfer2(self._tx_read(BUF_READ, count * (6 if self.buffer_high_res else 3)))
+        self._deselect()
+        return memoryview(bytes(response))[1:]
+
+    def read_buffer(self, max_samples=None):
+        payload = self.read_buffer_raw(max_samples)
+        if self.buffer_high_res:
+            scale = self._scale
+            return [(x * scale, y * scale, z * scale) for x, y, z in _XYZ16.iter_unpack(payload)]
+        scale = self._scale * 256  # 8-bit samples are the high byte of the 16-bit result
+        return [(x * scale, y * scale, z * scale) for x, y, z in _XYZ8.iter_unpack(payload)]
+
+    def read_buffer_counts(self, max_samples=None):
+        # read_buffer() without the conversion to g: int16 counts, 8-bit samples shifted up to the same scale
+        payload = self.read_buffer_raw(max_samples)
+        if self.buffer_high_res:
+            return list(_XYZ16.iter_unpack(payload))
+        return [(x << 8, y << 8, z << 8) for x, y, z in _XYZ8.iter_unpack(payload)]
+
+    def enable_interrupt(self, int_pin, source=INT1_DRDY):
+        # Route data-ready and/or watermark to INT1 as an active-high pulse and watch it with lgpio
+        self.apply_config(int_source=source)
+
+        if self.gpio_handle is None:
+            self.gpio_handle = lgpio.gpiochip_open(0)
+            if self.gpio_handle < 0:
+                raise RuntimeError("Failed to open GPIO chip")
+        err = lgpio.gpio_claim_alert(self.gpio_handle, int_pin, lgpio.RISING_EDGE)
+        if err < 0:
+            raise RuntimeError(f"Failed to claim GPIO {int_pin} for alerts")
+        self.int_pin = int_pin
+        self._offset_tick = time.time_ns()
+        self._tick_offset = time.monotonic_ns() - self._offset_tick
+        self._data_event.clear()
+        self._int_callback = lgpio.callback(self.gpio_handle, int_pin, lgpio.RISING_EDGE, self._on_interrupt)
+
+    def disable_interrupt(self):
+        if self._int_callback is not None:
+            self._int_callback.cancel()
+            self._int_callback = None
+        if self.int_pin is not None:
+            lgpio.gpio_free(self.gpio_handle, self.int_pin)
+            self.int_pin = None
+        self.apply_config(int_source=0)
+
+    def _on_interrupt(self, chip, gpio, level, tick):
+        if not 0 <= tick - self._offset_tick < TICK_OFFSET_REFRESH_NS:
+            self._offset_tick = time.time_ns()
+            self._tick_offset = time.monotonic_ns() - self._offset_tick
+        self.interrupt_tick = tick
+        self.interrupt_ns = tick + self._tick_offset
+        self._data_event.set()
+
+    def wait_for_data(self, timeout=None):
+        # Clear before the caller reads, so an edge that lands during the read wakes the next wait
+        if self._data_event.wait(timeout):
+            self._data_event.clear()
+            return True
+        return False
 
     def close(self):
         print(f"Closing SPI and GPIO for CS pin {self.cs_pin}")
+        if self._int_callback is not None:
+            self._int_callback.cancel()
+            self._int_callback = None
         self.spi.close()
-        if self.use_gpio_cs:
-            lgpio.gpiochip_close(self.gpio_handle)
\ No newline at end of file
+        if self.gpio_handle is not None:
+            lgpio.gpiochip_close(self.gpio_handle)
@@ -1,31 +1,86 @@
 import time
 import threading
-import queue
-import csv
+import multiprocessing
 import os
+import signal
 import sys
 import traceback
+import contextlib
 from datetime import datetime
 import Spi_kx13x
+from ring_buffer import RingBuffer, SharedRingBuffer
+from timebase import ClockAnchor
+from scheduler import PeriodicScheduler
+from stream_merge import StreamMerger, LINEAR, NEAREST
+from flight_log import open_log
+from live_view import LiveView
 
 # Configuration constants
 ACCEL_RATE = 0.01  # 100 Hz data production
 LOG_RATE = 0.01    # 100 Hz logging to CSV
 LOG_DIR = "FTI_logs"
+LOG_FORMAT = "csv"  # "csv": text rows as before, "binary": columnar .ftl blocks (python flight_log.py <file> converts to CSV)
+LOG_CODEC = None    # "binary" only: per-column block compression, "zlib"/"lzma" (stdlib) or "lz4"/"zstd" if installed
+COMMIT_INTERVAL = 0.25    # Writer group commit: at most this many seconds of rows are lost on a power cut
+COMMIT_BYTES = 64 * 1024  # ...or this many bytes, whichever builds up first (COMMIT_INTERVAL = 0: every pass)
+COMMIT_FSYNC = True       # fsync each commit so rows are on the SD card, not just in the page cache
+SEGMENT_BYTES = 64 * 2**20  # Roll to a new numbered log segment after this many bytes...
+SEGMENT_SECONDS = 600       # ...or this many seconds of rows (both None: one file per run, no manifest)
+RING_SECONDS = 10  # Seconds of samples each stream's ring buffer holds before the oldest are overwritten
+MERGE_POLICY = "linear"  # How a stream's value is taken at each LOG_RATE grid point: "hold", "linear" or "nearest"
+MERGE_WINDOW = 0.5       # Seconds a row waits for a late stream before its last value is held
+                         # (or, for one that has produced nothing yet, before it is logged as NaN)
+LIVE_VIEW = "screen"   # "screen": min/max/mean/RMS per channel on a low-priority display, "headless": no display
+LIVE_VIEW_PERIOD = 0.5  # Seconds between display refreshes (each covers the samples since the previous one)
+RUNTIME = "threads"  # "threads": every stream in this interpreter, "processes": one process per SPI bus and one
+                     # for the writer, exchanging samples through shared-memory ring buffers
+LOG_VALUES = "eng"  # "eng": g as before, "raw": int16 KX134 counts plus their calibration,
+                    # converted when the log is read ("binary" only; "linear" merging becomes "nearest")
+
+# Accelerometer acquisition mode
+ACCEL_MODE = "poll"         # "poll": one XYZ read per ACCEL_RATE, "fifo": drain the KX134 sample buffer in bursts,
+                            # "interrupt": sleep until the KX134 INT1 pin fires (see ACCEL_INT_SOURCE),
+                            # "sweep": one thread per SPI bus reads its sensors back to back per ACCEL_RATE tick
+                            # "fifo"/"interrupt" samples are logged whole at the ODR, one <log>_<label> file per sensor
+ACCEL_ODR = 0x07            # ODCNTL OSA code: 0x07 = 100 Hz ... 0x0B = 1.6 kHz ... 0x0F = 25.6 kHz
+ACCEL_RANGE = 0x00          # CNTL1 GSEL code: 0x00 = +/-8 g, 0x01 = 16 g, 0x02 = 32 g, 0x03 = 64 g
+ACCEL_SPI_HZ = 5000000      # KX134 SPI clock (10 MHz max); a 100 kHz clock cannot keep up with kHz ODRs
+ACCEL_FIFO_WATERMARK = 43   # Samples per burst in "fifo"/"interrupt" mode (max 86 at 16-bit)
+ACCEL_INT_SOURCE = "watermark"  # "watermark": drain the buffer on each INT1 pulse, "drdy": one XYZ read per pulse
 
 # User-configurable sensor counts
 NUM_ACCEL = 3  # Number of accelerometers to use (1-5)
 MAX_ACCEL = 5
 ACCEL_LABELS_FULL = ["Accel2", "Accel3", "Accel4", "Accel0", "Accel0"]
 ACCEL_CS_PINS_FULL = [21, 5, 6, 12, 13]
+# SPI controller per accelerometer. SPI1 and SPI3-6 need their dtoverlay; dtoverlay=spi1-3cs takes
+# GPIO 16/17/18 (CE2/CE1/CE0) and 19/20/21 (MISO/MOSI/SCLK), so GPIO 21 is no longer free for a CS.
+# Two sensors on SPI0 and three on SPI1 with that overlay, every CS driven by the kernel:
+#   ACCEL_CS_PINS_FULL = [8, 7, 18, 17, 16]
+#   ACCEL_BUSES_FULL = [0, 0, 1, 1, 1]
+ACCEL_BUSES_FULL = [0, 0, 0, 0, 0]
+ACCEL_INT_PINS_FULL = [4, 24, 22, 27, 26]  # GPIOs wired to each KX134 INT1 ("interrupt" mode only), clear of SPI0/SPI1
 
 # Validate input
 if NUM_ACCEL < 1 or NUM_ACCEL > MAX_ACCEL:
     raise ValueError(f"NUM_ACCEL must be between 1 and {MAX_ACCEL}")
+if RUNTIME not in ("threads", "processes"):
+    raise ValueError("RUNTIME must be 'threads' or 'processes'")
+if LIVE_VIEW not in ("screen", "headless"):
+    raise ValueError("LIVE_VIEW must be 'screen' or 'headless'")
+if LOG_VALUES not in ("eng", "raw"):
+    raise ValueError("LOG_VALUES must be 'eng' or 'raw'")
+if LOG_VALUES == "raw" and LOG_FORMAT != "binary":
+    raise ValueError("LOG_VALUES = 'raw' needs LOG_FORMAT = 'binary' (the CSV layout has no calibration)")
+RAW_COUNTS = LOG_VALUES == "raw"
+# Raw counts stay whole numbers, so they are never interpolated
+ROW_MERGE_POLICY = NEAREST if RAW_COUNTS and MERGE_POLICY == LINEAR else MERGE_POLICY
 
 # Dynamic sensor labels and pins
 ACCEL_LABELS = ACCEL_LABELS_FULL[:NUM_ACCEL]
 ACCEL_CS_PINS = ACCEL_CS_PINS_FULL[:NUM_ACCEL]
+ACCEL_BUSES = ACCEL_BUSES_FULL[:NUM_ACCEL]
+ACCEL_INT_PINS = ACCEL_INT_PINS_FULL[:NUM_ACCEL]
 
 # Dynamic CSV header
 CSV_HEADER = ["Timestamp"]
@@ -33,126 +88,316 @@ for i in range(NUM_ACCEL):
     CSV_HEADER.extend([
         f"{ACCEL_LABELS[i]}_X (g)", f"{ACCEL_LABELS[i]}_Y (g)", f"{ACCEL_LABELS[i]}_Z (g)"
     ])
+# The same columns as (name, unit, calibration) for the binary log; the calibration turns raw
+# counts back into g and is only stored when LOG_VALUES = "raw"
+ACCEL_INVALID = -32768  # Raw count logged for an accelerometer that has produced nothing yet (NaN once converted)
+ACCEL_CALIBRATION = {"type": "linear", "scale": 1.0 / Spi_kx13x.SENSITIVITIES[ACCEL_RANGE], "invalid": ACCEL_INVALID}
+LOG_COLUMNS = [(f"{label}_{axis}", "g", ACCEL_CALIBRATION if RAW_COUNTS else None)
+               for label in ACCEL_LABELS for axis in "XYZ"]
+# Display channels per stream, in ring order
+VIEW_CHANNELS = {f"accel{i+1}": LOG_COLUMNS[3*i:3*i + 3] for i in range(NUM_ACCEL)}
+# Logged for a stream that has produced nothing yet: NaN, or the raw sentinel in integer columns
+MERGE_INVALIDS = {name: ACCEL_INVALID for name in VIEW_CHANNELS} if RAW_COUNTS else {}
+
+def setup_accel(spi_lock, sensor, accel_idx, label):
+    print(f"Initializing KX134 accelerometer {accel_idx} on SPI bus {sensor.bus}, CS GPIO {ACCEL_CS_PINS[accel_idx-1]}...")
+    with spi_lock:
+        who_am_i = sensor.read_register(0x13)
+    print(f"[{label}] WHO_AM_I = 0x{who_am_i:02X}")
+    
+    with spi_lock:
+        # One standby/configure pass (ODR is 100 Hz by default to match sampling rate); ODRs above
+        # 400 Hz (0x09) are only available in high-performance mode
+        sensor.apply_config(odr=ACCEL_ODR, range_setting=ACCEL_RANGE, enable=False,
+                            high_performance=ACCEL_ODR > 0x09)
+        if ACCEL_MODE == "fifo" or (ACCEL_MODE == "interrupt" and ACCEL_INT_SOURCE == "watermark"):
+            sensor.enable_buffer(ACCEL_FIFO_WATERMARK)
+        if ACCEL_MODE == "interrupt":
+            source = Spi_kx13x.INT1_DRDY if ACCEL_INT_SOURCE == "drdy" else Spi_kx13x.INT1_WATERMARK
+            sensor.enable_interrupt(ACCEL_INT_PINS[accel_idx-1], source)
+        sensor.enable_accel(True)
+
+def read_accel(sensor):
+    # One XYZ sample, in counts or g depending on LOG_VALUES
+    return sensor.get_accel_raw() if RAW_COUNTS else sensor.get_accel_data()
 
-def accel_thread(data_queue, stop_event, spi_lock, sensor, accel_idx, label):
+def read_accel_buffer(sensor):
+    return sensor.read_buffer_counts() if RAW_COUNTS else sensor.read_buffer()
+
+def accel_sample_rate():
+    if ACCEL_MODE in ("fifo", "interrupt"):
+        return 25600.0 / (1 << (15 - ACCEL_ODR))  # Every sample the sensor produces
+    return 1.0 / ACCEL_RATE
+
+def accel_thread(accel_ring, stop_event, spi_lock, sensor, accel_idx, label):
     try:
-        print(f"Initializing KX134 accelerometer {accel_idx} on SPI bus 0, CS GPIO {ACCEL_CS_PINS[accel_idx-1]}...")
-        with spi_lock:
-            who_am_i = sensor.read_register(0x13)
-        print(f"[{label}] WHO_AM_I = 0x{who_am_i:02X}")
+        setup_accel(spi_lock, sensor, accel_idx, label)
         
-        with spi_lock:
-            sensor.enable_accel(False)
-            sensor.set_output_data_rate(0x07)  # Set ODR to 100 Hz to match sampling rate
-            sensor.set_range(0x00)
-            sensor.enable_accel(True)
+        if ACCEL_MODE == "fifo":
+            accel_fifo_loop(accel_ring, stop_event, spi_lock, sensor, label)
+            return
+        if ACCEL_MODE == "interrupt":
+            accel_interrupt_loop(accel_ring, stop_event, spi_lock, sensor, label)
+            return
         
+        schedule = PeriodicScheduler(ACCEL_RATE)
         while not stop_event.is_set():
+            schedule.wait(stop_event)
             with spi_lock:
-                x, y, z = sensor.get_accel_data()
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-            data_queue.put((f"accel{accel_idx}", timestamp, x, y, z))
-            time.sleep(ACCEL_RATE)
+                xyz = read_accel(sensor)
+            accel_ring.push(time.monotonic_ns(), xyz)
+        print(schedule.report(label))
             
     except Exception as e:
         print(f"[{label}] Error: {e}")
         traceback.print_exc()
         stop_event.set()
 
-def csv_writer_thread(data_queue, filename, stop_event):
+def accel_sweep_thread(accel_rings, stop_event, spi_lock, sensors, accel_indices, grid_start):
+    try:
+        for sensor, accel_idx in zip(sensors, accel_indices):
+            setup_accel(spi_lock, sensor, accel_idx, ACCEL_LABELS[accel_idx-1])
+        
+        # Every sensor on this bus is read back to back inside one lock hold. All bus
+        # workers tick on the same grid, and each sweep shares the timestamp taken when it started.
+        schedule = PeriodicScheduler(ACCEL_RATE, start_ns=grid_start)
+        while not stop_event.is_set():
+            schedule.wait(stop_event)
+            timestamp = time.monotonic_ns()
+            with spi_lock:
+                frame = [read_accel(sensor) for sensor in sensors]
+            for accel_ring, xyz in zip(accel_rings, frame):
+                accel_ring.push(timestamp, xyz)
+        print(schedule.report(f"Accel sweep bus {sensors[0].bus}"))
+            
+    except Exception as e:
+        print(f"[Accel sweep bus {sensors[0].bus}] Error: {e}")
+        traceback.print_exc()
+        stop_event.set()
+
+def accel_fifo_loop(accel_ring, stop_event, spi_lock, sensor, label):
+    # Wake about twice per watermark period and drain whatever the sensor has buffered
+    poll_period = ACCEL_FIFO_WATERMARK / sensor.odr_hz / 2
+    sample_period_ns = int(1e9 / sensor.odr_hz)
+    overflows = 0
+    schedule = PeriodicScheduler(poll_period)
+    while not stop_event.is_set():
+        schedule.wait(stop_event)
+        with spi_lock:
+            samples = read_accel_buffer(sensor)
+        put_accel_burst(accel_ring, samples, time.monotonic_ns(), sample_period_ns)
+        overflows = report_overflows(sensor, overflows, label)
+    print(schedule.report(label))
+    print(f"[{label}] Sample buffer overflows: {sensor.buffer_overflows}")
+
+def accel_interrupt_loop(accel_ring, stop_event, spi_lock, sensor, label):
+    sample_period = 1.0 / sensor.odr_hz
+    sample_period_ns = int(1e9 / sensor.odr_hz)
+    if ACCEL_INT_SOURCE == "drdy":
+        timeout = max(0.5, 10 * sample_period)
+    else:
+        timeout = max(0.5, 4 * ACCEL_FIFO_WATERMARK * sample_period)
+    overflows = 0
+    while not stop_event.is_set():
+        # A timeout still drains the buffer in case a pulse was missed, and lets stop_event be seen
+        fired = sensor.wait_for_data(timeout)
+        if ACCEL_INT_SOURCE == "drdy":
+            if not fired:
+                continue
+            with spi_lock:
+                xyz = read_accel(sensor)
+            accel_ring.push(sensor.interrupt_ns, xyz)
+            continue
+        with spi_lock:
+            samples = read_accel_buffer(sensor)
+        put_accel_burst(accel_ring, samples, time.monotonic_ns(), sample_period_ns)
+        overflows = report_overflows(sensor, overflows, label)
+    print(f"[{label}] Sample buffer overflows: {sensor.buffer_overflows}")
+
+def put_accel_burst(accel_ring, samples, end_ns, sample_period_ns):
+    # Last sample in the burst is the newest; back-date the rest on the ODR grid
+    first_ns = end_ns - (len(samples) - 1) * sample_period_ns
+    timestamps = range(first_ns, end_ns + 1, sample_period_ns) if samples else ()
+    accel_ring.push_many(timestamps, samples)
+
+def report_overflows(sensor, overflows, label):
+    if sensor.buffer_overflows != overflows:
+        print(f"[{label}] Sample buffer overflow ({sensor.buffer_overflows} total), host is falling behind")
+    return sensor.buffer_overflows
+
+def log_metadata():
+    # Rates and calibration stored in the binary log header
+    return {
+        "log_rate_hz": 1.0 / LOG_RATE,
+        "merge_policy": ROW_MERGE_POLICY,
+        "accel_mode": ACCEL_MODE,
+        "accel_rate_hz": accel_sample_rate(),
+        "accel_odr_code": ACCEL_ODR,
+        "accel_range_g": 8 << ACCEL_RANGE,
+        "accel_cs_pins": ACCEL_CS_PINS,
+        "values": LOG_VALUES,
+    }
+
+def open_run_log(path_stem, columns, csv_header, anchor, meta):
+    return open_log(path_stem, LOG_FORMAT, columns, anchor, csv_header, meta,
+                    segment_bytes=SEGMENT_BYTES, segment_seconds=SEGMENT_SECONDS, codec=LOG_CODEC,
+                    typecode='h' if RAW_COUNTS else 'f',
+                    commit_interval=COMMIT_INTERVAL, commit_bytes=COMMIT_BYTES, fsync=COMMIT_FSYNC)
+
+def csv_writer_thread(streams, log_stem, stop_event):
     try:
         os.makedirs(LOG_DIR, exist_ok=True)
-        with open(filename, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(CSV_HEADER)
-            print(f"Logging to {filename}... Press Ctrl+C to stop.")
+        anchor = ClockAnchor()  # The single wall-clock reference shared by every log of the run
+        with contextlib.ExitStack() as stack:
+            # "fifo"/"interrupt" accelerometers sample at the ODR; resampling them onto the LOG_RATE
+            # grid without an anti-alias filter would fold everything above half the log rate back
+            # into the band, so each one is written whole to its own <log_stem>_<label> log instead
+            stream_logs = {}
+            if ACCEL_MODE in ("fifo", "interrupt"):
+                meta = dict(log_metadata(), log_rate_hz=accel_sample_rate(), merge_policy=None)
+                for i, label in enumerate(ACCEL_LABELS):
+                    stream_logs[f"accel{i+1}"] = stack.enter_context(open_run_log(
+                        f"{log_stem}_{label}", LOG_COLUMNS[3*i:3*i + 3], CSV_HEADER[:1] + CSV_HEADER[1 + 3*i:4 + 3*i],
+                        anchor, meta))
             
-            last_data = {f"accel{i+1}": None for i in range(NUM_ACCEL)}
-            last_print_time = time.time()
+            # Rows of the remaining streams sit on a fixed LOG_RATE grid; each is resampled onto it
+            merged = {name: ring.num_channels for name, ring in streams.items() if name not in stream_logs}
+            log = merger = None
+            if merged:
+                skip = 3 * len(stream_logs)
+                log = stack.enter_context(open_run_log(log_stem, LOG_COLUMNS[skip:], CSV_HEADER[:1] + CSV_HEADER[1 + skip:],
+                                                       anchor, log_metadata()))
+                merger = StreamMerger(merged, int(LOG_RATE * 1e9), ROW_MERGE_POLICY, int(MERGE_WINDOW * 1e9),
+                                      invalids=MERGE_INVALIDS)
+            logs = list(stream_logs.values()) + ([log] if log else [])
+            for each in logs:
+                print(f"Logging to {each.path} ({each.durability()})...")
+            print("Press Ctrl+C to stop.")
             
+            schedule = PeriodicScheduler(LOG_RATE)
             while not stop_event.is_set():
-                # Drain the queue to get the latest data from all sensors
-                while True:
-                    try:
-                        sensor_type, timestamp, x, y, z = data_queue.get_nowait()
-                        last_data[sensor_type] = (timestamp, x, y, z)
-                    except queue.Empty:
-                        break
-                
-                # If all data available, write one row
-                if all(last_data[f"accel{i+1}"] for i in range(NUM_ACCEL)):
-                    latest_timestamp = max(
-                        *[data[0] for data in last_data.values()]
-                    )
-                    row = [latest_timestamp]
-                    for i in range(NUM_ACCEL):
-                        accel_data = last_data[f"accel{i+1}"]
-                        row.extend([
-                            accel_data[1] if accel_data[1] is not None else "",
-                            accel_data[2] if accel_data[2] is not None else "",
-                            accel_data[3] if accel_data[3] is not None else ""
-                        ])
-                    
-                    writer.writerow(row)
-                    file.flush()
-                
-                # Print if time
-                current_time = time.time()
-                if current_time - last_print_time >= 0.1:
-                    print_str = f"[{latest_timestamp}] "
-                    for i in range(NUM_ACCEL):
-                        accel_data = last_data[f"accel{i+1}"]
-                        x = accel_data[1] if accel_data[1] is not None else 0.0
-                        y = accel_data[2] if accel_data[2] is not None else 0.0
-                        z = accel_data[3] if accel_data[3] is not None else 0.0
-                        print_str += f"{ACCEL_LABELS[i]}_X: {x:.3f} g | {ACCEL_LABELS[i]}_Y: {y:.3f} g | {ACCEL_LABELS[i]}_Z: {z:.3f} g | "
-                    print(print_str.rstrip(" | "))
-                    last_print_time = current_time
+                schedule.wait(stop_event)
+                # Take everything produced since the last pass in one slice per stream
+                for name, ring in streams.items():
+                    timestamps, values = ring.read()
+                    if name in stream_logs:
+                        nc = ring.num_channels
+                        for i, timestamp in enumerate(timestamps):
+                            stream_logs[name].append(timestamp, values[i * nc:(i + 1) * nc])
+                    else:
+                        merger.push_many(name, timestamps, values)
                 
-                time.sleep(LOG_RATE)  # Enforce 100 Hz loop rate
+                # No console output here: the live view reads the rings on its own
+                if merger:
+                    for row_ns, values in merger.pop_rows(time.monotonic_ns()):
+                        log.append(row_ns, values)
+                for each in logs:
+                    each.commit_if_due()
+            
+            print(schedule.report("CSV Writer"))
+            for each in logs:
+                print(f"[CSV Writer] {each.path}: {each.commits} commits, {each.bytes_written / 1024:.0f} KiB written")
+            for name, ring in streams.items():
+                if ring.dropped:
+                    print(f"[CSV Writer] {name}: {ring.dropped} samples overwritten before they were logged")
                 
     except Exception as e:
         print(f"[CSV Writer] Error: {e}")
         traceback.print_exc()
         stop_event.set()
 
+def accel_workers(streams, stop_event, spi_locks, sensors, grid_start):
+    # Threads for the given sensors ({accel index: KX134_SPI}): one bus-owning thread per SPI
+    # controller in "sweep" mode, otherwise one per sensor
+    workers = []
+    if ACCEL_MODE == "sweep":
+        for bus in sorted(spi_locks):
+            bus_indices = [i for i in sensors if ACCEL_BUSES[i] == bus]
+            workers.append(threading.Thread(
+                target=accel_sweep_thread,
+                args=([streams[f"accel{i+1}"] for i in bus_indices], stop_event, spi_locks[bus],
+                      [sensors[i] for i in bus_indices], [i+1 for i in bus_indices], grid_start),
+                daemon=True
+            ))
+    else:
+        for i in sensors:
+            workers.append(threading.Thread(
+                target=accel_thread,
+                args=(streams[f"accel{i+1}"], stop_event, spi_locks[ACCEL_BUSES[i]], sensors[i], i+1, ACCEL_LABELS[i]),
+                daemon=True
+            ))
+    return workers
+
+def spi_bus_process(streams, stop_event, bus, grid_start):
+    # "processes" runtime: this process owns one SPI controller and the accelerometers on it
+    sensors = {i: Spi_kx13x.KX134_SPI(bus=bus, speed=ACCEL_SPI_HZ, cs_pin=ACCEL_CS_PINS[i]) for i in range(NUM_ACCEL) if ACCEL_BUSES[i] == bus}
+    try:
+        workers = accel_workers(streams, stop_event, {bus: threading.Lock()}, sensors, grid_start)
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    finally:
+        for sensor in sensors.values():
+            sensor.close()
+
+def live_view(streams, stop_event):
+    # Display worker (thread or process); reads the rings without consuming them
+    LiveView(streams, VIEW_CHANNELS, LIVE_VIEW_PERIOD, f"FTI {'/'.join(ACCEL_LABELS)}").run(stop_event)
+
+def run_child(target, *args):
+    # Process entry point: Ctrl+C reaches the whole process group, but only the parent acts on it
+    # and stops the children through stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    target(*args)
+
 def main():
-    sensors = []
+    sensors = {}
+    streams = {}
+    workers = []
     try:
-        # Create timestamped filename with dynamic labels
+        # Create timestamped filename with dynamic labels (the extension follows LOG_FORMAT)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = os.path.join(LOG_DIR, f"{'_'.join(ACCEL_LABELS)}_log_{timestamp}.csv")
-        
-        # Create stop event, queue, lock
-        stop_event = threading.Event()
-        data_queue = queue.Queue()
-        spi_lock = threading.Lock()
+        log_stem = os.path.join(LOG_DIR, f"{'_'.join(ACCEL_LABELS)}_log_{timestamp}")
         
-        # Create sensors based on NUM_ACCEL
-        for i in range(NUM_ACCEL):
-            cs_pin = ACCEL_CS_PINS[i]
-            sensor = Spi_kx13x.KX134_SPI(bus=0, cs_pin=cs_pin)
-            sensors.append(sensor)
+        # Create stop event and per-stream ring buffers (in shared memory when streams cross processes)
+        processes = RUNTIME == "processes"
+        stop_event = multiprocessing.Event() if processes else threading.Event()
+        ring = SharedRingBuffer if processes else RingBuffer
+        accel_capacity = int(accel_sample_rate() * RING_SECONDS)
+        streams = {f"accel{i+1}": ring(3, accel_capacity, 'h' if RAW_COUNTS else 'd') for i in range(NUM_ACCEL)}
+        grid_start = time.monotonic_ns()  # Shared tick grid of the "sweep" bus workers
         
-        # Create threads based on NUM_ACCEL
-        accel_threads = []
-        for i in range(NUM_ACCEL):
-            accel_t = threading.Thread(
-                target=accel_thread,
-                args=(data_queue, stop_event, spi_lock, sensors[i], i+1, ACCEL_LABELS[i]),
+        if processes:
+            # One process per SPI controller and one for the writer, so formatting and printing
+            # never hold the interpreter lock the samplers need
+            for bus in sorted(set(ACCEL_BUSES)):
+                workers.append(multiprocessing.Process(
+                    target=run_child, args=(spi_bus_process, streams, stop_event, bus, grid_start), daemon=True))
+            workers.append(multiprocessing.Process(
+                target=run_child, args=(csv_writer_thread, streams, log_stem, stop_event), daemon=True))
+            if LIVE_VIEW == "screen":
+                workers.append(multiprocessing.Process(
+                    target=run_child, args=(live_view, streams, stop_event), daemon=True))
+        else:
+            spi_locks = {bus: threading.Lock() for bus in ACCEL_BUSES}  # One lock per SPI controller
+            
+            # Create sensors based on NUM_ACCEL
+            for i in range(NUM_ACCEL):
+                sensors[i] = Spi_kx13x.KX134_SPI(bus=ACCEL_BUSES[i], speed=ACCEL_SPI_HZ, cs_pin=ACCEL_CS_PINS[i])
+            
+            workers = accel_workers(streams, stop_event, spi_locks, sensors, grid_start)
+            workers.append(threading.Thread(
+                target=csv_writer_thread,
+                args=(streams, log_stem, stop_event),
                 daemon=True
-            )
-            accel_threads.append(accel_t)
-        writer_t = threading.Thread(
-            target=csv_writer_thread,
-            args=(data_queue, filename, stop_event),
-            daemon=True
-        )
+            ))
+            if LIVE_VIEW == "screen":
+                workers.append(threading.Thread(target=live_view, args=(streams, stop_event), daemon=True))
         
-        # Start threads
-        for accel_t in accel_threads:
-            accel_t.start()
-        writer_t.start()
+        # Start threads or processes
+        for worker in workers:
+            worker.start()
         
         # Keep main thread alive
         while True:
@@ -162,13 +407,15 @@ def main():
         print("\nStopping program...")
         stop_event.set()
         
-        # Join threads with timeout
-        for accel_t in accel_threads:
-            accel_t.join(timeout=5.0)
-        writer_t.join(timeout=5.0)
+        # Join workers with timeout
+        for worker in workers:
+            worker.join(timeout=5.0)
         
-        if any(accel_t.is_alive() for accel_t in accel_threads) or writer_t.is_alive():
+        if any(worker.is_alive() for worker in workers):
             print("Some threads did not exit cleanly; forcing shutdown.")
+            for worker in workers:
+                if isinstance(worker, multiprocessing.Process) and worker.is_alive():
+                    worker.terminate()
         
         print("Program terminated. Data saved to CSV.")
         
@@ -177,8 +424,12 @@ def main():
         traceback.print_exc()
         
     finally:
-        for sensor in sensors:
+        for sensor in sensors.values():
             sensor.close()
+        for stream in streams.values():
+            if isinstance(stream, SharedRingBuffer):
+                stream.close()
+                stream.unlink()
         sys.exit(0)
 
 if __name__ == "__main__":
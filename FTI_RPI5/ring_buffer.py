@@ -0,0 +1,150 @@
+from array import array
+import multiprocessing
+import threading
+from multiprocessing import shared_memory
+
+class RingBuffer:
+    ''' Fixed-capacity sample store for one sensor stream: an int64 timestamp column plus
+    num_channels interleaved values per sample, preallocated once. When the consumer falls
+    behind, the oldest samples are overwritten and counted in `dropped`. '''
+
+    def __init__(self, num_channels, capacity, typecode='d'):
+        self.num_channels = num_channels
+        self.capacity = capacity
+        self.typecode = typecode
+        self.timestamps = array('q', [0]) * capacity
+        self.values = array(typecode, [0]) * (capacity * num_channels)
+        self.written = 0   # Samples ever pushed
+        self.consumed = 0  # Samples ever handed to read()
+        self.dropped = 0   # Samples overwritten before they were read
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.written - self.consumed
+
+    def _store(self, timestamp, values):
+        slot = self.written % self.capacity
+        self.timestamps[slot] = timestamp
+        base = slot * self.num_channels
+        for i, value in enumerate(values):
+            self.values[base + i] = value
+        self.written += 1
+        if self.written - self.consumed > self.capacity:
+            self.consumed += 1
+            self.dropped += 1
+
+    def push(self, timestamp, values):
+        with self._lock:
+            self._store(timestamp, values)
+
+    def push_many(self, timestamps, rows):
+        with self._lock:
+            for timestamp, values in zip(timestamps, rows):
+                self._store(timestamp, values)
+
+    def _slice(self, first, count):
+        # (timestamps, values) of count samples starting at sample number first; caller holds the lock
+        nc = self.num_channels
+        start = first % self.capacity
+        end = start + count
+        if end <= self.capacity:
+            return self.timestamps[start:end], self.values[start * nc:end * nc]
+        end -= self.capacity
+        return (self.timestamps[start:] + self.timestamps[:end],
+                self.values[start * nc:] + self.values[:end * nc])
+
+    def read(self, max_samples=None):
+        # Returns (timestamps, values) for every unread sample as two contiguous arrays;
+        # values is row-major, num_channels entries per sample
+        with self._lock:
+            count = self.written - self.consumed
+            if max_samples is not None:
+                count = min(count, max_samples)
+            timestamps, values = self._slice(self.consumed, count)
+            self.consumed += count
+        return timestamps, values
+
+    def peek(self, since=0):
+        # (written, timestamps, values) for the samples pushed after the first `since` (at most the
+        # last capacity), without consuming them: a second reader such as a display passes the
+        # returned written back in on its next call and never disturbs read()
+        with self._lock:
+            written = self.written
+            first = max(since, written - self.capacity)
+            timestamps, values = self._slice(first, written - first)
+        return written, timestamps, values
+
+    def last(self):
+        # Newest sample as (timestamp, values) without consuming anything, or None if empty
+        nc = self.num_channels
+        with self._lock:
+            if self.written == 0:
+                return None
+            slot = (self.written - 1) % self.capacity
+            return self.timestamps[slot], self.values[slot * nc:(slot + 1) * nc]
+
+class SharedRingBuffer(RingBuffer):
+    ''' RingBuffer whose columns and counters live in one multiprocessing.shared_memory block, so a
+    producer in one process and a consumer in another exchange samples without pickling them. Passing
+    the object to a multiprocessing.Process hands the child the same block and lock. The process
+    that created it calls close() and unlink() once every process using it has finished. '''
+
+    def __init__(self, num_channels, capacity, typecode='d'):
+        self.num_channels = num_channels
+        self.capacity = capacity
+        self.typecode = typecode
+        size = 8 * (3 + capacity) + array(typecode).itemsize * capacity * num_channels
+        self._shm = shared_memory.SharedMemory(create=True, size=size)  # Zero-filled
+        self._lock = multiprocessing.Lock()
+        self._map()
+
+    def _map(self):
+        # Layout: written, consumed, dropped (int64), the timestamp column, then the values
+        buf = self._shm.buf
+        values_at = 8 * (3 + self.capacity)
+        values_end = values_at + array(self.typecode).itemsize * self.capacity * self.num_channels
+        self._counters = buf[:24].cast('q')
+        self.timestamps = buf[24:values_at].cast('q')
+        self.values = buf[values_at:values_end].cast(self.typecode)
+
+    def __getstate__(self):
+        return self.num_channels, self.capacity, self.typecode, self._shm.name, self._lock
+
+    def __setstate__(self, state):
+        self.num_channels, self.capacity, self.typecode, name, self._lock = state
+        self._shm = shared_memory.SharedMemory(name=name)
+        self._map()
+
+    written = property(lambda self: self._counters[0], lambda self, n: self._counters.__setitem__(0, n))
+    consumed = property(lambda self: self._counters[1], lambda self, n: self._counters.__setitem__(1, n))
+    dropped = property(lambda self: self._counters[2], lambda self, n: self._counters.__setitem__(2, n))
+
+    def _slice(self, first, count):
+        # As RingBuffer._slice(), copied out of the shared block before the producer can reuse it
+        nc = self.num_channels
+        timestamps = array('q')
+        values = array(self.typecode)
+        start = first % self.capacity
+        end = start + count
+        spans = [(start, end)] if end <= self.capacity else [(start, self.capacity), (0, end - self.capacity)]
+        for a, b in spans:
+            timestamps.frombytes(self.timestamps[a:b].cast('B'))
+            values.frombytes(self.values[a * nc:b * nc].cast('B'))
+        return timestamps, values
+
+    def last(self):
+        nc = self.num_channels
+        with self._lock:
+            if self.written == 0:
+                return None
+            slot = (self.written - 1) % self.capacity
+            return self.timestamps[slot], self.values[slot * nc:(slot + 1) * nc].tolist()
+
+    def close(self):
+        # Detach this process; the views have to go before the block can be closed
+        for view in (self._counters, self.timestamps, self.values):
+            view.release()
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.unlink()
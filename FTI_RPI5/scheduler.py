@@ -0,0 +1,78 @@
+import math
+import time
+
+class PeriodicScheduler:
+    ''' Runs a loop on an absolute time.monotonic_ns() grid instead of "work, then sleep(period)",
+    so the achieved rate does not sag by the loop's own run time. A tick that starts late runs
+    straight away; after an overrun of more than max_catch_up whole periods the overdue ticks are
+    dropped and the loop resumes on the grid. Every wake-up is measured against its deadline. '''
+
+    def __init__(self, period, start_ns=None, max_catch_up=0):
+        self.period_ns = int(period * 1e9)
+        self.max_catch_up = max_catch_up
+        self.start_ns = time.monotonic_ns() if start_ns is None else start_ns
+        self.next_ns = self.start_ns
+        self.ticks = 0
+        self.first_wake_ns = None
+        self.last_wake_ns = None
+        self.overruns = 0    # Deadlines already passed when wait() was called
+        self.skipped = 0     # Grid ticks dropped to get back on schedule
+        self.jitter_max_ns = 0
+        self._jitter_sum = 0
+        self._jitter_sq_sum = 0
+
+    def wait(self, stop_event=None):
+        # Sleep until the next deadline and return it (ns); with a stop_event the sleep ends early on stop
+        now = time.monotonic_ns()
+        late = now - self.next_ns
+        if late > 0:
+            self.overruns += 1
+            missed = late // self.period_ns
+            if missed > self.max_catch_up:
+                # Too far behind: drop every overdue tick and resume at the next grid point
+                self.next_ns += (missed + 1) * self.period_ns
+                self.skipped += missed + 1
+        delay = self.next_ns - now
+        if delay > 0:
+            if stop_event is not None:
+                if stop_event.wait(delay / 1e9):
+                    return self.next_ns  # Stopping: not a real tick, keep it out of the statistics
+            else:
+                time.sleep(delay / 1e9)
+        wake = time.monotonic_ns()
+        if self.first_wake_ns is None:
+            self.first_wake_ns = wake
+        self.last_wake_ns = wake
+        jitter = max(0, wake - self.next_ns)
+        self.jitter_max_ns = max(self.jitter_max_ns, jitter)
+        self._jitter_sum += jitter
+        self._jitter_sq_sum += jitter * jitter
+        self.ticks += 1
+        deadline = self.next_ns
+        self.next_ns += self.period_ns
+        return deadline
+
+    def achieved_rate(self):
+        # Ticks per second between the first and the last wake-up
+        if self.ticks < 2:
+            return 0.0
+        return (self.ticks - 1) * 1e9 / (self.last_wake_ns - self.first_wake_ns)
+
+    def stats(self):
+        ticks = max(self.ticks, 1)
+        return {
+            "nominal_hz": 1e9 / self.period_ns,
+            "achieved_hz": self.achieved_rate(),
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "jitter_mean_us": self._jitter_sum / ticks / 1e3,
+            "jitter_rms_us": math.sqrt(self._jitter_sq_sum / ticks) / 1e3,
+            "jitter_max_us": self.jitter_max_ns / 1e3,
+        }
+
+    def report(self, label):
+        s = self.stats()
+        return (f"[{label}] {s['achieved_hz']:.2f} Hz achieved (nominal {s['nominal_hz']:.2f} Hz), "
+                f"jitter mean {s['jitter_mean_us']:.0f} us / rms {s['jitter_rms_us']:.0f} us / max {s['jitter_max_us']:.0f} us, "
+                f"{s['overruns']} overruns, {s['skipped']} ticks skipped")
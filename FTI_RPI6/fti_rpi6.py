@@ -1,5 +1,5 @@
+import asyncio
 import time
-import csv
 import threading
 import queue
 import os
@@ -12,11 +12,42 @@ import adafruit_ads1x15.ads1115 as ADS
 from adafruit_ads1x15.analog_in import AnalogIn
 from gpiozero import Button
 import traceback
+from timebase import ClockAnchor
+from scheduler import PeriodicScheduler
+from stream_merge import StreamMerger, HOLD, LINEAR, NEAREST
+from flight_log import open_log, convert
+from ads1115_scan import ADS1115Scanner, AdafruitRegisters
+import I2c_ads1115
+from modbus_poll import RTUMaster, ModbusPoller, PollDevice, ScanCollector, to_signed, QUALITY_OK, QUALITY_OFFLINE, QUALITY_NAMES
 
 # ---- Config ----
 RS485_PORT = '/dev/ttyAMA0'
 BAUD_RATE = 9600
+RS485_MODE = "sequential"  # "sequential": pymodbus, one device after another with fixed sleeps as before (~1.7 s per scan),
+                           # "async": modbus_poll polls each device on its own grid, t3.5 apart on the bus
+TEMP_RATE = 2.0            # "async" only: polls/s for every DEV_IDS device; a scan goes out once all of them have reported
+TEMP_REGISTER = 0          # Holding register with the temperature (signed, 0.1 C)
+MODBUS_TIMEOUT = 0.5       # "async" only: longest response time allowed; each device's timeout adapts below it
+MODBUS_MIN_TIMEOUT = 0.05  # "async" only: shortest adaptive timeout
+MODBUS_FAIL_THRESHOLD = 3  # "async" only: failed polls in a row that take a device offline
+MODBUS_PROBE_INTERVAL = 2.0  # "async" only: seconds between probes of an offline device (doubling up to 30 s)
 REF = 5.0
+PRESSURE_ADS_GAIN = 1
+PRESSURE_ADS_FSR = 4.096  # Full-scale volts at PRESSURE_ADS_GAIN
+ADS_DRIVER = "adafruit"  # "adafruit": adafruit_ads1x15 over busio as before, "direct": the I2c_ads1115 register
+                         # driver on /dev/i2c-<ADS_I2C_BUS> (fewer layers and bus transactions per read)
+ADS_I2C_BUS = 1          # "direct" only: the bus on board.SDA/board.SCL
+FLOW_RATE = 1.0      # Pulse-count window (s); calc_flow assumes exactly this window
+PRESSURE_RATE = 1.0  # One 4-channel pressure scan per second
+PRESSURE_MODE = "single"  # "single": one single-shot read per channel, 0.1 s apart, per PRESSURE_RATE tick,
+                          # "continuous": the ADS1115 converts back to back at ADS_DATA_RATE, channels in turn, paced
+                          # by its ALERT/RDY pin, and each PRESSURE_RATE sample is the mean of its window's conversions
+ADS_DATA_RATE = 860       # "continuous" only: conversions/s shared by the four channels
+ADS_RDY_PIN = 25          # GPIO wired to the ADS1115 ALERT/RDY pin ("continuous" mode only)
+LOG_RATE = 1.0       # One merged CSV row per second
+MERGE_WINDOW = 3.0   # Seconds a row waits for a late stream (a full temperature scan takes ~2 s); one that has
+                     # produced nothing by then is logged as a failed read until it does
+MERGE_POLICIES = {'pressure': LINEAR, 'flow': HOLD, 'temp': NEAREST}  # Flow is a per-window count, so it is held
 FLOW_SENSOR_PINS = [23, 24]
 FLOW_FACTORS = [9.9, 9.89]
 DEV_IDS = [1, 2, 3, 4]
@@ -30,6 +61,16 @@ pulse_counts = [0, 0]
 off_t = [0.0, 0.0, 0.0, 0.0]
 
 LOG_DIR = "logs"
+LOG_FORMAT = "csv"  # "csv": text rows as before, "binary": columnar .ftl blocks (python flight_log.py <file> converts to CSV)
+LOG_CODEC = None    # "binary" only: per-column block compression, "zlib"/"lzma" (stdlib) or "lz4"/"zstd" if installed
+COMMIT_INTERVAL = 0.25    # Writer group commit: at most this many seconds of rows are lost on a power cut
+COMMIT_BYTES = 64 * 1024  # ...or this many bytes, whichever builds up first (COMMIT_INTERVAL = 0: every pass)
+COMMIT_FSYNC = True       # fsync each commit so rows are on the SD card, not just in the page cache
+SEGMENT_BYTES = 64 * 2**20  # Roll to a new numbered log segment after this many bytes...
+SEGMENT_SECONDS = 600       # ...or this many seconds of rows (both None: one file per run, no manifest)
+LOG_VALUES = "eng"  # "eng": Bar/Lpm/C as before, "raw": ADS1115 codes, pulse counts and temperature registers
+                    # plus their calibration, converted when the log is read ("binary" only)
+RAW_INVALID = -32768  # Raw pressure/temperature value logged for a failed read (NaN once converted)
 CSV_HEADER = [
     "Timestamp",
     f"{SENSOR_LABELS['pressure'][0]}_Bar", f"{SENSOR_LABELS['pressure'][1]}_Bar",
@@ -38,6 +79,70 @@ CSV_HEADER = [
     f"{SENSOR_LABELS['temp'][0]}_C", f"{SENSOR_LABELS['temp'][1]}_C",
     f"{SENSOR_LABELS['temp'][2]}_C", f"{SENSOR_LABELS['temp'][3]}_C"
 ]
+# "async" logs a <label>_Q quality flag per temperature (0 ok, 1 timeout, 2 error, 3 offline) and NaN for a failed
+# read in C, instead of the 0.0 the sequential loop logs
+LOG_QUALITY = RS485_MODE == "async"
+if LOG_QUALITY:
+    CSV_HEADER += [f"{label}_Q" for label in SENSOR_LABELS['temp']]
+MERGE_STREAMS = {'pressure': 4, 'flow': 2, 'temp': 4}
+if LOG_QUALITY:
+    MERGE_STREAMS['temp_q'] = 4
+if ADS_DRIVER not in ("adafruit", "direct"):
+    raise ValueError("ADS_DRIVER must be 'adafruit' or 'direct'")
+if RS485_MODE not in ("sequential", "async"):
+    raise ValueError("RS485_MODE must be 'sequential' or 'async'")
+if PRESSURE_MODE not in ("single", "continuous"):
+    raise ValueError("PRESSURE_MODE must be 'single' or 'continuous'")
+if LOG_VALUES not in ("eng", "raw"):
+    raise ValueError("LOG_VALUES must be 'eng' or 'raw'")
+if LOG_VALUES == "raw" and LOG_FORMAT != "binary":
+    raise ValueError("LOG_VALUES = 'raw' needs LOG_FORMAT = 'binary' (the CSV layout has no calibration)")
+RAW_COUNTS = LOG_VALUES == "raw"
+TEMP_INVALID = RAW_INVALID if RAW_COUNTS else (float("nan") if LOG_QUALITY else 0.0)
+if RAW_COUNTS:
+    # Raw counts stay whole numbers, so they are never interpolated
+    MERGE_POLICIES = {name: NEAREST if policy == LINEAR else policy for name, policy in MERGE_POLICIES.items()}
+if LOG_QUALITY:
+    # A temperature's flag comes from the same scan, so both are taken from the same sample
+    MERGE_POLICIES['temp_q'] = MERGE_POLICIES['temp']
+# Logged for a stream that has produced nothing yet, the same values as a failed read; LINEAR never
+# interpolates a sample that holds one (it takes the nearer sample instead)
+MERGE_INVALIDS = {'pressure': RAW_INVALID if RAW_COUNTS else -1.0,
+                  'flow': RAW_INVALID if RAW_COUNTS else float("nan"),
+                  'temp': TEMP_INVALID, 'temp_q': QUALITY_OFFLINE}
+# (name, unit, calibration) for the binary log; the calibration is only stored when LOG_VALUES = "raw"
+# and repeats what pressure_thread, calc_flow and rs485_temp_thread do to the counts
+PRESSURE_CALIBRATION = {"type": "ads_pressure_bar", "scale": PRESSURE_ADS_FSR / 32767, "ref": REF, "invalid": RAW_INVALID}
+LOG_COLUMNS = ([(label, "Bar", PRESSURE_CALIBRATION) for label in SENSOR_LABELS['pressure']] +
+               [(label, "Lpm", {"type": "linear", "scale": 1.0 / factor, "invalid": RAW_INVALID})
+                for label, factor in zip(SENSOR_LABELS['flow'], FLOW_FACTORS)] +
+               [(label, "C", {"type": "linear", "scale": 0.1, "offset": -offset, "invalid": RAW_INVALID})
+                for label, offset in zip(SENSOR_LABELS['temp'], off_t)])
+if not RAW_COUNTS:
+    LOG_COLUMNS = [(name, unit, None) for name, unit, _ in LOG_COLUMNS]
+LOG_TYPECODES = ['h'] * 4 + ['i'] * 2 + ['h'] * 4 if RAW_COUNTS else ['f'] * 10
+if LOG_QUALITY:
+    LOG_COLUMNS += [(f"{label}_Q", "flag", None) for label in SENSOR_LABELS['temp']]
+    LOG_TYPECODES += ['h'] * 4
+LOG_CALIBRATIONS = [column[2] for column in LOG_COLUMNS]
+LOG_META = {
+    "log_rate_hz": 1.0 / LOG_RATE,
+    "merge_policies": MERGE_POLICIES,
+    "pressure_rate_hz": 1.0 / PRESSURE_RATE,
+    "pressure_mode": PRESSURE_MODE,
+    "pressure_ads_data_rate": ADS_DATA_RATE if PRESSURE_MODE == "continuous" else None,
+    "pressure_ads_gain": PRESSURE_ADS_GAIN,
+    "pressure_ads_driver": ADS_DRIVER,
+    "pressure_ref_v": REF,
+    "flow_window_s": FLOW_RATE,
+    "flow_factors": FLOW_FACTORS,
+    "temp_dev_ids": DEV_IDS,
+    "temp_rs485_mode": RS485_MODE,
+    "temp_rate_hz": TEMP_RATE if RS485_MODE == "async" else None,
+    "temp_quality_flags": QUALITY_NAMES if LOG_QUALITY else None,
+    "temp_offsets": off_t,
+    "values": LOG_VALUES,
+}
 
 # ---- Logging ----
 logging.basicConfig(level=logging.ERROR)
@@ -72,49 +177,110 @@ def calc_flow(pulse_count, factor):
 # ---- Threads ----
 def flow_thread(data_queue, stop_event, flow_lock):
     try:
+        schedule = PeriodicScheduler(FLOW_RATE)
+        schedule.wait(stop_event)  # Tick 0 is now; the first count closes one period later
         while not stop_event.is_set():
-            time.sleep(1)
+            schedule.wait(stop_event)
             with flow_lock:
-                flow_rates = [calc_flow(pulse_counts[i], FLOW_FACTORS[i]) for i in range(2)]
+                if RAW_COUNTS:
+                    flow_rates = pulse_counts[:]
+                else:
+                    flow_rates = [calc_flow(pulse_counts[i], FLOW_FACTORS[i]) for i in range(2)]
                 pulse_counts[0] = 0
                 pulse_counts[1] = 0
-            ts = datetime.now()
+            ts = time.monotonic_ns()
             data_queue.put(("flow", ts, flow_rates))
+        print(schedule.report("Flow"))
     except Exception as e:
         print(f"Flow thread error: {e}")
         traceback.print_exc()
         stop_event.set()
 
+def pressure_bar(voltage):
+    if voltage < 0.5:
+        psi = 0.0
+    elif voltage > (REF - 0.8):
+        psi = 100.0
+    else:
+        psi = ((voltage - 0.5) / (REF - 0.5)) * 100.0
+    bar = psi * 0.0689
+    return 0 if (0.82 * bar - 0.017) < 0 else (0.82 * bar - 0.017)
+
 def pressure_thread(data_queue, stop_event, i2c_lock, ads, channels):
     try:
+        if PRESSURE_MODE == "continuous":
+            pressure_continuous_loop(data_queue, stop_event, i2c_lock, ads)
+            return
+        
+        schedule = PeriodicScheduler(PRESSURE_RATE)
         while not stop_event.is_set():
+            schedule.wait(stop_event)
             pressures = []
             with i2c_lock:
                 for i in range(4):
                     try:
-                        voltage = channels[i].voltage
-                        if voltage < 0.5:
-                            psi = 0.0
-                        elif voltage > (REF - 0.8):
-                            psi = 100.0
+                        if RAW_COUNTS:
+                            pressures.append(channels[i].value)
                         else:
-                            psi = ((voltage - 0.5) / (REF - 0.5)) * 100.0
-                        bar = psi * 0.0689
-                        bar = 0 if (0.82 * bar - 0.017) < 0 else (0.82 * bar - 0.017)
-                        pressures.append(bar)
+                            pressures.append(pressure_bar(channels[i].voltage))
                     except Exception as e:
                         print(f"Error reading {SENSOR_LABELS['pressure'][i]}: {e}")
-                        pressures.append(-1.0)
+                        pressures.append(RAW_INVALID if RAW_COUNTS else -1.0)
                     time.sleep(0.1)
-            ts = datetime.now()
+            ts = time.monotonic_ns()
             data_queue.put(("pressure", ts, pressures))
-            time.sleep(0.5)
+        print(schedule.report("Pressure"))
     except Exception as e:
         print(f"Pressure thread error: {e}")
         traceback.print_exc()
         stop_event.set()
 
+def pressure_continuous_loop(data_queue, stop_event, i2c_lock, ads):
+    # Oversampling: about ADS_DATA_RATE / 4 conversions per channel are averaged into each sample,
+    # stamped at the mean time of those conversions. The scan owns the I2C bus while it runs.
+    registers = ads if ADS_DRIVER == "direct" else AdafruitRegisters(ads)
+    scanner = ADS1115Scanner(registers, ADS_RDY_PIN, range(4), PRESSURE_ADS_GAIN, ADS_DATA_RATE)
+    window_ns = int(PRESSURE_RATE * 1e9)
+    with i2c_lock:
+        scanner.start()
+        try:
+            sums, counts, stamp_sum = [0] * 4, [0] * 4, 0
+            window_end = time.monotonic_ns() + window_ns
+            while not stop_event.is_set():
+                try:
+                    for channel, timestamp, code in scanner.poll(timeout=0.5):
+                        sums[channel] += code
+                        counts[channel] += 1
+                        stamp_sum += timestamp
+                except Exception as e:
+                    print(f"Error reading pressure conversion: {e}")
+                if time.monotonic_ns() < window_end:
+                    continue
+                window_end += window_ns
+                if not any(counts):
+                    continue
+                pressures = []
+                for i in range(4):
+                    if not counts[i]:
+                        pressures.append(RAW_INVALID if RAW_COUNTS else -1.0)
+                    elif RAW_COUNTS:
+                        pressures.append(round(sums[i] / counts[i]))
+                    else:
+                        pressures.append(pressure_bar(sums[i] / counts[i] * PRESSURE_ADS_FSR / 32767))
+                data_queue.put(("pressure", stamp_sum // sum(counts), pressures))
+                sums, counts, stamp_sum = [0] * 4, [0] * 4, 0
+        finally:
+            scanner.stop()
+    print(scanner.report("Pressure"))
+
+def temp_value(raw):
+    raw = to_signed(raw)
+    return raw if RAW_COUNTS else raw / 10
+
 def rs485_temp_thread(data_queue, stop_event, modbus_lock):
+    if RS485_MODE == "async":
+        rs485_temp_async(data_queue, stop_event, modbus_lock)
+        return
     client = None
     try:
         client = ModbusSerialClient(
@@ -133,14 +299,13 @@ def rs485_temp_thread(data_queue, stop_event, modbus_lock):
                             client.socket.reset_input_buffer()
                         except:
                             pass
-                    rr = client.read_holding_registers(address=0, count=1, device_id=dev_id)
-                    temp = 0.0
+                    rr = client.read_holding_registers(address=TEMP_REGISTER, count=1, device_id=dev_id)
+                    temp = TEMP_INVALID
                     if not rr.isError():
-                        raw = rr.registers[0]
-                        temp = (raw - 65536)/10 if (raw & 0x8000) else raw/10
+                        temp = temp_value(rr.registers[0])
                     temperatures.append(temp)
                 time.sleep(0.3)
-            ts = datetime.now()
+            ts = time.monotonic_ns()
             data_queue.put(("temp", ts, temperatures))
             time.sleep(0.5)
     except Exception as e:
@@ -151,49 +316,75 @@ def rs485_temp_thread(data_queue, stop_event, modbus_lock):
         if client:
             client.close()
 
-def csv_writer_thread(data_queue, filename, stop_event):
+def rs485_temp_async(data_queue, stop_event, modbus_lock):
+    # The poller owns the RS485 port while it runs
+    master = None
+    try:
+        master = RTUMaster(RS485_PORT, BAUD_RATE, parity='N', stopbits=1, bytesize=8, timeout=MODBUS_TIMEOUT)
+        def on_scan(ts, temperatures, qualities):
+            data_queue.put(("temp", ts, temperatures))
+            data_queue.put(("temp_q", ts, qualities))
+        collector = ScanCollector(DEV_IDS, on_scan, lambda values: temp_value(values[TEMP_REGISTER]), TEMP_INVALID)
+        devices = [PollDevice(dev_id, (TEMP_REGISTER,), TEMP_RATE, min_timeout=MODBUS_MIN_TIMEOUT, max_timeout=MODBUS_TIMEOUT,
+                              fail_threshold=MODBUS_FAIL_THRESHOLD, probe_interval=MODBUS_PROBE_INTERVAL)
+                   for dev_id in DEV_IDS]
+        poller = ModbusPoller(master, devices, collector)
+        with modbus_lock:
+            asyncio.run(poller.run(stop_event))
+        print(poller.report("RS485"))
+    except Exception as e:
+        print(f"RS485 temp thread error: {e}")
+        traceback.print_exc()
+        stop_event.set()
+    finally:
+        if master:
+            master.close()
+
+def csv_writer_thread(data_queue, log_stem, stop_event):
     try:
         os.makedirs(LOG_DIR, exist_ok=True)
-        with open(filename, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(CSV_HEADER)
-            print(f"Logging to {filename}... Press Ctrl+C to stop.")
+        anchor = ClockAnchor()  # The log's single wall-clock reference
+        with open_log(log_stem, LOG_FORMAT, LOG_COLUMNS, anchor, CSV_HEADER, LOG_META,
+                      segment_bytes=SEGMENT_BYTES, segment_seconds=SEGMENT_SECONDS, codec=LOG_CODEC,
+                      typecode=LOG_TYPECODES,
+                      commit_interval=COMMIT_INTERVAL, commit_bytes=COMMIT_BYTES, fsync=COMMIT_FSYNC) as log:
+            print(f"Logging to {log.path} ({log.durability()})... Press Ctrl+C to stop.")
             
-            last_data = {"pressure": None, "flow": None, "temp": None}
+            merger = StreamMerger(MERGE_STREAMS, int(LOG_RATE * 1e9),
+                                  window_ns=int(MERGE_WINDOW * 1e9), policies=MERGE_POLICIES, invalids=MERGE_INVALIDS)
             last_print_time = time.time()
             print_interval = 0.1  # Follow reference code's 10Hz print rate
             
             while not stop_event.is_set():
                 try:
                     sensor_type, ts, values = data_queue.get(timeout=0.01)
-                    last_data[sensor_type] = (ts, values)
-                    
-                    if all(last_data[k] for k in last_data):
-                        latest_ts = max(data[0] for data in last_data.values())
-                        p = last_data["pressure"][1]
-                        f = last_data["flow"][1]
-                        t_raw = last_data["temp"][1]
-                        t = [t_raw[i] - off_t[i] for i in range(4)]
-                        
-                        ts_str = latest_ts.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-                        row = [ts_str] + p + f + t
-                        writer.writerow(row)
-                        
-                        current_time = time.time()
-                        if current_time - last_print_time >= print_interval:
-                            print_str = f"[{ts_str}] "
-                            for i, v in enumerate(p):
-                                print_str += f"{SENSOR_LABELS['pressure'][i]}: {v:.3f} Bar | "
-                            for i, v in enumerate(f):
-                                print_str += f"{SENSOR_LABELS['flow'][i]}: {v:.2f} Lpm | "
-                            for i, v in enumerate(t):
-                                print_str += f"{SENSOR_LABELS['temp'][i]}: {v:.2f} °C | "
-                            print(print_str.rstrip(" | "))
-                            last_print_time = current_time
-                        
+                    if sensor_type == "temp" and not RAW_COUNTS:  # Raw rows carry the offsets as calibration
+                        values = [values[i] - off_t[i] for i in range(4)]
+                    merger.push(sensor_type, ts, values)
                 except queue.Empty:
-                    continue
+                    pass
+                
+                for row_ns, values in merger.pop_rows(time.monotonic_ns()):
+                    flags = [int(q) for q in values[10:]]
+                    log.append(row_ns, values[:10] + flags)
                     
+                    current_time = time.time()
+                    if current_time - last_print_time >= print_interval:
+                        if RAW_COUNTS:
+                            values = [convert(cal, v) for cal, v in zip(LOG_CALIBRATIONS, values)]
+                        p, f, t = values[0:4], values[4:6], values[6:10]
+                        print_str = f"[{anchor.format(row_ns)}] "
+                        for i, v in enumerate(p):
+                            print_str += f"{SENSOR_LABELS['pressure'][i]}: {v:.3f} Bar | "
+                        for i, v in enumerate(f):
+                            print_str += f"{SENSOR_LABELS['flow'][i]}: {v:.2f} Lpm | "
+                        for i, v in enumerate(t):
+                            flag = f" ({QUALITY_NAMES[flags[i]]})" if flags and flags[i] != QUALITY_OK else ""
+                            print_str += f"{SENSOR_LABELS['temp'][i]}: {v:.2f} °C{flag} | "
+                        print(print_str.rstrip(" | "))
+                        last_print_time = current_time
+                log.commit_if_due()
+
     except Exception as e:
         print(f"[CSV Writer] Error: {e}")
         traceback.print_exc()
@@ -202,19 +393,24 @@ def csv_writer_thread(data_queue, filename, stop_event):
 # ---- Main ----
 def main():
     i2c = None
+    ads = None
     try:
-        i2c = busio.I2C(board.SCL, board.SDA)
-        ads = ADS.ADS1115(i2c)
-        ads.gain = 1
-        channels = [
-            AnalogIn(ads, ADS.P0),
-            AnalogIn(ads, ADS.P1),
-            AnalogIn(ads, ADS.P2),
-            AnalogIn(ads, ADS.P3)
-        ]
+        if ADS_DRIVER == "direct":
+            ads = I2c_ads1115.ADS1115_I2C(bus=ADS_I2C_BUS, gain=PRESSURE_ADS_GAIN)
+            channels = [ads.channel(i) for i in range(4)]
+        else:
+            i2c = busio.I2C(board.SCL, board.SDA)
+            ads = ADS.ADS1115(i2c)
+            ads.gain = PRESSURE_ADS_GAIN
+            channels = [
+                AnalogIn(ads, ADS.P0),
+                AnalogIn(ads, ADS.P1),
+                AnalogIn(ads, ADS.P2),
+                AnalogIn(ads, ADS.P3)
+            ]
 
         timestamp_suffix = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = os.path.join(LOG_DIR, f"sensor_log_{timestamp_suffix}.csv")
+        log_stem = os.path.join(LOG_DIR, f"sensor_log_{timestamp_suffix}")  # Extension follows LOG_FORMAT
 
         stop_event = threading.Event()
         data_queue = queue.Queue()
@@ -222,7 +418,7 @@ def main():
         pressure_t = threading.Thread(target=pressure_thread, args=(data_queue, stop_event, i2c_lock, ads, channels), daemon=True)
         flow_t = threading.Thread(target=flow_thread, args=(data_queue, stop_event, flow_lock), daemon=True)
         temp_t = threading.Thread(target=rs485_temp_thread, args=(data_queue, stop_event, modbus_lock), daemon=True)
-        writer_t = threading.Thread(target=csv_writer_thread, args=(data_queue, filename, stop_event), daemon=True)
+        writer_t = threading.Thread(target=csv_writer_thread, args=(data_queue, log_stem, stop_event), daemon=True)
 
         pressure_t.start()
         flow_t.start()
@@ -256,6 +452,8 @@ def main():
                 i2c.deinit()
             except:
                 pass
+        if isinstance(ads, I2c_ads1115.ADS1115_I2C):
+            ads.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,360 @@
+import asyncio
+import struct
+import time
+import serial
+
+READ_HOLDING_REGISTERS = 0x03
+MAX_READ_REGISTERS = 125  # Most registers one read request may ask for
+
+# The RTU spec times every character as 11 bits (start, 8 data, parity or a second stop bit, stop).
+# Above 19200 baud the silent intervals are fixed instead of scaling with the character time.
+RTU_BITS_PER_CHAR = 11
+FIXED_GAP_BAUD = 19200
+FIXED_T35_S = 0.00175
+
+STOP_CHECK_S = 0.1  # Longest idle sleep between stop_event checks
+
+# Quality flag handed out with every reading
+QUALITY_OK = 0
+QUALITY_TIMEOUT = 1  # No (complete) reply within the device's timeout
+QUALITY_ERROR = 2    # Exception response, corrupt reply or port error
+QUALITY_OFFLINE = 3  # Circuit breaker open: not polled this time
+QUALITY_NAMES = {QUALITY_OK: "ok", QUALITY_TIMEOUT: "timeout", QUALITY_ERROR: "error", QUALITY_OFFLINE: "offline"}
+
+# Adaptive timeout: smoothed response time plus RTO_VARIANCE_GAIN mean deviations (Jacobson/Karels, as TCP)
+RTT_GAIN = 1 / 8
+RTTVAR_GAIN = 1 / 4
+RTO_VARIANCE_GAIN = 4
+
+def _crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+_CRC_TABLE = _crc_table()
+
+def crc16(frame):
+    # Modbus CRC-16; a frame followed by its own CRC (low byte first) comes out as 0
+    crc = 0xFFFF
+    for byte in frame:
+        crc = (crc >> 8) ^ _CRC_TABLE[(crc ^ byte) & 0xFF]
+    return crc
+
+def char_time(baudrate):
+    return RTU_BITS_PER_CHAR / baudrate
+
+def frame_gap(baudrate):
+    # t3.5: the silence that separates two frames on the bus
+    return FIXED_T35_S if baudrate > FIXED_GAP_BAUD else 3.5 * char_time(baudrate)
+
+def plan_blocks(registers, max_block=MAX_READ_REGISTERS):
+    # (start, count) read requests covering the sorted register addresses; neighbours share a request
+    # as long as the span fits in max_block, the registers in between are read and ignored
+    blocks = []
+    for address in sorted(set(registers)):
+        if blocks and address - blocks[-1][0] < max_block:
+            blocks[-1][1] = address - blocks[-1][0] + 1
+        else:
+            blocks.append([address, 1])
+    return [tuple(block) for block in blocks]
+
+def to_signed(raw):
+    return raw - 65536 if raw & 0x8000 else raw
+
+class ModbusError(Exception):
+    ''' Exception response, or a reply that does not match the request '''
+
+class RTUMaster:
+    ''' Modbus RTU master for one RS485 port on an asyncio loop. The port is non-blocking and
+    read through loop.add_reader, so waiting for a slave holds no thread. Requests go out one at
+    a time, each as soon as the bus has been silent for t3.5 after the previous frame, instead of
+    after a fixed sleep. A frame that does not start with the pending request's slave id and
+    function (a late reply from a slave that already timed out) is skipped, and the wait goes on. '''
+
+    def __init__(self, port, baudrate=9600, parity='N', stopbits=1, bytesize=8, timeout=0.5):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout  # Slave response time allowed on top of the frames' wire time (default)
+        self.char_ns = int(char_time(baudrate) * 1e9)
+        self.gap_ns = int(frame_gap(baudrate) * 1e9)
+        self.serial = serial.Serial(port, baudrate, bytesize=bytesize, parity=parity, stopbits=stopbits, timeout=0)
+        self.requests = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.stale = 0  # Late replies to earlier requests skipped
+        self._loop = None
+        self._rx = bytearray()
+        self._header = b""    # Slave id and function of the pending request
+        self._expect = 0      # Length of a normal reply to the pending request
+        self._reply = None    # Future the pending request waits on
+        self._idle_ns = 0     # When the last frame on the bus ended
+        self.response_ns = 0  # Slave response time of the last completed request, wire time excluded
+
+    def start(self):
+        # Attach to the running loop
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self.serial.fileno(), self._on_readable)
+
+    def _on_readable(self):
+        try:
+            data = self.serial.read(self.serial.in_waiting or 1)
+        except serial.SerialException as e:
+            if self._reply is not None and not self._reply.done():
+                self._reply.set_exception(e)
+            return
+        if not data:
+            return
+        self._idle_ns = time.monotonic_ns()
+        if self._reply is None or self._reply.done():
+            return  # Late reply or line noise: dropped so the next request starts clean
+        self._rx += data
+        while len(self._rx) >= 2:
+            if self._rx[0] == self._header[0] and self._rx[1] & 0x7F == self._header[1]:
+                expect = 5 if self._rx[1] & 0x80 else self._expect
+                if len(self._rx) >= expect:
+                    self._reply.set_result(bytes(self._rx[:expect]))
+                return
+            # Someone else's frame: skip it whole once its length is known and its CRC holds,
+            # anything else is noise that takes the rest of the buffer with it
+            if self._rx[1] & 0x80:
+                length = 5
+            elif self._rx[1] == READ_HOLDING_REGISTERS:
+                if len(self._rx) < 3:
+                    return
+                length = 5 + self._rx[2]
+            else:
+                length = None
+            if length is not None and len(self._rx) < length:
+                return
+            if length is None or crc16(self._rx[:length]) != 0:
+                self._rx.clear()
+                return
+            del self._rx[:length]
+            self.stale += 1
+
+    async def _transact(self, request, expect, timeout=None):
+        delay = self._idle_ns + self.gap_ns - time.monotonic_ns()
+        if delay > 0:
+            await asyncio.sleep(delay / 1e9)
+        self._rx.clear()
+        self._header = request[:2]
+        self._expect = expect
+        self._reply = self._loop.create_future()
+        self.serial.write(request)
+        sent_ns = time.monotonic_ns()
+        self._idle_ns = sent_ns + len(request) * self.char_ns
+        self.requests += 1
+        wire_ns = (len(request) + expect) * self.char_ns
+        try:
+            frame = await asyncio.wait_for(self._reply, (self.timeout if timeout is None else timeout) + wire_ns / 1e9)
+            self.response_ns = max(0, self._idle_ns - sent_ns - wire_ns)
+            return frame
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self._reply = None
+
+    async def read_holding_registers(self, device_id, address, count=1, timeout=None):
+        # Unsigned 16-bit register values; timeout (s) overrides the master's for this request
+        request = bytearray(struct.pack('>BBHH', device_id, READ_HOLDING_REGISTERS, address, count))
+        request += crc16(request).to_bytes(2, 'little')
+        frame = await self._transact(request, 5 + 2 * count, timeout)
+        if crc16(frame) != 0 or frame[0] != device_id or frame[1] & 0x7F != READ_HOLDING_REGISTERS:
+            self.errors += 1
+            raise ModbusError(f"device {device_id}: corrupt reply {frame.hex()}")
+        if frame[1] & 0x80:
+            self.errors += 1
+            raise ModbusError(f"device {device_id}: exception code {frame[2]}")
+        if frame[2] != 2 * count:
+            self.errors += 1
+            raise ModbusError(f"device {device_id}: {frame[2]} data bytes for {count} registers")
+        return list(struct.unpack_from(f'>{count}H', frame, 3))
+
+    def close(self):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.remove_reader(self.serial.fileno())
+        self.serial.close()
+
+class PollDevice:
+    ''' One slave on the bus, read for the given holding registers rate_hz times a second.
+    max_block is the most registers the device answers in one request (1: one request per register).
+
+    Its timeout follows its own observed response time (smoothed mean plus four deviations, within
+    min_timeout..max_timeout), starts at max_timeout and doubles after a timeout. After
+    fail_threshold failed polls in a row its circuit breaker opens: the device is left off the bus
+    and reported QUALITY_OFFLINE, except for one probe every probe_interval seconds, doubling up to
+    max_probe_interval while the probes keep failing. A probe only waits min_timeout (plus the
+    frames' wire time) so that it costs the other devices little bus time; a successful one closes
+    the breaker. '''
+
+    def __init__(self, device_id, registers=(0,), rate_hz=1.0, max_block=MAX_READ_REGISTERS,
+                 min_timeout=0.05, max_timeout=0.5, fail_threshold=3, probe_interval=2.0, max_probe_interval=30.0):
+        self.device_id = device_id
+        self.registers = sorted(set(registers))
+        self.period_ns = int(1e9 / rate_hz)
+        self.blocks = plan_blocks(self.registers, min(max_block, MAX_READ_REGISTERS))
+        self.min_timeout_ns = int(min_timeout * 1e9)
+        self.max_timeout_ns = int(max_timeout * 1e9)
+        self.fail_threshold = fail_threshold
+        self.probe_interval_ns = int(probe_interval * 1e9)
+        self.max_probe_interval_ns = int(max_probe_interval * 1e9)
+        self.next_ns = 0
+        self.polls = 0
+        self.failures = 0
+        self.skipped = 0  # Deadlines dropped because the bus could not keep up
+        self.offline_ticks = 0  # Deadlines reported offline without a request
+        self.trips = 0    # Times the breaker opened
+        self.first_ns = None
+        self.last_ns = None
+        self.srtt_ns = None  # Smoothed response time
+        self.rttvar_ns = 0
+        self.timeout_ns = self.max_timeout_ns
+        self.consecutive_failures = 0
+        self.open = False
+        self.probe_ns = 0  # Next probe while open
+        self._backoff_ns = self.probe_interval_ns
+
+    def achieved_rate(self):
+        if self.polls < 2:
+            return 0.0
+        return (self.polls - 1) * 1e9 / (self.last_ns - self.first_ns)
+
+    def record_response(self, response_ns):
+        if self.srtt_ns is None:
+            self.srtt_ns = response_ns
+            self.rttvar_ns = response_ns // 2
+        else:
+            self.rttvar_ns += int(RTTVAR_GAIN * (abs(self.srtt_ns - response_ns) - self.rttvar_ns))
+            self.srtt_ns += int(RTT_GAIN * (response_ns - self.srtt_ns))
+        rto = self.srtt_ns + RTO_VARIANCE_GAIN * self.rttvar_ns
+        self.timeout_ns = min(max(rto, self.min_timeout_ns), self.max_timeout_ns)
+
+    def record_success(self):
+        # Returns True when this closed the breaker
+        self.consecutive_failures = 0
+        self._backoff_ns = self.probe_interval_ns
+        if self.open:
+            self.open = False
+            return True
+        return False
+
+    def record_failure(self, quality, now_ns):
+        # Returns True when this opened the breaker
+        self.failures += 1
+        self.consecutive_failures += 1
+        if quality == QUALITY_TIMEOUT:
+            self.timeout_ns = min(2 * self.timeout_ns, self.max_timeout_ns)
+        if self.open:
+            self._backoff_ns = min(2 * self._backoff_ns, self.max_probe_interval_ns)
+            self.probe_ns = now_ns + self._backoff_ns
+            return False
+        if self.consecutive_failures >= self.fail_threshold:
+            self.open = True
+            self.trips += 1
+            self.probe_ns = now_ns + self._backoff_ns
+            return True
+        return False
+
+class ModbusPoller:
+    ''' Polls the devices on one RTUMaster, each on its own time.monotonic_ns() grid. The bus
+    carries one request at a time, so the device with the earliest deadline goes next (on ties the
+    one polled longest ago); one that falls behind drops the missed deadlines rather than bursting.
+    Every deadline is handed to on_reading(device, timestamp_ns, values, quality) with values
+    {address: raw register}, or None when any of its requests failed or the device is offline. '''
+
+    def __init__(self, master, devices, on_reading):
+        self.master = master
+        self.devices = list(devices)
+        self.on_reading = on_reading
+
+    async def _poll(self, device):
+        # (values, quality); a probe of an offline device gets the short fixed timeout
+        values = {}
+        timeout = (device.min_timeout_ns if device.open else device.timeout_ns) / 1e9
+        try:
+            for start, count in device.blocks:
+                registers = await self.master.read_holding_registers(device.device_id, start, count, timeout)
+                device.record_response(self.master.response_ns)
+                values.update(zip(range(start, start + count), registers))
+        except asyncio.TimeoutError:
+            return None, QUALITY_TIMEOUT
+        except (ModbusError, serial.SerialException):
+            return None, QUALITY_ERROR
+        return {address: values[address] for address in device.registers}, QUALITY_OK
+
+    async def run(self, stop_event):
+        # stop_event: threading or multiprocessing Event, checked between requests
+        self.master.start()
+        start_ns = time.monotonic_ns()
+        for device in self.devices:
+            device.next_ns = start_ns
+        while not stop_event.is_set():
+            device = min(self.devices, key=lambda d: (d.next_ns, d.last_ns or 0))
+            now_ns = time.monotonic_ns()
+            delay = device.next_ns - now_ns
+            if delay > 0:
+                await asyncio.sleep(min(delay / 1e9, STOP_CHECK_S))
+                continue
+            if device.open and now_ns < device.probe_ns:
+                # Offline: the deadline is reported without spending bus time on it
+                device.offline_ticks += 1
+                device.next_ns += device.period_ns
+                self.on_reading(device, now_ns, None, QUALITY_OFFLINE)
+                continue
+            values, quality = await self._poll(device)
+            timestamp_ns = time.monotonic_ns()
+            device.polls += 1
+            if device.first_ns is None:
+                device.first_ns = timestamp_ns
+            device.last_ns = timestamp_ns
+            if quality == QUALITY_OK:
+                if device.record_success():
+                    print(f"[Modbus] device {device.device_id} back online")
+            elif device.record_failure(quality, timestamp_ns):
+                print(f"[Modbus] device {device.device_id} offline after {device.consecutive_failures} failed polls "
+                      f"({QUALITY_NAMES[quality]}), probing every {device.probe_interval_ns / 1e9:g} s or slower")
+            device.next_ns += device.period_ns
+            if device.next_ns < timestamp_ns:
+                missed = (timestamp_ns - device.next_ns) // device.period_ns + 1
+                device.next_ns += missed * device.period_ns
+                device.skipped += missed
+            self.on_reading(device, timestamp_ns, values, quality)
+
+    def report(self, label):
+        parts = [f"dev {d.device_id} {d.achieved_rate():.2f}/{1e9 / d.period_ns:.2f} Hz "
+                 f"({d.failures} failed, {d.skipped} skipped, {d.trips} trips, {d.offline_ticks} offline, "
+                 f"timeout {d.timeout_ns / 1e6:.0f} ms)" for d in self.devices]
+        return (f"[{label}] {self.master.requests} requests, {self.master.timeouts} timeouts, "
+                f"{self.master.errors} bad replies, {self.master.stale} late replies skipped; " + ", ".join(parts))
+
+class ScanCollector:
+    ''' on_reading callback that bundles per-device readings into scans of one value and one
+    quality flag per device, in device_ids order. A scan goes out through on_scan(timestamp_ns,
+    values, qualities) once every device has reported since the last one, so scans follow the
+    slowest device's rate: a device polled faster only contributes its newest reading, and its
+    extra polls never reach the log. The nodes therefore poll every device at one TEMP_RATE.
+    decode(values) turns one device's {address: raw} into its logged value; a failed poll
+    contributes invalid. '''
+
+    def __init__(self, device_ids, on_scan, decode, invalid):
+        self.index = {device_id: i for i, device_id in enumerate(device_ids)}
+        self.on_scan = on_scan
+        self.decode = decode
+        self.invalid = invalid
+        self.values = [invalid] * len(device_ids)
+        self.qualities = [QUALITY_OFFLINE] * len(device_ids)
+        self._fresh = set()
+
+    def __call__(self, device, timestamp_ns, values, quality):
+        i = self.index[device.device_id]
+        self.values[i] = self.invalid if values is None else self.decode(values)
+        self.qualities[i] = quality
+        self._fresh.add(i)
+        if len(self._fresh) == len(self.values):
+            self.on_scan(timestamp_ns, list(self.values), list(self.qualities))
+            self._fresh.clear()
@@ -0,0 +1,111 @@
+from collections import deque
+
+HOLD = "hold"        # Last sample at or before the grid time
+LINEAR = "linear"    # Interpolate between the samples either side of the grid time
+NEAREST = "nearest"  # Whichever of those two samples is closer
+POLICIES = (HOLD, LINEAR, NEAREST)
+
+def _is_invalid(value, invalid):
+    return value != value or value == invalid  # NaN never compares equal, not even to itself
+
+class StreamMerger:
+    ''' Puts several independently timestamped streams onto one common time base
+    (start + k * period_ns) and emits one row per grid point with every stream's value
+    resolved by its policy. A channel whose sample either side is its invalid value (a failed
+    read) is never interpolated: LINEAR takes the nearer sample for it instead. A grid point is emitted as soon as every stream has a sample
+    after it; a stream that stays silent longer than window_ns is not waited for while the
+    others keep producing (its last value is held), so rows trail real time by at most the
+    window. That includes the start: a stream that has produced nothing window_ns after the
+    others began is left out, its columns logged as its invalid value until its first sample.
+    Each stream keeps only the samples around the current grid point (at most window_ns of
+    them before the start), so memory stays bounded and work is O(samples + rows). '''
+
+    def __init__(self, streams, period_ns, policy=HOLD, window_ns=1_000_000_000, policies=None, invalids=None):
+        # streams: {name: num_channels} in output column order; policies: optional {name: policy};
+        # invalids: optional {name: value or [value per channel]} for a stream with no sample yet (NaN)
+        policies = policies or {}
+        invalids = invalids or {}
+        for p in [policy] + list(policies.values()):
+            if p not in POLICIES:
+                raise ValueError(f"Unknown merge policy {p!r}, expected one of {POLICIES}")
+        self.names = list(streams)
+        self.num_channels = dict(streams)
+        self.policies = {name: policies.get(name, policy) for name in self.names}
+        self.period_ns = period_ns
+        self.window_ns = window_ns
+        self.invalid = {}
+        for name, num_channels in self.num_channels.items():
+            value = invalids.get(name, float("nan"))
+            self.invalid[name] = list(value) if isinstance(value, (list, tuple)) else [value] * num_channels
+        self.next_ns = None  # Next grid time to emit; set once every stream has produced or the window ran out
+        self._samples = {name: deque() for name in self.names}
+        self._newest = {name: None for name in self.names}
+
+    def push(self, name, timestamp, values):
+        self._samples[name].append((timestamp, list(values)))
+        self._newest[name] = timestamp
+
+    def push_many(self, name, timestamps, values):
+        # values is row-major with num_channels entries per timestamp (RingBuffer.read() layout)
+        nc = self.num_channels[name]
+        samples = self._samples[name]
+        for i, timestamp in enumerate(timestamps):
+            samples.append((timestamp, values[i * nc:(i + 1) * nc]))
+        if timestamps:
+            self._newest[name] = timestamps[-1]
+
+    def _start(self, forced_until):
+        # First grid point at which every stream that has produced already has a sample at or
+        # before it. Until all have produced, each keeps only its newest window_ns of samples,
+        # and the grid starts without the silent ones once the oldest kept sample is forced_until.
+        firsts = [samples[0][0] for samples in self._samples.values() if samples]
+        if not firsts:
+            return False
+        if len(firsts) < len(self._samples):
+            for samples in self._samples.values():
+                while len(samples) > 1 and samples[-1][0] - samples[0][0] > self.window_ns:
+                    samples.popleft()
+            firsts = [samples[0][0] for samples in self._samples.values() if samples]
+            if min(firsts) > forced_until:
+                return False
+        start = max(firsts)
+        self.next_ns = -(-start // self.period_ns) * self.period_ns
+        return True
+
+    def _resolve(self, name, t):
+        samples = self._samples[name]
+        while len(samples) > 1 and samples[1][0] <= t:
+            samples.popleft()  # Keep exactly one sample at or before t
+        if not samples or samples[0][0] > t:
+            return list(self.invalid[name])  # Nothing from this stream yet
+        prev_t, prev_v = samples[0]
+        if len(samples) == 1:
+            return list(prev_v)
+        next_t, next_v = samples[1]
+        policy = self.policies[name]
+        if policy == LINEAR:
+            w = (t - prev_t) / (next_t - prev_t)
+            nearest = next_v if next_t - t < t - prev_t else prev_v
+            return [c if _is_invalid(a, bad) or _is_invalid(b, bad) else a + (b - a) * w
+                    for a, b, c, bad in zip(prev_v, next_v, nearest, self.invalid[name])]
+        if policy == NEAREST and next_t - t < t - prev_t:
+            return list(next_v)
+        return list(prev_v)
+
+    def pop_rows(self, now_ns):
+        # Returns [(grid_time_ns, values)] for every grid point that is now final, oldest first
+        forced_until = now_ns - self.window_ns
+        if self.next_ns is None and not self._start(forced_until):
+            return []
+        rows = []
+        while True:
+            t = self.next_ns
+            ahead = [newest is not None and newest > t for newest in self._newest.values()]
+            if not all(ahead) and (t > forced_until or not any(ahead)):
+                break
+            row = []
+            for name in self.names:
+                row.extend(self._resolve(name, t))
+            rows.append((t, row))
+            self.next_ns += self.period_ns
+        return rows
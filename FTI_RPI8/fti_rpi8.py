@@ -1,20 +1,73 @@
+import asyncio
 import time
-import csv
 import multiprocessing
-import queue
 import os
+import signal
 import sys
 from datetime import datetime
 import logging
 from pymodbus.client import ModbusSerialClient
 import traceback
+from ring_buffer import SharedRingBuffer
+from timebase import ClockAnchor
+from stream_merge import StreamMerger, NEAREST
+from flight_log import open_log, convert
+from modbus_poll import RTUMaster, ModbusPoller, PollDevice, ScanCollector, to_signed, QUALITY_OK, QUALITY_OFFLINE, QUALITY_NAMES
 
 # ---- Config ----
-RS485_PORT = '/dev/ttyAMA0'
-BAUD_RATE = 9600
+# One worker process per UART, all polled at once: (port, baud, device ids, labels per device).
+# A second chain, e.g. ('/dev/ttyAMA2', 9600, [1, 2, 3, 4], ["Temp8", "Temp6", "Temp9", "Temp10"]) for the
+# sensors fti_rpi7 reads, needs its UART enabled with dtoverlay=uart2 in /boot/firmware/config.txt
+RS485_BUSES = [
+    ('/dev/ttyAMA0', 9600, [1, 2, 3, 4], ["Temp1", "Temp3", "Temp5", "Temp7"]),
+]
+RS485_MODE = "sequential"  # "sequential": pymodbus, one device after another with fixed sleeps as before (~1.7 s per scan),
+                           # "async": modbus_poll polls each device on its own grid, t3.5 apart on the bus
+TEMP_RATE = 2.0            # "async" only: polls/s for every device; a bus scan goes out once all its devices have reported
+TEMP_REGISTER = 0          # Holding register with the temperature (signed, 0.1 C)
+MODBUS_TIMEOUT = 0.5       # "async" only: longest response time allowed; each device's timeout adapts below it
+MODBUS_MIN_TIMEOUT = 0.05  # "async" only: shortest adaptive timeout
+MODBUS_FAIL_THRESHOLD = 3  # "async" only: failed polls in a row that take a device offline
+MODBUS_PROBE_INTERVAL = 2.0  # "async" only: seconds between probes of an offline device (doubling up to 30 s)
+LOG_RATE = None     # Seconds between rows on a common time grid, each bus's newest-nearest scan per row;
+                    # None: one row per scan as before (single bus only)
+MERGE_WINDOW = 3.0  # Seconds a merged row waits for a late bus; one with no scan by then is logged as offline
 LOG_DIR = "FTI_logs"
-SENSOR_LABELS = ["Temp1", "Temp3", "Temp5", "Temp7"]  # Custom labels for each PT100 sensor
-temperatures_offsets = [0.0, 0.0, 0.0, 0.0]  # Calibration offsets for each sensor; adjust as needed
+LOG_FORMAT = "csv"  # "csv": text rows as before, "binary": columnar .ftl blocks (python flight_log.py <file> converts to CSV)
+LOG_CODEC = None    # "binary" only: per-column block compression, "zlib"/"lzma" (stdlib) or "lz4"/"zstd" if installed
+COMMIT_INTERVAL = 0.25    # Writer group commit: at most this many seconds of rows are lost on a power cut
+COMMIT_BYTES = 64 * 1024  # ...or this many bytes, whichever builds up first (COMMIT_INTERVAL = 0: every pass)
+COMMIT_FSYNC = True       # fsync each commit so rows are on the SD card, not just in the page cache
+SEGMENT_BYTES = 64 * 2**20  # Roll to a new numbered log segment after this many bytes...
+SEGMENT_SECONDS = 600       # ...or this many seconds of rows (both None: one file per run, no manifest)
+RING_SAMPLES = 64  # Temperature scans each bus's shared ring holds before the writer has to catch up
+SENSOR_LABELS = [label for _, _, _, labels in RS485_BUSES for label in labels]
+temperatures_offsets = [0.0] * len(SENSOR_LABELS)  # Calibration offsets for each sensor, in SENSOR_LABELS order
+LOG_VALUES = "eng"  # "eng": C as before, "raw": signed 0.1 C registers with the offsets as calibration,
+                    # converted when the log is read ("binary" only)
+RAW_INVALID = -32768  # Raw register value logged for a failed read (NaN once converted)
+
+if RS485_MODE not in ("sequential", "async"):
+    raise ValueError("RS485_MODE must be 'sequential' or 'async'")
+for port, _, dev_ids, labels in RS485_BUSES:
+    if len(dev_ids) != len(labels):
+        raise ValueError(f"RS485 bus {port}: {len(dev_ids)} device ids for {len(labels)} labels")
+if LOG_RATE is None and len(RS485_BUSES) > 1:
+    raise ValueError("Several RS485 buses need a LOG_RATE to merge their scans on")
+if LOG_VALUES not in ("eng", "raw"):
+    raise ValueError("LOG_VALUES must be 'eng' or 'raw'")
+if LOG_VALUES == "raw" and LOG_FORMAT != "binary":
+    raise ValueError("LOG_VALUES = 'raw' needs LOG_FORMAT = 'binary' (the CSV layout has no calibration)")
+RAW_COUNTS = LOG_VALUES == "raw"
+# "async" logs a <label>_Q quality flag per sensor (0 ok, 1 timeout, 2 error, 3 offline) and NaN for a failed
+# read in C, instead of the 0.0 the sequential loop logs
+LOG_QUALITY = RS485_MODE == "async"
+TEMP_INVALID = RAW_INVALID if RAW_COUNTS else (float("nan") if LOG_QUALITY else 0.0)
+# Each bus's ring and log columns: its temperatures, then (LOG_QUALITY) its flags
+BUS_CHANNELS = [2 * len(dev_ids) if LOG_QUALITY else len(dev_ids) for _, _, dev_ids, _ in RS485_BUSES]
+# Logged for a bus that has produced no scan yet
+BUS_INVALIDS = [[TEMP_INVALID] * len(dev_ids) + ([QUALITY_OFFLINE] * len(dev_ids) if LOG_QUALITY else [])
+                for _, _, dev_ids, _ in RS485_BUSES]
 
 # ---- Logging ----
 logging.basicConfig(level=logging.ERROR)
@@ -22,121 +75,215 @@ logging.getLogger("pymodbus").setLevel(logging.ERROR)
 logging.getLogger("pymodbus.logging").setLevel(logging.ERROR)
 logging.getLogger("serial").setLevel(logging.ERROR)
 
-# ---- RS485 Temp process ----
-def rs485_temp_process(data_queue, stop_event):
+# ---- RS485 Temp processes ----
+def temp_value(raw):
+    raw = to_signed(raw)
+    return raw if RAW_COUNTS else raw / 10
+
+def rs485_bus_process(bus, temp_ring, stop_event):
+    # Owns one UART and the chain of transmitters on it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C is the parent's; it stops us through stop_event
+    if RS485_MODE == "async":
+        rs485_bus_async(bus, temp_ring, stop_event)
+        return
+    port, baud, dev_ids, _ = bus
     client = None
     try:
         client = ModbusSerialClient(
-            port=RS485_PORT, baudrate=BAUD_RATE,
+            port=port, baudrate=baud,
             parity='N', stopbits=1, bytesize=8, timeout=3
         )
         if not client.connect():
-            print("Could not connect to RS485")
+            print(f"Could not connect to RS485 on {port}")
             return
         while not stop_event.is_set():
             temps = []
-            for idx, dev_id in enumerate([1, 2, 3, 4]):
+            for idx, dev_id in enumerate(dev_ids):
                 if hasattr(client, "socket") and hasattr(client.socket, "reset_input_buffer"):
                     try:
                         client.socket.reset_input_buffer()
                     except:
                         pass
-                rr = client.read_holding_registers(address=0, count=1, device_id=dev_id)
-                temp = 0.0
+                rr = client.read_holding_registers(address=TEMP_REGISTER, count=1, device_id=dev_id)
+                temp = TEMP_INVALID
                 if not rr.isError():
-                    raw = rr.registers[0]
-                    temp = (raw - 65536)/10 if (raw & 0x8000) else raw/10
+                    temp = temp_value(rr.registers[0])
                 temps.append(temp)
                 time.sleep(0.3)
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-            data_queue.put((timestamp, temps))
+            temp_ring.push(time.monotonic_ns(), temps)
             time.sleep(0.5)
     except Exception as e:
-        print(f"RS485 temp process error: {e}")
+        print(f"RS485 {port} process error: {e}")
         traceback.print_exc()
     finally:
         if client:
             client.close()
 
+def rs485_bus_async(bus, temp_ring, stop_event):
+    port, baud, dev_ids, _ = bus
+    master = None
+    try:
+        master = RTUMaster(port, baud, parity='N', stopbits=1, bytesize=8, timeout=MODBUS_TIMEOUT)
+        collector = ScanCollector(dev_ids, lambda ts, temps, qualities: temp_ring.push(ts, temps + qualities),
+                                  lambda values: temp_value(values[TEMP_REGISTER]), TEMP_INVALID)
+        devices = [PollDevice(dev_id, (TEMP_REGISTER,), TEMP_RATE, min_timeout=MODBUS_MIN_TIMEOUT, max_timeout=MODBUS_TIMEOUT,
+                              fail_threshold=MODBUS_FAIL_THRESHOLD, probe_interval=MODBUS_PROBE_INTERVAL)
+                   for dev_id in dev_ids]
+        poller = ModbusPoller(master, devices, collector)
+        asyncio.run(poller.run(stop_event))
+        print(poller.report(f"RS485 {port}"))
+    except Exception as e:
+        print(f"RS485 {port} process error: {e}")
+        traceback.print_exc()
+    finally:
+        if master:
+            master.close()
+
 # ---- CSV Writer process ----
-def csv_writer_process(data_queue, filename, stop_event):
+def csv_writer_process(temp_rings, log_stem, stop_event):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
     try:
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
-        with open(filename, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(["Timestamp"] + [f"{label}_C" for label in SENSOR_LABELS])
-            print(f"Logging to {filename}... Press Ctrl+C to stop.")
-            
+        os.makedirs(os.path.dirname(log_stem), exist_ok=True)
+        anchor = ClockAnchor()  # The log's single wall-clock reference
+        calibrations = [{"type": "linear", "scale": 0.1, "offset": -offset, "invalid": RAW_INVALID}
+                        if RAW_COUNTS else None for offset in temperatures_offsets]
+        # Columns follow the rings bus by bus: the bus's temperatures, then its quality flags
+        columns, header, typecodes, column_offsets = [], ["Timestamp"], [], []
+        first = 0
+        for _, _, _, labels in RS485_BUSES:
+            sensors = range(first, first + len(labels))
+            columns += [(label, "C", calibrations[i]) for i, label in zip(sensors, labels)]
+            header += [f"{label}_C" for label in labels]
+            typecodes += ['h' if RAW_COUNTS else 'f'] * len(labels)
+            column_offsets += [temperatures_offsets[i] for i in sensors]
+            if LOG_QUALITY:
+                columns += [(f"{label}_Q", "flag") for label in labels]
+                header += [f"{label}_Q" for label in labels]
+                typecodes += ['h'] * len(labels)
+                column_offsets += [None] * len(labels)
+            first += len(labels)
+        column_calibrations = [column[2] if len(column) > 2 else None for column in columns]
+        meta = {"buses": [{"port": port, "baud": baud, "dev_ids": dev_ids, "labels": labels}
+                          for port, baud, dev_ids, labels in RS485_BUSES],
+                "offsets": temperatures_offsets, "values": LOG_VALUES, "rs485_mode": RS485_MODE,
+                "temp_rate_hz": TEMP_RATE if RS485_MODE == "async" else None,
+                "log_rate_hz": 1.0 / LOG_RATE if LOG_RATE else None,
+                "quality_flags": QUALITY_NAMES if LOG_QUALITY else None}
+        with open_log(log_stem, LOG_FORMAT, columns, anchor, header, meta,
+                      segment_bytes=SEGMENT_BYTES, segment_seconds=SEGMENT_SECONDS, codec=LOG_CODEC,
+                      typecode=typecodes,
+                      commit_interval=COMMIT_INTERVAL, commit_bytes=COMMIT_BYTES, fsync=COMMIT_FSYNC) as log:
+            print(f"Logging to {log.path} ({log.durability()})... Press Ctrl+C to stop.")
+
+            merger = None
+            if LOG_RATE is not None:
+                # Each bus's scans are taken nearest to the grid time, so flags stay with their values
+                merger = StreamMerger({f"bus{i}": ring.num_channels for i, ring in enumerate(temp_rings)},
+                                      int(LOG_RATE * 1e9), NEAREST, int(MERGE_WINDOW * 1e9),
+                                      invalids={f"bus{i}": fill for i, fill in enumerate(BUS_INVALIDS)})
             last_print_time = time.time()
-            
+
             while not stop_event.is_set():
-                try:
-                    timestamp, temps = data_queue.get(timeout=0.5)
-                    adjusted_temps = [temps[i] - temperatures_offsets[i] for i in range(4)]
-                    writer.writerow([timestamp] + adjusted_temps)
-                    file.flush()
-                    
+                stop_event.wait(0.5)
+                # Scans come straight out of shared memory, nothing is pickled on the way
+                if merger is None:
+                    timestamps, values = temp_rings[0].read()
+                    n = temp_rings[0].num_channels
+                    rows = [(timestamp_ns, values[n * k:n * (k + 1)]) for k, timestamp_ns in enumerate(timestamps)]
+                else:
+                    for i, ring in enumerate(temp_rings):
+                        merger.push_many(f"bus{i}", *ring.read())
+                    rows = merger.pop_rows(time.monotonic_ns())
+                for timestamp_ns, row in rows:
+                    if RAW_COUNTS:
+                        row = [int(v) for v in row]
+                        temps = [convert(cal, v) for cal, v in zip(column_calibrations, row)]
+                    else:
+                        # Offsets apply to temperatures; flags are whole numbers
+                        row = [v - offset if offset is not None else int(v) for v, offset in zip(row, column_offsets)]
+                        temps = row
+                    log.append(timestamp_ns, row)
+
                     current_time = time.time()
                     if current_time - last_print_time >= 1.0:
-                        print_str = f"[{timestamp}] "
-                        for i, label in enumerate(SENSOR_LABELS):
-                            print_str += f"{label}: {adjusted_temps[i]:.2f} °C | "
-                        print(print_str.rstrip(" | "))
+                        print(format_row(anchor.format(timestamp_ns), temps, row))
                         last_print_time = current_time
-                        
-                except queue.Empty:
-                    continue
-                    
+                log.commit_if_due()
+            for (port, _, _, _), ring in zip(RS485_BUSES, temp_rings):
+                if ring.dropped:
+                    print(f"[CSV Writer] {port}: {ring.dropped} scans overwritten before they were logged")
+
     except Exception as e:
         print(f"[CSV Writer] Error: {e}")
         traceback.print_exc()
         stop_event.set()
 
+def format_row(timestamp, temps, row):
+    # temps: the row in C (flags unconverted); row: as logged, for the flags
+    parts = []
+    first = 0
+    for _, _, _, labels in RS485_BUSES:
+        n = len(labels)
+        for i, label in enumerate(labels):
+            flag = int(row[first + n + i]) if LOG_QUALITY else QUALITY_OK
+            note = f" ({QUALITY_NAMES[flag]})" if flag != QUALITY_OK else ""
+            parts.append(f"{label}: {temps[first + i]:.2f} °C{note}")
+        first += 2 * n if LOG_QUALITY else n
+    return f"[{timestamp}] " + " | ".join(parts)
+
 # ---- Main ----
 def main():
+    temp_rings = []
+    workers = []
     try:
         timestamp_suffix = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = os.path.join(LOG_DIR, f"pt100_log_{timestamp_suffix}.csv")
+        log_stem = os.path.join(LOG_DIR, f"pt100_log_{timestamp_suffix}")  # Extension follows LOG_FORMAT
 
         stop_event = multiprocessing.Event()
-        data_queue = multiprocessing.Queue()
-        
-        temp_p = multiprocessing.Process(
-            target=rs485_temp_process,
-            args=(data_queue, stop_event),
-            daemon=True
-        )
-        writer_p = multiprocessing.Process(
+        temp_rings = [SharedRingBuffer(channels, RING_SAMPLES, 'h' if RAW_COUNTS else 'd') for channels in BUS_CHANNELS]
+
+        # One process per UART, so a slow or silent chain never holds up the others
+        for bus, temp_ring in zip(RS485_BUSES, temp_rings):
+            workers.append(multiprocessing.Process(
+                target=rs485_bus_process,
+                args=(bus, temp_ring, stop_event),
+                daemon=True
+            ))
+        workers.append(multiprocessing.Process(
             target=csv_writer_process,
-            args=(data_queue, filename, stop_event),
+            args=(temp_rings, log_stem, stop_event),
             daemon=True
-        )
-        
-        temp_p.start()
-        writer_p.start()
-        
+        ))
+
+        for worker in workers:
+            worker.start()
+
         while True:
             time.sleep(1)
-            
+
     except KeyboardInterrupt:
         print("\nStopping program...")
         stop_event.set()
-        
-        temp_p.join(timeout=5.0)
-        writer_p.join(timeout=5.0)
-        
-        if temp_p.is_alive() or writer_p.is_alive():
+
+        for worker in workers:
+            worker.join(timeout=5.0)
+
+        if any(worker.is_alive() for worker in workers):
             print("Some processes did not exit cleanly; forcing shutdown.")
-            temp_p.terminate()
-            writer_p.terminate()
-        
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+
         print("Program terminated. Data saved to CSV.")
-        
+
     except Exception as e:
         print(f"Main error: {e}")
         traceback.print_exc()
-        
+
     finally:
+        for temp_ring in temp_rings:
+            temp_ring.close()
+            temp_ring.unlink()
         sys.exit(0)
 
 if __name__ == "__main__":
@@ -0,0 +1,415 @@
+import time
+from array import array
+import spidev
+import lgpio
+
+# Waveshare High-Precision AD HAT wiring (BCM)
+RST_PIN = 18
+CS_PIN = 22
+DRDY_PIN = 17
+
+# Commands
+CMD_RESET = 0x06
+CMD_START1 = 0x08
+CMD_STOP1 = 0x0A
+CMD_RDATA1 = 0x12
+CMD_RREG = 0x20
+CMD_WREG = 0x40
+
+# Registers
+REG_ID = 0x00
+REG_POWER = 0x01
+REG_INTERFACE = 0x02
+REG_MODE0 = 0x03
+REG_MODE1 = 0x04
+REG_MODE2 = 0x05
+REG_INPMUX = 0x06
+REG_REFMUX = 0x0F
+
+# MODE2 DR codes per data rate (SPS)
+DATA_RATES = {2.5: 0x0, 5: 0x1, 10: 0x2, 16.6: 0x3, 20: 0x4, 50: 0x5, 60: 0x6, 100: 0x7, 400: 0x8,
+              1200: 0x9, 2400: 0xA, 4800: 0xB, 7200: 0xC, 14400: 0xD, 19200: 0xE, 38400: 0xF}
+# MODE1 FILTER codes (the FIR filter only runs at 2.5-20 SPS)
+FILTERS = {"sinc1": 0x0, "sinc2": 0x1, "sinc3": 0x2, "sinc4": 0x3, "fir": 0x4}
+# MODE2 GAIN codes; None bypasses the PGA
+GAINS = {1: 0x0, 2: 0x1, 4: 0x2, 8: 0x3, 16: 0x4, 32: 0x5}
+# MODE0 DELAY codes: extra settling before each conversion starts (us)
+DELAYS_US = {0: 0x0, 8.7: 0x1, 17: 0x2, 35: 0x3, 69: 0x4, 139: 0x5, 277: 0x6, 555: 0x7,
+             1100: 0x8, 2200: 0x9, 4400: 0xA, 8800: 0xB}
+
+INPMUX_AINCOM = 0x0A  # MUXN = AINCOM: single-ended inputs against the common pin
+ANALOG_INPUTS = 10    # AIN0..AIN9
+MODE0_RUNMODE_PULSE = 0x40  # One conversion per START1 instead of continuous conversions
+REFMUX_AVDD = 0x24    # Reference = AVDD/AVSS (5 V on the HAT), as the Waveshare library sets it
+STATUS_ADC1_NEW = 0x40
+# Data periods from START (or an input change) to settled data per filter; the chip holds DRDY
+# until then, so these are only used to size timeouts and to estimate scan rates
+SETTLING_PERIODS = {"sinc1": 1, "sinc2": 2, "sinc3": 3, "sinc4": 4, "fir": 1}
+START_LATENCY_S = 0.00005  # Fixed part of the first-conversion latency, roughly
+PERIOD_FIT_SAMPLES = 64  # Conversions before the stream trusts its measured period over the nominal one
+
+class ADS1263_SPI:
+    def __init__(self, bus=0, device=0, speed=4000000):
+        self.spi = spidev.SpiDev()
+        self.spi.open(bus, device)
+        self.spi.max_speed_hz = speed
+        self.spi.mode = 0b01
+
+        # CS is a plain GPIO on the HAT, driven here rather than by the SPI controller
+        self.gpio_handle = lgpio.gpiochip_open(0)
+        if self.gpio_handle < 0:
+            raise RuntimeError("Failed to open GPIO chip")
+        for pin, level in ((CS_PIN, 1), (RST_PIN, 1)):
+            if lgpio.gpio_claim_output(self.gpio_handle, pin, level) < 0:
+                raise RuntimeError(f"Failed to claim GPIO {pin}")
+        if lgpio.gpio_claim_input(self.gpio_handle, DRDY_PIN, lgpio.SET_PULL_UP) < 0:
+            raise RuntimeError(f"Failed to claim GPIO {DRDY_PIN}")
+
+        self.data_rate = 400
+        self.filter = "sinc4"
+        self.gain = None
+        self.delay_us = 0
+        self.pulse = False
+        # Preallocated frame: RDATA1, then STATUS, 4 data bytes and the checksum clocked out
+        self._tx_read = [CMD_RDATA1] + [0x00] * 6
+        self.status = 0  # STATUS byte of the last read_code()
+        self.checksum_errors = 0
+
+    def _select(self):
+        lgpio.gpio_write(self.gpio_handle, CS_PIN, 0)
+
+    def _deselect(self):
+        lgpio.gpio_write(self.gpio_handle, CS_PIN, 1)
+
+    def command(self, cmd):
+        self._select()
+        self.spi.xfer2([cmd])
+        self._deselect()
+
+    def write_register(self, reg, value):
+        self._select()
+        self.spi.xfer2([CMD_WREG | reg, 0x00, value])
+        self._deselect()
+
+    def read_register(self, reg):
+        self._select()
+        response = self.spi.xfer2([CMD_RREG | reg, 0x00, 0x00])
+        self._deselect()
+        return response[2]
+
+    def reset(self):
+        lgpio.gpio_write(self.gpio_handle, RST_PIN, 1)
+        time.sleep(0.2)
+        lgpio.gpio_write(self.gpio_handle, RST_PIN, 0)
+        time.sleep(0.2)
+        lgpio.gpio_write(self.gpio_handle, RST_PIN, 1)
+        time.sleep(0.2)
+
+    def chip_id(self):
+        return self.read_register(REG_ID) >> 5  # DEV_ID: 0 = ADS1262, 1 = ADS1263
+
+    def configure(self, data_rate=400, filter="sinc4", gain=None, delay_us=0, pulse=False):
+        # Continuous conversions at data_rate through the given digital filter, or one per START1
+        # with pulse. delay_us holds off each conversion after START1 or an input change for the
+        # analog front end to settle. Register writes restart the conversion in progress, so this
+        # is done before START1.
+        self.write_register(REG_MODE0, (MODE0_RUNMODE_PULSE if pulse else 0) | DELAYS_US[delay_us])
+        self.write_register(REG_MODE1, FILTERS[filter] << 5)
+        mode2 = DATA_RATES[data_rate]
+        mode2 |= 0x80 if gain is None else GAINS[gain] << 4
+        self.write_register(REG_MODE2, mode2)
+        self.write_register(REG_REFMUX, REFMUX_AVDD)
+        self.data_rate = data_rate
+        self.filter = filter
+        self.gain = gain
+        self.delay_us = delay_us
+        self.pulse = pulse
+
+    def settled_conversion_s(self):
+        # Approximate time from START1 or an input change to the first settled conversion
+        return SETTLING_PERIODS[self.filter] / self.data_rate + self.delay_us / 1e6 + START_LATENCY_S
+
+    def set_input(self, positive, negative=INPMUX_AINCOM):
+        self.write_register(REG_INPMUX, positive << 4 | negative)
+
+    def start(self):
+        self.command(CMD_START1)
+
+    def stop(self):
+        self.command(CMD_STOP1)
+
+    def data_ready(self):
+        return lgpio.gpio_read(self.gpio_handle, DRDY_PIN) == 0
+
+    def wait_drdy(self, timeout=1.0):
+        # Busy-poll: a conversion lasts 26 us at 38400 SPS, far below what a sleep or an
+        # edge callback can resolve
+        deadline = time.perf_counter() + timeout
+        handle = self.gpio_handle
+        while lgpio.gpio_read(handle, DRDY_PIN):
+            if time.perf_counter() > deadline:
+                return False
+        return True
+
+    def read_code(self):
+        # Latest conversion as a signed 32-bit code (RDATA1 reads the holding buffer, so a new
+        # conversion finishing mid-read cannot tear it)
+        self._select()
+        response = self.spi.xfer2(self._tx_read)
+        self._deselect()
+        self.status = response[1]
+        if (sum(response[2:6]) + 0x9B) & 0xFF != response[6]:
+            self.checksum_errors += 1
+        code = response[2] << 24 | response[3] << 16 | response[4] << 8 | response[5]
+        return code - 0x100000000 if code & 0x80000000 else code
+
+    def lsb_volts(self, ref=5.0):
+        # Volts per code: full scale is +/-ref / gain over the signed 32-bit range
+        return ref / (self.gain or 1) / 0x80000000
+
+    def close(self):
+        self.spi.close()
+        lgpio.gpiochip_close(self.gpio_handle)
+
+class ADS1263Stream:
+    ''' DRDY-paced continuous acquisition into preallocated blocks. Each conversion is read as soon
+    as DRDY falls and stored as a raw code; time is kept as a sample index on the ADC's own clock
+    (t = t0 + index / data_rate) instead of a host timestamp per sample. A full block goes to the
+    sink (normally a background writer queue) and a free one is taken from the pool. A read landing a
+    whole conversion period or more after its expected edge means conversions were overwritten: the index
+    skips ahead by the missing count and a new block starts, so every block is contiguous. The pool
+    grows while the sink falls behind, up to max_blocks; with all of them at the sink a full block is
+    dropped (counted) and refilled, so a stalled writer cannot use up the memory. '''
+
+    def __init__(self, adc, block_samples=4096, pool_blocks=8, max_blocks=32):
+        self.adc = adc
+        self.block_samples = block_samples
+        self.free = [array('i', bytes(4 * block_samples)) for _ in range(pool_blocks)]
+        self.blocks = pool_blocks
+        self.max_blocks = max(max_blocks, pool_blocks)
+        self.t0_ns = None      # time.monotonic_ns() of sample index 0
+        self.wall0_ns = None   # time.time_ns() of sample index 0
+        self.samples = 0       # Conversions read
+        self.missed = 0        # Conversions lost between reads
+        self.pool_misses = 0   # Blocks allocated because the sink had not returned one in time
+        self.dropped = 0       # Full blocks dropped because all max_blocks were still at the sink
+        self.dropped_samples = 0
+
+    def release(self, block):
+        # Called by the sink once a block is written
+        self.free.append(block)
+
+    def _next_block(self):
+        if self.free:
+            return self.free.pop()
+        self.pool_misses += 1  # Sink is behind: grow the pool rather than lose samples
+        self.blocks += 1
+        return array('i', bytes(4 * self.block_samples))
+
+    def _hand_off(self, sink, first_index, block, filled):
+        # Sends a block to the sink and returns the one to fill next, or drops it to be refilled
+        # when the pool is at max_blocks and none has come back
+        if not self.free and self.blocks >= self.max_blocks:
+            self.dropped += 1
+            self.dropped_samples += filled
+            return block
+        sink(first_index, block, filled)
+        return self._next_block()
+
+    def run(self, stop_event, sink):
+        # sink(first_index, block, count): receives each contiguous block
+        adc = self.adc
+        period_ns = int(1e9 / adc.data_rate)
+        block = self._next_block()
+        filled = 0
+        first_index = index = 0
+        edge_ns = anchor_index = None
+        adc.start()
+        try:
+            while not stop_event.is_set():
+                if not adc.wait_drdy():
+                    raise RuntimeError("ADS1263 DRDY stopped toggling")
+                code = adc.read_code()
+                # Timed after the read: RDATA1 returns the newest conversion, whichever edge woke us
+                now_ns = time.monotonic_ns()
+                if not adc.status & STATUS_ADC1_NEW:
+                    continue
+                if edge_ns is None:
+                    self.t0_ns = edge_ns = now_ns
+                    self.wall0_ns = time.time_ns()
+                else:
+                    # Conversions overwritten since the last read: whole periods between the expected
+                    # edge and the read. A conversion can only be read after its edge, so the expected
+                    # edge is kept at or below each read time and creeps up towards it (an eighth per
+                    # read) to follow the ADC clock; a late read alone is not a lost conversion.
+                    edge_ns += period_ns
+                    lost = (now_ns - edge_ns) // period_ns
+                    if lost > 0:
+                        edge_ns += lost * period_ns
+                        self.missed += lost
+                        index += lost
+                        if filled:
+                            block = self._hand_off(sink, first_index, block, filled)
+                        first_index, filled = index, 0
+                    edge_ns = min(edge_ns, now_ns)
+                    edge_ns += (now_ns - edge_ns) >> 3
+                    # The ADC oscillator is only good to a few percent: measure the period it actually
+                    # runs at, between envelope points far enough apart, so long gaps are counted on
+                    # its clock
+                    if anchor_index is None:
+                        if index >= PERIOD_FIT_SAMPLES:
+                            anchor_ns, anchor_index = edge_ns, index
+                    elif index - anchor_index >= PERIOD_FIT_SAMPLES:
+                        period_ns = (edge_ns - anchor_ns) // (index - anchor_index)
+                block[filled] = code
+                filled += 1
+                self.samples += 1
+                index += 1
+                if filled == self.block_samples:
+                    block = self._hand_off(sink, first_index, block, filled)
+                    first_index, filled = index, 0
+        finally:
+            adc.stop()
+            if filled:
+                sink(first_index, block, filled)
+
+    def report(self, label="ADS1263"):
+        elapsed = (time.monotonic_ns() - self.t0_ns) / 1e9 if self.t0_ns else 0.0
+        rate = self.samples / elapsed if elapsed else 0.0
+        return (f"[{label}] {rate:.1f} SPS achieved (nominal {self.adc.data_rate} SPS, {self.adc.filter}), "
+                f"{self.samples} read, {self.missed} missed, {self.pool_misses} pool misses, "
+                f"{self.dropped} blocks ({self.dropped_samples} samples) dropped, "
+                f"{self.adc.checksum_errors} checksum errors")
+
+def input_mux(spec):
+    # INPMUX value for a channel: n is AINn against AINCOM, (p, n) the differential pair AINp-AINn
+    positive, negative = (spec, INPMUX_AINCOM) if isinstance(spec, int) else spec
+    for pin in (positive, negative):
+        if not (0 <= pin < ANALOG_INPUTS or pin == INPMUX_AINCOM):
+            raise ValueError(f"ADS1263 input {spec!r}: pins are 0..{ANALOG_INPUTS - 1}")
+    if positive == negative:
+        raise ValueError(f"ADS1263 input {spec!r}: both sides on the same pin")
+    return positive << 4 | negative
+
+def input_name(spec):
+    return f"IN{spec}" if isinstance(spec, int) else f"IN{spec[0]}-IN{spec[1]}"
+
+class ADS1263Scanner:
+    ''' Paced multi-channel scan: up to 10 single-ended inputs or 5 differential pairs, one scan every
+    1 / scan_rate. The ADC runs in pulse mode, so each channel is a mux write, START1 and one
+    conversion that the chip only flags on DRDY once the filter has settled on the new input; no
+    settling time is spent in Python beyond waiting for DRDY. Codes go into preallocated channel-major
+    blocks (all of channel 0, then channel 1...) that the sink receives contiguous, as with
+    ADS1263Stream; scans that could not start on time are skipped and counted as missed. Within a scan
+    the channels are converted back to back, so channel c lags the scan time by about c settled
+    conversions. Like ADS1263Stream, the pool stops growing at max_blocks and drops full blocks after
+    that. '''
+
+    def __init__(self, adc, inputs, scan_rate, block_scans=1024, pool_blocks=8, max_blocks=32):
+        # adc: an ADS1263_SPI configured with pulse=True; inputs: as for input_mux()
+        if not adc.pulse:
+            raise ValueError("ADS1263Scanner needs the ADC configured with pulse=True")
+        self.adc = adc
+        self.inputs = list(inputs)
+        self.muxes = [input_mux(spec) for spec in self.inputs]
+        pins = [pin for mux in self.muxes for pin in (mux >> 4, mux & 0x0F) if pin != INPMUX_AINCOM]
+        if not self.muxes or len(pins) != len(set(pins)):
+            raise ValueError(f"ADS1263 scan inputs {self.inputs}: need at least one, each pin used once")
+        self.scan_rate = scan_rate
+        self.block_scans = block_scans
+        size = block_scans * len(self.muxes)
+        self.free = [array('i', bytes(4 * size)) for _ in range(pool_blocks)]
+        self.blocks = pool_blocks
+        self.max_blocks = max(max_blocks, pool_blocks)
+        self.t0_ns = None      # time.monotonic_ns() of scan index 0
+        self.wall0_ns = None   # time.time_ns() of scan index 0
+        self.scans = 0         # Scans completed
+        self.missed = 0        # Scans skipped because the previous one overran
+        self.pool_misses = 0   # Blocks allocated because the sink had not returned one in time
+        self.dropped = 0       # Full blocks dropped because all max_blocks were still at the sink
+        self.dropped_scans = 0
+
+    def max_scan_rate(self):
+        # Estimated ceiling from settling alone; Python and SPI overhead come on top
+        return 1.0 / (len(self.muxes) * self.adc.settled_conversion_s())
+
+    def release(self, block):
+        self.free.append(block)
+
+    def _next_block(self):
+        if self.free:
+            return self.free.pop()
+        self.pool_misses += 1
+        self.blocks += 1
+        return array('i', bytes(4 * self.block_scans * len(self.muxes)))
+
+    def _hand_off(self, sink, first_index, block, filled):
+        # As ADS1263Stream._hand_off, with `filled` scans
+        if not self.free and self.blocks >= self.max_blocks:
+            self.dropped += 1
+            self.dropped_scans += filled
+            return block
+        self._flush(sink, first_index, block, filled)
+        return self._next_block()
+
+    def _flush(self, sink, first_index, block, filled):
+        # Channel-major with `filled` scans per channel: close the gaps of a part-filled block
+        if filled < self.block_scans:
+            for c in range(1, len(self.muxes)):
+                start = c * self.block_scans
+                block[c * filled:(c + 1) * filled] = block[start:start + filled]
+        sink(first_index, block, filled * len(self.muxes))
+
+    def run(self, stop_event, sink):
+        # sink(first_index, block, count): receives each contiguous block, count = scans * channels
+        adc = self.adc
+        muxes = self.muxes
+        stride = self.block_scans
+        period_ns = int(1e9 / self.scan_rate)
+        timeout = 2 * adc.settled_conversion_s() + 0.1
+        block = self._next_block()
+        filled = 0
+        first_index = index = 0
+        current_mux = None
+        self.t0_ns = time.monotonic_ns()
+        self.wall0_ns = time.time_ns()
+        try:
+            while not stop_event.is_set():
+                due_ns = self.t0_ns + index * period_ns
+                now_ns = time.monotonic_ns()
+                if now_ns < due_ns:
+                    time.sleep((due_ns - now_ns) / 1e9)
+                else:
+                    lost = (now_ns - due_ns) // period_ns
+                    if lost > 0:
+                        self.missed += lost
+                        index += lost
+                        if filled:
+                            block = self._hand_off(sink, first_index, block, filled)
+                        first_index, filled = index, 0
+                for c, mux in enumerate(muxes):
+                    if mux != current_mux:
+                        adc.write_register(REG_INPMUX, mux)
+                        current_mux = mux
+                    adc.start()
+                    if not adc.wait_drdy(timeout):
+                        raise RuntimeError(f"ADS1263 DRDY timed out on {input_name(self.inputs[c])}")
+                    block[c * stride + filled] = adc.read_code()
+                filled += 1
+                self.scans += 1
+                index += 1
+                if filled == stride:
+                    block = self._hand_off(sink, first_index, block, filled)
+                    first_index, filled = index, 0
+        finally:
+            adc.stop()
+            if filled:
+                self._flush(sink, first_index, block, filled)
+
+    def report(self, label="ADS1263"):
+        elapsed = (time.monotonic_ns() - self.t0_ns) / 1e9 if self.t0_ns else 0.0
+        rate = self.scans / elapsed if elapsed else 0.0
+        return (f"[{label}] {rate:.1f} scans/s of {len(self.muxes)} channels (target {self.scan_rate}, "
+                f"settling limit ~{self.max_scan_rate():.0f}), {self.scans} scans, {self.missed} missed, "
+                f"{self.pool_misses} pool misses, {self.dropped} blocks ({self.dropped_scans} scans) dropped, "
+                f"{self.adc.checksum_errors} checksum errors")
@@ -0,0 +1,129 @@
+''' Background writer and reader for ADS1263 sample blocks '''
+# Usage: python block_log.py <file.adsb> [out.csv] converts a raw block log to CSV
+import csv
+import json
+import queue
+import struct
+import sys
+import threading
+from array import array
+from datetime import datetime
+
+MAGIC = b"ADSBLK1\n"
+_HEADER_LEN = struct.Struct('<I')
+_BLOCK = struct.Struct('<qI')  # First sample index, samples per channel; then int32 codes, channel-major
+
+def codes_to_volts(codes, lsb_volts):
+    # Raw ADS1263 codes to volts in one pass. int32 blocks are already signed; anything else (such
+    # as the unsigned 32-bit words the Waveshare library returns) is reinterpreted as two's complement.
+    if not (isinstance(codes, array) and codes.typecode == 'i'):
+        codes = array('i', array('I', codes).tobytes())
+    return array('d', map(lsb_volts.__mul__, codes))
+
+def row_time(header, index):
+    # Wall-clock time of a row index: index 0 was read at wall0_ns, the rest follow at the scan rate
+    # of a multi-channel scan, else at the ADC data rate
+    rate = header.get("scan_rate") or header["data_rate"]
+    return datetime.fromtimestamp((header["wall0_ns"] + index * 1e9 / rate) / 1e9)
+
+class BlockWriter:
+    ''' Takes blocks from the acquisition loop through a queue and writes them on its own thread,
+    as "csv" rows (Timestamp plus one voltage column per channel) or as "raw" int32 blocks with a
+    JSON header. Written blocks go back to the acquisition pool through release(). At most
+    max_queued blocks wait; one arriving beyond that is dropped, counted and released unwritten. '''
+
+    def __init__(self, path, fmt, header, release, max_queued=32):
+        # header: data_rate (scan_rate for scans), wall0_ns, lsb_volts, channels and any settings worth keeping
+        self.path = path
+        self.fmt = fmt
+        self.header = header
+        self.release = release
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.blocks = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def put(self, first_index, block, count):
+        # The acquisition loop's sink: never blocks
+        try:
+            self.queue.put_nowait((first_index, block, count))
+        except queue.Full:
+            self.dropped += 1
+            self.release(block)
+
+    def start(self):
+        self.thread.start()
+
+    def close(self):
+        # Write out whatever is queued, then stop
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        raw = self.fmt == "raw"
+        with open(self.path, 'wb') if raw else open(self.path, 'w', newline='') as file:
+            if raw:
+                header = json.dumps(self.header).encode()
+                file.write(MAGIC + _HEADER_LEN.pack(len(header)) + header)
+            else:
+                writer = csv.writer(file)
+                writer.writerow(["Timestamp"] + [f"{name} (V)" for name in self.header["channels"]])
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                first_index, block, count = item
+                if raw:
+                    file.write(_BLOCK.pack(first_index, count // len(self.header["channels"])))
+                    file.write(memoryview(block)[:count])
+                else:
+                    writer.writerows(self._rows(first_index, block, count))
+                self.blocks += 1
+                self.release(block)
+
+    def _rows(self, first_index, block, count):
+        channels = len(self.header["channels"])
+        scans = count // channels
+        lsb = self.header["lsb_volts"]
+        columns = [codes_to_volts(block[c * scans:(c + 1) * scans], lsb) for c in range(channels)]
+        for i, volts in enumerate(zip(*columns)):
+            yield [row_time(self.header, first_index + i).isoformat(), *volts]
+
+def read_block_log(path):
+    # (header, [(first_index, [array of codes per channel])])
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an ADS1263 block log")
+        (header_len,) = _HEADER_LEN.unpack(file.read(_HEADER_LEN.size))
+        header = json.loads(file.read(header_len))
+        channels = len(header["channels"])
+        blocks = []
+        while True:
+            head = file.read(_BLOCK.size)
+            if len(head) < _BLOCK.size:
+                break  # End of file, or a block cut short by a power loss
+            first_index, scans = _BLOCK.unpack(head)
+            codes = array('i')
+            try:
+                codes.fromfile(file, scans * channels)
+            except EOFError:
+                break
+            blocks.append((first_index, [codes[c * scans:(c + 1) * scans] for c in range(channels)]))
+    return header, blocks
+
+def to_csv(path, out_path):
+    header, blocks = read_block_log(path)
+    lsb = header["lsb_volts"]
+    with open(out_path, 'w', newline='') as out:
+        writer = csv.writer(out)
+        writer.writerow(["Timestamp"] + [f"{name} (V)" for name in header["channels"]])
+        for first_index, columns in blocks:
+            columns = [codes_to_volts(codes, lsb) for codes in columns]
+            for i, volts in enumerate(zip(*columns)):
+                writer.writerow([row_time(header, first_index + i).isoformat(), *volts])
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python block_log.py <file.adsb> [out.csv]")
+        sys.exit(1)
+    to_csv(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else sys.argv[1].rsplit('.', 1)[0] + ".csv")
@@ -2,6 +2,7 @@
 import time
 import ADS1263
 import RPi.GPIO as GPIO
+from block_log import codes_to_volts
 
 REF = 5.00          # Modify according to your actual reference voltage
 
@@ -21,13 +22,8 @@ try:
         channelList = [0]  # Only channel 0 (IN0)
         while True:
             ADC_Value = ADC.ADS1263_GetAll(channelList)    # get ADC1 value
-            value = ADC_Value[0]
-            if (value >> 31 == 1):
-                            voltage = (REF*2 - value * REF / 0x80000000)
-                print("ADC1 IN0 = -%lf" % voltage)
-            else:
-                voltage = value * REF / 0x7fffffff
-                print("ADC1 IN0 = %lf" % voltage)   # 32bit
+            voltage = codes_to_volts(ADC_Value, REF / 0x80000000)[0]  # Two's complement, +/-REF full scale
+            print("ADC1 IN0 = %lf" % voltage)   # 32bit
             time.sleep(0.5)  # Optional: slow down the print rate
 
     ADC.ADS1263_Exit()
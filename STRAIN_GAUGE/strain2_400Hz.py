@@ -6,9 +6,26 @@ import sys
 import csv
 from datetime import datetime
 import os
+import threading
+from block_log import codes_to_volts
 
 REF = 5.00          
 
+# Acquisition mode
+ACQ_MODE = "loop"   # "loop": ADS1263_GetAll() per sample and a CSV row each, as before (the logger sets the rate),
+                    # "drdy": continuous conversions of IN0 read on DRDY into blocks, timestamped from the sample
+                    # index and written by a background thread,
+                    # "scan": CHANNELS converted in turn every 1 / SCAN_RATE into blocks, written the same way
+DATA_RATE = 4800    # "drdy"/"scan": SPS, one of Spi_ads1263.DATA_RATES (2.5 ... 38400)
+FILTER = "sinc1"    # "drdy"/"scan": digital filter, "sinc1".."sinc4" (higher order: less noise, slower settling) or "fir" (<= 20 SPS)
+LOG_FORMAT = "raw"  # "drdy"/"scan": "raw" int32 blocks (python block_log.py <file> converts them), or "csv" rows as before;
+                    # CSV formatting competes with the read loop for the interpreter, so keep "raw" at kHz DATA_RATEs
+BLOCK_SAMPLES = 4096  # "drdy"/"scan": samples (scans) per block handed to the writer
+MAX_BLOCKS = 32     # "drdy"/"scan": most blocks in flight to the writer; further full blocks are dropped and counted
+CHANNELS = [0, 1, 2, 3]  # "scan": n for INn against AINCOM (up to 10), or (p, n) pairs for bridges across INp-INn (up to 5)
+SCAN_RATE = 100     # "scan": scans per second; each channel costs one settled conversion (see the printed limit)
+DELAY_US = 0        # "scan": extra settling after each input change for the bridge/input filter, one of Spi_ads1263.DELAYS_US
+
 TEST_ADC1 = True
 TEST_ADC2 = False
 TEST_ADC1_RATE = False
@@ -23,6 +40,57 @@ filename = os.path.join(
     log_dir, f"{loc_fil}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
 )
 
+def run_blocks(filename):
+    # High-rate and multi-channel modes: Spi_ads1263 drives the HAT directly instead of the Waveshare library
+    from Spi_ads1263 import ADS1263_SPI, ADS1263Stream, ADS1263Scanner, input_name
+    from block_log import BlockWriter
+    adc = ADS1263_SPI()
+    try:
+        adc.reset()
+        print(f"ADS126{2 + adc.chip_id()} found")
+        header = {"data_rate": DATA_RATE, "filter": FILTER, "ref_v": REF}
+        if ACQ_MODE == "scan":
+            adc.configure(data_rate=DATA_RATE, filter=FILTER, delay_us=DELAY_US, pulse=True)
+            acq = ADS1263Scanner(adc, CHANNELS, SCAN_RATE, BLOCK_SAMPLES, max_blocks=MAX_BLOCKS)
+            header.update(scan_rate=SCAN_RATE, delay_us=DELAY_US,
+                          channels=[f"Strain {input_name(spec)}" for spec in CHANNELS])
+            rate = f"{SCAN_RATE} scans/s of {len(CHANNELS)} channels"
+        else:
+            adc.configure(data_rate=DATA_RATE, filter=FILTER)
+            adc.set_input(0)  # IN0 against AINCOM
+            acq = ADS1263Stream(adc, BLOCK_SAMPLES, max_blocks=MAX_BLOCKS)
+            header["channels"] = ["Strain"]
+            rate = f"{DATA_RATE} SPS"
+        header["lsb_volts"] = adc.lsb_volts(REF)
+        stop_event = threading.Event()
+        if LOG_FORMAT == "raw":
+            filename = filename.rsplit('.', 1)[0] + ".adsb"
+        writer = BlockWriter(filename, LOG_FORMAT, header, acq.release, MAX_BLOCKS)
+        acquisition = threading.Thread(target=acq.run, args=(stop_event, writer.put), daemon=True)
+        acquisition.start()
+        # Rows are timed from the wall-clock time of sample 0, known once acquisition has started
+        while acq.wall0_ns is None and acquisition.is_alive():
+            time.sleep(0.001)
+        header["wall0_ns"] = acq.wall0_ns
+        writer.start()
+        print(f"Logging to {filename} at {rate} ({FILTER})...\nPress Ctrl+C to stop.")
+        try:
+            while acquisition.is_alive():
+                acquisition.join(0.5)
+                print(acq.report("Strain"))
+        except KeyboardInterrupt:
+            stop_event.set()
+            acquisition.join()
+        writer.close()
+        print(acq.report("Strain"))
+        print(f"{writer.blocks} blocks written to {filename}, {writer.dropped} dropped at the writer queue")
+    finally:
+        adc.close()
+
+if ACQ_MODE in ("drdy", "scan"):
+    run_blocks(filename)
+    sys.exit()
+
 try:
     with open(filename, mode='w', newline='') as file:
         writer = csv.writer(file)
@@ -43,13 +111,8 @@ try:
             last_print = time.time()
             while True:
                 ADC_Value = ADC.ADS1263_GetAll(channelList)
-                value = ADC_Value[0]
                 timestamp = datetime.now().isoformat()
-                if (value >> 31 == 1):
-                    voltage = (REF*2 - value * REF / 0x80000000)
-                    voltage = -voltage
-                else:
-                    voltage = value * REF / 0x7fffffff
+                voltage = codes_to_volts(ADC_Value, REF / 0x80000000)[0]  # Two's complement, +/-REF full scale
 
                 writer.writerow([timestamp, voltage])
                 counter += 1
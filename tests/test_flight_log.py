@@ -0,0 +1,40 @@
+''' Segment sizes of SegmentedLog against the files actually left on disk '''
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "FTI_RPI1"))
+from flight_log import ALIGN, MANIFEST_SUFFIX, open_log
+from timebase import ClockAnchor
+
+COLUMNS = [(f"Accel_{axis}", "g") for axis in "XYZ"] + [("Strain", "V")]
+CSV_HEADER = ["Timestamp"] + [f"{name} ({unit})" for name, unit in COLUMNS]
+SEGMENT_BYTES = 20000
+ROWS = 20000
+
+def write_run(tmp_path, log_format):
+    # 100 Hz rows, committed every 10 rows as a writer pass at LOG_RATE would
+    anchor = ClockAnchor()
+    stem = str(tmp_path / "run")
+    with open_log(stem, log_format, COLUMNS, anchor, CSV_HEADER, segment_bytes=SEGMENT_BYTES,
+                  commit_interval=0) as log:
+        for i in range(ROWS):
+            log.append(anchor.mono_ns + i * 10_000_000, [0.001 * i, -0.5, 1.0, 2.5])
+            if i % 10 == 9:
+                log.commit_if_due()
+    with open(stem + MANIFEST_SUFFIX) as file:
+        return json.load(file)["segments"], tmp_path
+
+@pytest.mark.parametrize("log_format, slack", [("csv", 200), ("binary", ALIGN + 1024)])
+def test_segments_roll_at_segment_bytes(tmp_path, log_format, slack):
+    # Every segment but the last fills to SEGMENT_BYTES, overshooting by at most a row (CSV) or
+    # the padding of its last block plus the footer (binary)
+    segments, directory = write_run(tmp_path, log_format)
+    sizes = [os.path.getsize(directory / entry["file"]) for entry in segments]
+    assert sizes == [entry["bytes"] for entry in segments]
+    assert len(segments) > 1
+    for size in sizes[:-1]:
+        assert SEGMENT_BYTES <= size < SEGMENT_BYTES + slack
+    assert sum(entry["rows"] for entry in segments) == ROWS
@@ -0,0 +1,66 @@
+''' StreamMerger start-up with a stream that never produces '''
+import math
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "FTI_RPI1"))
+from stream_merge import StreamMerger, LINEAR, NEAREST
+
+PERIOD_NS = 10_000_000   # 100 Hz grid
+WINDOW_NS = 500_000_000
+
+def feed(merger, name, start_ns, count, step_ns=PERIOD_NS, value=1.0):
+    rows = []
+    for i in range(count):
+        t = start_ns + i * step_ns
+        merger.push(name, t, [value, value])
+        rows += merger.pop_rows(t)
+    return rows
+
+def test_silent_stream_does_not_stop_the_log():
+    merger = StreamMerger({"accel": 2, "strain": 2}, PERIOD_NS, LINEAR, WINDOW_NS)
+    rows = feed(merger, "accel", 0, 20000)
+    # Look-behind stays bounded while waiting and rows flow once the window has run out
+    assert len(merger._samples["accel"]) <= WINDOW_NS // PERIOD_NS + 2
+    assert len(rows) > 20000 - 2 * WINDOW_NS // PERIOD_NS
+    t, values = rows[0]
+    assert values[:2] == [1.0, 1.0]
+    assert all(math.isnan(v) for v in values[2:])
+    # Timestamps stay on the grid, one row per period
+    assert all(b[0] - a[0] == PERIOD_NS for a, b in zip(rows, rows[1:]))
+
+def test_late_stream_joins_with_invalids_before_its_first_sample():
+    merger = StreamMerger({"accel": 2, "temp": 2}, PERIOD_NS, NEAREST, WINDOW_NS, invalids={"temp": [-32768, 3]})
+    rows = feed(merger, "accel", 0, 100)
+    assert rows and all(values[2:] == [-32768, 3] for _, values in rows)
+    merger.push("temp", 150 * PERIOD_NS, [20.0, 0])
+    rows = feed(merger, "accel", 100 * PERIOD_NS, 200)
+    before = [values[2:] for t, values in rows if t < 150 * PERIOD_NS]
+    after = [values[2:] for t, values in rows if t >= 150 * PERIOD_NS]
+    assert before and all(v == [-32768, 3] for v in before)
+    assert after and all(v == [20.0, 0] for v in after)
+
+def test_all_streams_present_start_as_before():
+    merger = StreamMerger({"a": 2, "b": 2}, PERIOD_NS, LINEAR, WINDOW_NS)
+    merger.push("a", 5_000_000, [0.0, 0.0])
+    merger.push("b", 12_000_000, [1.0, 1.0])
+    merger.push("a", 25_000_000, [2.0, 2.0])
+    merger.push("b", 32_000_000, [3.0, 3.0])
+    rows = merger.pop_rows(40_000_000)
+    assert [t for t, _ in rows] == [20_000_000]
+    assert rows[0][1] == pytest.approx([1.5, 1.5, 1.8, 1.8])
+
+def test_linear_does_not_interpolate_failed_reads():
+    merger = StreamMerger({"pressure": 2}, PERIOD_NS, LINEAR, WINDOW_NS, invalids={"pressure": -1.0})
+    merger.push("pressure", 0, [2.0, 2.0])
+    merger.push("pressure", 8_000_000, [-1.0, 4.0])
+    merger.push("pressure", 20_000_000, [float("nan"), 6.0])
+    merger.push("pressure", 30_000_000, [3.0, 3.0])
+    rows = merger.pop_rows(30_000_000)
+    # Channel 0: the nearer sample whenever a failed read is either side; channel 1 interpolates
+    assert rows[0] == (0, [2.0, 2.0])
+    assert rows[1][0] == 10_000_000
+    assert rows[1][1][0] == -1.0 and rows[1][1][1] == pytest.approx(4 + 2 * 2 / 12)
+    assert math.isnan(rows[2][1][0]) and rows[2][1][1] == 6.0